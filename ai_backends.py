@@ -0,0 +1,269 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import List
+
+# Zoveel prompt-prefixen onthoudt de nep-backend (oudste eerst vergeten)
+FAKE_PREFIX_CACHE_SIZE = 256
+
+# ==== AI-backends ====
+# ai_utils praat niet rechtstreeks met OpenAI, maar met een "backend" die één
+# methode heeft: complete(operation, prompt) -> response met .output_text en
+# .usage (zelfde vorm als client.responses.create van OpenAI).
+#
+# Keuze via de omgeving:
+#   STUDYOS_AI_BACKEND=openai   (standaard) echte OpenAI-API
+#   STUDYOS_AI_BACKEND=fake     lokale nep-AI, geen netwerk nodig
+#
+# Instellingen voor de nep-AI (handig voor benchmarks en load-tests):
+#   STUDYOS_FAKE_LATENCY_MS      vaste vertraging per aanroep (standaard 0)
+#   STUDYOS_FAKE_JITTER_MS       extra willekeurige vertraging 0..N ms
+#   STUDYOS_FAKE_FAILURE_RATE    kans (0-1) dat een aanroep een fout gooit
+#   STUDYOS_FAKE_BAD_JSON_RATE   kans (0-1) op ongeldige JSON in het antwoord
+
+
+class OpenAIBackend:
+    """Echte OpenAI-API via de Responses-endpoint."""
+
+    name = "openai"
+
+    def __init__(self, model: str = "gpt-4.1-mini", api_key: str = None):
+        from openai import OpenAI
+
+        self.model = model
+        # Maak de OpenAI client aan met je API key uit de omgeving
+        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+
+    def complete(self, operation: str, prompt: str):
+        return self.client.responses.create(
+            model=self.model,
+            input=prompt,
+        )
+
+
+class FakeBackendError(RuntimeError):
+    """Geïnjecteerde fout van de nep-AI."""
+
+
+class FakeBackend:
+    """
+    Nep-AI die lokaal, zonder netwerk, geldige antwoorden teruggeeft in
+    dezelfde JSON-structuur als de prompts vragen (vragen, topics, examen,
+    blokken, samenvattingen, PDF-structuur). Dezelfde prompt geeft altijd
+    hetzelfde antwoord, zodat benchmarks en tests reproduceerbaar zijn.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        failure_rate: float = 0.0,
+        bad_json_rate: float = 0.0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.bad_json_rate = bad_json_rate
+        # Vaste prompt-prefixen die al eens gezien zijn (simuleert prefix-caching);
+        # LRU met vaste grootte, gedeeld door de worker-threads
+        self._seen_prefixes: "OrderedDict[str, None]" = OrderedDict()
+        self._prefix_lock = threading.Lock()
+
+    def complete(self, operation: str, prompt: str):
+        # Deterministische random-generator per prompt
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16], 16)
+        rng = random.Random(seed)
+        # Fouten en vertraging mogen wél variëren tussen aanroepen
+        chaos = random.random
+
+        delay = self.latency_ms + (chaos() * self.jitter_ms if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+        if self.failure_rate and chaos() < self.failure_rate:
+            raise FakeBackendError(f"Geïnjecteerde fout voor '{operation}'")
+
+        builder = getattr(self, f"_build_{operation}", None)
+        data = builder(prompt, rng) if builder else None
+        if isinstance(data, str):
+            text = data
+        elif data is not None:
+            text = json.dumps(data, ensure_ascii=False)
+        else:
+            text = f"Nep-antwoord voor '{operation}'."
+
+        if self.bad_json_rate and chaos() < self.bad_json_rate:
+            text = text[: max(1, len(text) // 2)]
+
+        prefix = prompt.split("\n--- ", 1)[0]
+        with self._prefix_lock:
+            seen = prefix in self._seen_prefixes
+            self._seen_prefixes[prefix] = None
+            self._seen_prefixes.move_to_end(prefix)
+            while len(self._seen_prefixes) > FAKE_PREFIX_CACHE_SIZE:
+                self._seen_prefixes.popitem(last=False)
+        cached_tokens = len(prefix) // 4 if seen else 0
+
+        return SimpleNamespace(
+            output_text=text,
+            usage=SimpleNamespace(
+                input_tokens=len(prompt) // 4,
+                output_tokens=len(text) // 4,
+                input_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+            ),
+        )
+
+    # ---- hulpjes om de variabele blokken uit de prompt te lezen ----
+
+    @staticmethod
+    def _section(prompt: str, label: str) -> str:
+        m = re.search(rf"\n--- {re.escape(label)} ---\n(.*?)(?=\n--- [^\n]+ ---\n|\Z)", prompt, re.S)
+        return m.group(1).strip() if m else ""
+
+    def _number(self, prompt: str, label: str, default: int) -> int:
+        try:
+            return int(self._section(prompt, label))
+        except ValueError:
+            return default
+
+    def _topics(self, prompt: str) -> List[str]:
+        lines = self._section(prompt, "TOPICS / HOOFDSTUKKEN").splitlines()
+        topics = [ln[2:].strip() for ln in lines if ln.startswith("- ")]
+        return [t for t in topics if t and not t.startswith("Geen specifieke topics")]
+
+    # ---- antwoorden per soort prompt ----
+
+    def _build_test(self, prompt, rng):
+        return "De nep-AI van Study OS draait lokaal en werkt prima."
+
+    def _build_questions(self, prompt, rng, label="MAXIMAAL AANTAL VRAGEN"):
+        n = self._number(prompt, label, 6)
+        topics = self._topics(prompt) or ["de leerstof"]
+        return {
+            "questions": [
+                {
+                    "question": f"Leg uit wat bedoeld wordt met {rng.choice(topics)} (vraag {i + 1}).",
+                    "answer": f"Modelantwoord {i + 1}: de kern van dit onderwerp in twee zinnen.",
+                }
+                for i in range(n)
+            ]
+        }
+
+    def _build_questions_from_note(self, prompt, rng):
+        return self._build_questions(prompt, rng)
+
+    def _build_summary_from_note(self, prompt, rng):
+        title = self._section(prompt, "NOTITIE-TITEL") or "deze notitie"
+        return f"Samenvatting van {title}: de belangrijkste begrippen en verbanden op een rij."
+
+    def _build_topics(self, prompt, rng):
+        n = self._number(prompt, "MAXIMAAL AANTAL TOPICS", 12)
+        return {"topics": [f"Hoofdstuk {i + 1} – Onderwerp {rng.randint(1, 99)}" for i in range(min(n, 8))]}
+
+    def _build_chat(self, prompt, rng):
+        question = self._section(prompt, "NIEUWE VRAAG VAN DE STUDENT")
+        return f"(nep-coach) Goede vraag over \"{question[:80]}\". Bekijk je topics en oefenvragen hierover."
+
+    def _build_exam(self, prompt, rng):
+        n = self._number(prompt, "AANTAL VRAGEN", 10)
+        questions = []
+        for i in range(n):
+            if i % 2 == 0:
+                correct = rng.randint(0, 3)
+                questions.append({
+                    "type": "mc",
+                    "question": f"Meerkeuzevraag {i + 1}",
+                    "options": [f"Optie {chr(65 + j)}" for j in range(4)],
+                    "correct_option_index": correct,
+                    "model_answer": f"Optie {chr(65 + correct)} is juist.",
+                    "explanation": "Korte toelichting.",
+                })
+            else:
+                questions.append({
+                    "type": "open",
+                    "question": f"Open vraag {i + 1}",
+                    "options": [],
+                    "correct_option_index": -1,
+                    "model_answer": "Kernpunten die verwacht worden.",
+                    "explanation": "Korte uitleg van de oplossing.",
+                })
+        return {"questions": questions}
+
+    def _build_study_blocks(self, prompt, rng):
+        n = self._number(prompt, "MAXIMAAL AANTAL BLOKKEN", 8)
+        topics = self._topics(prompt) or ["de leerstof"]
+        moments = ["Vandaag", "Morgen", "Binnen 2 dagen", "Volgende week", "Laatste herhaling"]
+        return {
+            "blocks": [
+                {
+                    "title": f"Studeren: {topics[i % len(topics)]}",
+                    "duration": f"{rng.choice([20, 30, 40, 60])} min",
+                    "when": moments[min(i, len(moments) - 1)],
+                }
+                for i in range(n)
+            ]
+        }
+
+    def _build_topic_summaries(self, prompt, rng):
+        return {
+            "summaries": [
+                {"topic": t, "summary": f"Korte samenvatting van {t} in een paar zinnen."}
+                for t in self._topics(prompt)
+            ]
+        }
+
+    def _build_answer_feedback(self, prompt, rng):
+        return (
+            "Je antwoord klopt deels. De kern zit erin, maar vergelijk nog eens "
+            "met het modelantwoord en vul de ontbrekende begrippen aan."
+        )
+
+    def _build_pdf_structure(self, prompt, rng):
+        n = self._number(prompt, "MAXIMAAL AANTAL TOPICS", 12)
+        return {
+            "topics": [f"Hoofdstuk {i + 1} uit de PDF" for i in range(min(n, 6))],
+            "summary": "Deze cursus behandelt de basisbegrippen en hun onderlinge verbanden.",
+            "concepts": [f"Kernbegrip {i + 1}" for i in range(12)],
+        }
+
+    def _build_pdf_chunk(self, prompt, rng):
+        source = self._section(prompt, "BRON") or "dit stuk"
+        n = rng.randint(2, 4)
+        return {
+            "topics": [f"Onderwerp {rng.randint(1, 20)}" for _ in range(n)],
+            "summary": f"Dit stuk ({source}) behandelt een paar kernideeën.",
+            "concepts": [f"Kernbegrip {rng.randint(1, 30)}" for _ in range(n * 2)],
+        }
+
+    def _build_pdf_merge(self, prompt, rng):
+        n = self._number(prompt, "MAXIMAAL AANTAL TOPICS", 12)
+        lines = self._section(prompt, "KANDIDAAT-TOPICS").splitlines()
+        topics = [ln[2:].strip() for ln in lines if ln.startswith("- ")]
+        lines = self._section(prompt, "KANDIDAAT-KERNBEGRIPPEN").splitlines()
+        concepts = [ln[2:].strip() for ln in lines if ln.startswith("- ")]
+        return {
+            "topics": topics[:n],
+            "summary": "Samengevoegde samenvatting van de hele cursus.",
+            "concepts": concepts[:20],
+        }
+
+
+def get_backend(model: str = "gpt-4.1-mini"):
+    """Maak de backend die via STUDYOS_AI_BACKEND gekozen is."""
+    kind = (os.getenv("STUDYOS_AI_BACKEND") or "openai").strip().lower()
+    if kind == "fake":
+        return FakeBackend(
+            latency_ms=float(os.getenv("STUDYOS_FAKE_LATENCY_MS", "0") or 0),
+            jitter_ms=float(os.getenv("STUDYOS_FAKE_JITTER_MS", "0") or 0),
+            failure_rate=float(os.getenv("STUDYOS_FAKE_FAILURE_RATE", "0") or 0),
+            bad_json_rate=float(os.getenv("STUDYOS_FAKE_BAD_JSON_RATE", "0") or 0),
+        )
+    return OpenAIBackend(model=model)
@@ -0,0 +1,152 @@
+import os
+import random
+import threading
+from typing import Dict
+
+# ==== Metingen rond AI-aanroepen ====
+# Per soort aanroep (operation: "questions", "exam", "chat", ...) houden we
+# tellers bij: aantal calls, fouten, retries, JSON-fouten, cache-hits, tokens
+# en een latency-histogram. De /metrics route in app.py toont snapshot().
+
+# Bovengrenzen (in ms) van de latency-buckets; alles daarboven telt als "+Inf"
+LATENCY_BUCKETS_MS = [100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+# Ruwe AI-output loggen is standaard UIT. Zet STUDYOS_AI_PAYLOAD_SAMPLE op
+# bv. "0.1" om 10% van de antwoorden (ingekort) naar stdout te schrijven.
+PAYLOAD_SAMPLE_RATE = float(os.getenv("STUDYOS_AI_PAYLOAD_SAMPLE", "0") or 0)
+PAYLOAD_MAX_CHARS = 2000
+
+# Elke opgebouwde prompt (met tokenschatting) ook naar stdout: STUDYOS_PROMPT_LOG=1
+PROMPT_LOG = os.getenv("STUDYOS_PROMPT_LOG", "0") == "1"
+
+_lock = threading.Lock()
+_operations: Dict[str, Dict] = {}
+# per soort: statistieken van de laatst opgebouwde prompt
+_last_prompts: Dict[str, Dict] = {}
+
+
+def _new_operation() -> Dict:
+    return {
+        "calls": 0,
+        "errors": 0,
+        "retries": 0,
+        "json_errors": 0,
+        "cache_hits": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_tokens": 0,
+        "estimated_prompt_tokens": 0,
+        "prompts_built": 0,
+        "prompts_truncated": 0,
+        "latency_ms_total": 0.0,
+        "latency_ms_max": 0.0,
+        "latency_buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+    }
+
+
+def _get(operation: str) -> Dict:
+    op = _operations.get(operation)
+    if op is None:
+        op = _new_operation()
+        _operations[operation] = op
+    return op
+
+
+def record_call(
+    operation: str,
+    latency_ms: float,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    cached_tokens: int = 0,
+    estimated_prompt_tokens: int = 0,
+    error: bool = False,
+):
+    """Registreer één (geslaagde of mislukte) AI-aanroep."""
+    bucket = len(LATENCY_BUCKETS_MS)
+    for i, limit in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= limit:
+            bucket = i
+            break
+
+    with _lock:
+        op = _get(operation)
+        op["calls"] += 1
+        if error:
+            op["errors"] += 1
+        op["prompt_tokens"] += prompt_tokens
+        op["completion_tokens"] += completion_tokens
+        op["cached_tokens"] += cached_tokens
+        if cached_tokens > 0:
+            op["cache_hits"] += 1
+        op["estimated_prompt_tokens"] += estimated_prompt_tokens
+        op["latency_ms_total"] += latency_ms
+        op["latency_ms_max"] = max(op["latency_ms_max"], latency_ms)
+        op["latency_buckets"][bucket] += 1
+
+
+def record_retry(operation: str):
+    with _lock:
+        _get(operation)["retries"] += 1
+
+
+def record_json_error(operation: str):
+    with _lock:
+        _get(operation)["json_errors"] += 1
+
+
+def record_prompt(operation: str, stats: Dict):
+    """Registreer de tokenschatting van een opgebouwde prompt (ai_utils.build_prompt)."""
+    with _lock:
+        op = _get(operation)
+        op["prompts_built"] += 1
+        if stats.get("truncated"):
+            op["prompts_truncated"] += 1
+        _last_prompts[operation] = dict(stats)
+    if PROMPT_LOG:
+        print(
+            f"Prompt {operation}: ~{stats['total_tokens']} tokens "
+            f"(vast {stats['prefix_tokens']}, variabel {stats['payload_tokens']}, "
+            f"budget {stats['budget']}{', ingekort' if stats.get('truncated') else ''})"
+        )
+
+
+def last_prompts() -> Dict[str, Dict]:
+    with _lock:
+        return {name: dict(stats) for name, stats in _last_prompts.items()}
+
+
+def log_payload(operation: str, raw: str):
+    """
+    Schrijf de ruwe AI-output naar stdout, maar alleen voor een steekproef
+    (PAYLOAD_SAMPLE_RATE) en ingekort tot PAYLOAD_MAX_CHARS.
+    """
+    if PAYLOAD_SAMPLE_RATE <= 0 or random.random() >= PAYLOAD_SAMPLE_RATE:
+        return
+    text = raw if len(raw) <= PAYLOAD_MAX_CHARS else raw[:PAYLOAD_MAX_CHARS] + "…"
+    print(f"AI raw output ({operation}):", text)
+
+
+def snapshot() -> Dict:
+    """
+    Kopie van alle tellers, plus afgeleide waarden (gemiddelde latency)
+    en het histogram met leesbare bucket-labels.
+    """
+    labels = [f"<={limit}ms" for limit in LATENCY_BUCKETS_MS] + ["+Inf"]
+    result = {}
+    with _lock:
+        for name, op in _operations.items():
+            item = dict(op)
+            item["latency_buckets"] = dict(zip(labels, op["latency_buckets"]))
+            calls = op["calls"]
+            item["latency_ms_avg"] = round(op["latency_ms_total"] / calls, 1) if calls else 0.0
+            item["latency_ms_total"] = round(op["latency_ms_total"], 1)
+            item["latency_ms_max"] = round(op["latency_ms_max"], 1)
+            result[name] = item
+    return {"operations": result}
+
+
+def reset():
+    """Alle tellers leegmaken (bv. tussen twee benchmarks)."""
+    with _lock:
+        _operations.clear()
+        _last_prompts.clear()
@@ -1,11 +1,163 @@
 import os
+import re
 import json
-from datetime import date, datetime
-from openai import OpenAI
-import PyPDF2
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Tuple
-# Maak de OpenAI client aan met je API key uit de omgeving
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+import ai_metrics
+import ai_backends
+import chunking
+import dates
+import extractors
+import pdf_text
+
+AI_MODEL = "gpt-4.1-mini"
+# Aantal extra pogingen als de AI-aanroep zelf faalt (netwerk, rate limit, ...)
+AI_MAX_RETRIES = 1
+
+# Backend (echte OpenAI of lokale nep-AI), gekozen via STUDYOS_AI_BACKEND
+backend = ai_backends.get_backend(model=AI_MODEL)
+
+
+def set_backend(new_backend):
+    """Wissel de AI-backend (bv. een FakeBackend voor benchmarks of tests)."""
+    global backend
+    backend = new_backend
+
+
+# ==== Prompt-opbouw ====
+# Elke prompt bestaat uit een VAST deel (rol, opdracht, JSON-structuur) en een
+# VARIABEL deel (vaknaam, topics, notities, PDF-tekst). Het vaste deel staat
+# altijd vooraan en is byte-identiek tussen aanroepen, zodat de provider het
+# als prefix kan cachen. De variabele inhoud komt pas daarna.
+
+# Ruwe schatting: ~4 tekens per token (goed genoeg voor budgetten en logging)
+CHARS_PER_TOKEN = 4
+
+# Maximaal aantal input-tokens per soort prompt
+PROMPT_BUDGETS = {
+    "test": 200,
+    "questions": 1500,
+    "questions_from_note": 4000,
+    "summary_from_note": 4000,
+    "topics": 4000,
+    "chat": 5000,
+    "exam": 3000,
+    "study_blocks": 1500,
+    "topic_summaries": 1500,
+    "answer_feedback": 1500,
+    "pdf_structure": 2500,
+    "pdf_chunk": 2500,
+    "pdf_merge": 4000,
+}
+
+# Hoeveel PDF-tekst generate_structured_data_from_pdf maximaal meestuurt
+PDF_STRUCTURE_MAX_CHARS = 6000
+# Grootte van één stuk bij de map-reduce over lange PDF's (zelfde venster)
+PDF_CHUNK_CHARS = PDF_STRUCTURE_MAX_CHARS
+# Aantal AI-aanroepen dat tegelijk mag lopen binnen één map-reduce
+AI_PARALLEL_CALLS = int(os.getenv("STUDYOS_AI_PARALLEL", "4") or 4)
+
+
+def estimate_tokens(text: str) -> int:
+    """Schat het aantal tokens van een tekst (afgerond naar boven)."""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def build_prompt(operation: str, instructions: str, payload: List[Tuple[str, str]]) -> Tuple[str, Dict]:
+    """
+    Bouw één prompt-tekst: eerst de vaste instructies, dan de variabele blokken.
+
+    Input:
+      - operation: soort prompt (sleutel in PROMPT_BUDGETS)
+      - instructions: vaste tekst (rol + opdracht + JSON-structuur)
+      - payload: lijst van (label, tekst) in de gewenste volgorde
+
+    Past de prompt niet in het budget, dan wordt telkens het grootste
+    variabele blok ingekort. De instructies zelf worden nooit ingekort.
+
+    Retourneert: (prompt, stats)
+      - stats: dict met prefix_tokens, payload_tokens, total_tokens,
+        budget en truncated
+    """
+    prefix = instructions.strip() + "\n"
+    budget = PROMPT_BUDGETS.get(operation, 4000)
+
+    sections = [[label, (text or "").strip()] for label, text in payload]
+    overhead = sum(len(f"\n--- {label} ---\n\n") for label, _ in sections)
+    room = max(0, budget * CHARS_PER_TOKEN - len(prefix) - overhead)
+
+    marker = "\n(… ingekort …)"
+    truncated = False
+    total = sum(len(text) for _, text in sections)
+    while total > room:
+        largest = max(sections, key=lambda s: len(s[1]))
+        keep = len(largest[1]) - (total - room) - len(marker)
+        largest[1] = largest[1][:keep].rstrip() + marker if keep > 0 else ""
+        truncated = True
+        total = sum(len(text) for _, text in sections)
+
+    body = "".join(f"\n--- {label} ---\n{text}\n" for label, text in sections)
+    prompt = prefix + body
+
+    stats = {
+        "prefix_tokens": estimate_tokens(prefix),
+        "payload_tokens": estimate_tokens(body),
+        "total_tokens": estimate_tokens(prompt),
+        "budget": budget,
+        "truncated": truncated,
+    }
+    ai_metrics.record_prompt(operation, stats)
+    return prompt, stats
+
+
+def _call_ai(operation: str, prompt: str) -> str:
+    """
+    Voer één AI-aanroep uit en meet ze via ai_metrics:
+    latency, prompt-/completion-tokens, cache-hits en retries.
+
+    Retourneert de (gestripte) tekst van het antwoord.
+    Gooit de laatste fout door als alle pogingen mislukken.
+    """
+    estimated = estimate_tokens(prompt)
+
+    for attempt in range(AI_MAX_RETRIES + 1):
+        if attempt:
+            ai_metrics.record_retry(operation)
+
+        start = time.perf_counter()
+        try:
+            resp = backend.complete(operation, prompt)
+        except Exception:
+            latency_ms = (time.perf_counter() - start) * 1000
+            ai_metrics.record_call(operation, latency_ms, estimated_prompt_tokens=estimated, error=True)
+            if attempt >= AI_MAX_RETRIES:
+                raise
+            continue
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        usage = getattr(resp, "usage", None)
+        details = getattr(usage, "input_tokens_details", None)
+        ai_metrics.record_call(
+            operation,
+            latency_ms,
+            prompt_tokens=getattr(usage, "input_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "output_tokens", 0) or 0,
+            cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+            estimated_prompt_tokens=estimated,
+        )
+
+        raw = resp.output_text.strip()
+        ai_metrics.log_payload(operation, raw)
+        return raw
+
+
+TEST_INSTRUCTIONS = (
+    "Geef één korte Nederlandse zin die bevestigt dat de AI "
+    "van Study OS succesvol werkt. Maak het informeel en geruststellend."
+)
 
 
 def test_ai():
@@ -14,53 +166,19 @@ def test_ai():
     Deze functie wordt gebruikt door de /ai/test route.
     """
     try:
-        resp = client.responses.create(
-            model="gpt-4.1-mini",
-            input=(
-                "Geef één korte Nederlandse zin die bevestigt dat de AI "
-                "van Study OS succesvol werkt. Maak het informeel en geruststellend."
-            ),
-        )
-        text = resp.output_text.strip()
-        return text
+        prompt, _ = build_prompt("test", TEST_INSTRUCTIONS, [])
+        return _call_ai("test", prompt)
     except Exception as e:
         print("AI-fout in test_ai():", e)
         return f"Er ging iets mis bij het testen van de AI: {e}"
 
 
-def generate_questions_for_course(course, max_questions=6):
-    """
-    Genereer oefenvragen voor een vak op basis van de course-data.
-    Verwacht dat 'course' een dict is met minstens:
-      - 'name': naam van het vak
-      - 'topics': lijst van hoofstukken/onderwerpen (mag leeg zijn)
-
-    Retourneert: (vragen_lijst, error_text)
-      - vragen_lijst: list[dict] met keys 'question' en 'answer'
-      - error_text: None als alles goed ging, anders een foutbericht (string)
-    """
-
-    course_name = course.get("name", "Onbekend vak")
-    topics = course.get("topics") or []
-
-    if topics:
-        topics_text = "\n".join(f"- {t}" for t in topics)
-    else:
-        topics_text = (
-            "- Geen specifieke topics opgegeven. "
-            "Maak algemene, basisvragen over de belangrijkste kernbegrippen van dit vak."
-        )
-
-    prompt = f"""
+QUESTIONS_INSTRUCTIONS = """
 Je bent een studie-assistent in een app genaamd Study OS.
 
-Vaknaam: "{course_name}"
-
-Topics / hoofstukken:
-{topics_text}
-
 Opdracht:
-- Genereer maximaal {max_questions} goede oefenvragen voor dit vak.
+- Genereer goede oefenvragen voor het vak dat onderaan staat, op basis van
+  de topics / hoofdstukken. Maak er niet meer dan het gevraagde maximum.
 - Gebruik verschillende vraagtypes:
   - definitievragen ("Wat is ..."),
   - begripsvragen ("Leg uit in eigen woorden ..."),
@@ -72,18 +190,18 @@ BELANGRIJK:
 - GEEN extra tekst, GEEN uitleg, GEEN markdown.
 - Alleen pure JSON, in exact deze structuur:
 
-{{
+{
   "questions": [
-    {{
+    {
       "question": "Schrijf hier de vraag",
       "answer": "Schrijf hier het beknopte, duidelijke modelantwoord"
-    }},
-    {{
+    },
+    {
       "question": "Nog een vraag",
       "answer": "Het bijhorende modelantwoord"
-    }}
+    }
   ]
-}}
+}
 
 Let op:
 - 'questions' moet altijd een lijst zijn.
@@ -91,14 +209,42 @@ Let op:
 - Gebruik gewone, dubbele aanhalingstekens in de JSON.
 """
 
-    try:
-        resp = client.responses.create(
-            model="gpt-4.1-mini",
-            input=prompt,
+
+def generate_questions_for_course(course, max_questions=6):
+    """
+    Genereer oefenvragen voor een vak op basis van de course-data.
+    Verwacht dat 'course' een dict is met minstens:
+      - 'name': naam van het vak
+      - 'topics': lijst van hoofstukken/onderwerpen (mag leeg zijn)
+
+    Retourneert: (vragen_lijst, error_text)
+      - vragen_lijst: list[dict] met keys 'question' en 'answer'
+      - error_text: None als alles goed ging, anders een foutbericht (string)
+    """
+
+    course_name = course.get("name", "Onbekend vak")
+    topics = course.get("topics") or []
+
+    if topics:
+        topics_text = "\n".join(f"- {t}" for t in topics)
+    else:
+        topics_text = (
+            "- Geen specifieke topics opgegeven. "
+            "Maak algemene, basisvragen over de belangrijkste kernbegrippen van dit vak."
         )
 
-        raw = resp.output_text.strip()
-        print("AI raw JSON voor vragen:", raw)
+    prompt, _ = build_prompt(
+        "questions",
+        QUESTIONS_INSTRUCTIONS,
+        [
+            ("MAXIMAAL AANTAL VRAGEN", str(max_questions)),
+            ("VAKNAAM", course_name),
+            ("TOPICS / HOOFDSTUKKEN", topics_text),
+        ],
+    )
+
+    try:
+        raw = _call_ai("questions", prompt)
 
         data = json.loads(raw)
 
@@ -121,6 +267,7 @@ Let op:
         return cleaned, None
 
     except json.JSONDecodeError as e:
+        ai_metrics.record_json_error("questions")
         print("JSON parse fout bij AI-vragen:", e)
         return [], f"JSON-fout bij het verwerken van het AI-antwoord: {e}"
 
@@ -128,41 +275,15 @@ Let op:
         print("AI-fout bij vragen genereren:", e)
         return [], f"Er ging iets mis bij het genereren van vragen: {e}"
 
-def generate_questions_from_note(course_name: str, note_title: str, note_content: str, max_questions: int = 6):
-    """
-    Genereer oefenvragen op basis van de inhoud van één notitie.
-
-    Input:
-      - course_name: naam van het vak
-      - note_title: titel van de notitie
-      - note_content: volledige tekst van de notitie
-    Output:
-      - (vragen_lijst, error_text)
-        vragen_lijst = list[dict] met 'question' en 'answer'
-        error_text = None als alles ok, anders foutstring
-    """
-
-    note_content = (note_content or "").strip()
-    if not note_content:
-        return [], "Notitie is leeg; geen vragen gegenereerd."
-
-    title_text = (note_title or "Ongetitelde notitie").strip()
-
-    prompt = f"""
+NOTE_QUESTIONS_INSTRUCTIONS = """
 Je bent een studie-assistent in een app genaamd Study OS.
 
-Vak: "{course_name}"
-Notitie-titel: "{title_text}"
-
-Hieronder staat de volledige tekst van de notitie van de student.
+Onderaan staat de volledige tekst van een notitie van de student.
 Gebruik ALLEEN informatie uit deze notitie om vragen te maken.
 
------------------ BEGIN NOTITIE -----------------
-{note_content}
------------------ EINDE NOTITIE -----------------
-
 Opdracht:
-- Genereer maximaal {max_questions} goede oefenvragen op basis van deze notitie.
+- Genereer goede oefenvragen op basis van deze notitie, niet meer dan het
+  gevraagde maximum.
 - Gebruik verschillende vraagtypes:
   - definitievragen ("Wat is ..."),
   - begripsvragen ("Leg uit in eigen woorden ..."),
@@ -174,18 +295,18 @@ BELANGRIJK:
 - GEEN extra tekst, GEEN uitleg, GEEN markdown.
 - Alleen pure JSON, in exact deze structuur:
 
-{{
+{
   "questions": [
-    {{
+    {
       "question": "Schrijf hier de vraag",
       "answer": "Schrijf hier het beknopte, duidelijke modelantwoord"
-    }},
-    {{
+    },
+    {
       "question": "Nog een vraag",
       "answer": "Het bijhorende modelantwoord"
-    }}
+    }
   ]
-}}
+}
 
 Regels:
 - 'questions' moet altijd een lijst zijn.
@@ -194,14 +315,40 @@ Regels:
 - Gebruik geen kennis buiten de notitie (blijf bij de inhoud van de tekst).
 """
 
-    try:
-        resp = client.responses.create(
-            model="gpt-4.1-mini",
-            input=prompt,
-        )
 
-        raw = resp.output_text.strip()
-        print("AI raw JSON voor vragen uit notitie:", raw)
+def generate_questions_from_note(course_name: str, note_title: str, note_content: str, max_questions: int = 6):
+    """
+    Genereer oefenvragen op basis van de inhoud van één notitie.
+
+    Input:
+      - course_name: naam van het vak
+      - note_title: titel van de notitie
+      - note_content: volledige tekst van de notitie
+    Output:
+      - (vragen_lijst, error_text)
+        vragen_lijst = list[dict] met 'question' en 'answer'
+        error_text = None als alles ok, anders foutstring
+    """
+
+    note_content = (note_content or "").strip()
+    if not note_content:
+        return [], "Notitie is leeg; geen vragen gegenereerd."
+
+    title_text = (note_title or "Ongetitelde notitie").strip()
+
+    prompt, _ = build_prompt(
+        "questions_from_note",
+        NOTE_QUESTIONS_INSTRUCTIONS,
+        [
+            ("MAXIMAAL AANTAL VRAGEN", str(max_questions)),
+            ("VAK", course_name),
+            ("NOTITIE-TITEL", title_text),
+            ("NOTITIE", note_content),
+        ],
+    )
+
+    try:
+        raw = _call_ai("questions_from_note", prompt)
 
         data = json.loads(raw)
         questions = data.get("questions", [])
@@ -224,6 +371,7 @@ Regels:
         return cleaned, None
 
     except json.JSONDecodeError as e:
+        ai_metrics.record_json_error("questions_from_note")
         print("JSON parse fout bij AI-vragen uit notitie:", e)
         return [], f"JSON-fout bij het verwerken van het AI-antwoord: {e}"
 
@@ -231,6 +379,24 @@ Regels:
         print("AI-fout bij vragen uit notitie genereren:", e)
         return [], f"Er ging iets mis bij het genereren van vragen uit de notitie: {e}"
 
+NOTE_SUMMARY_INSTRUCTIONS = """
+Je bent een studie-assistent in de app Study OS.
+
+Onderaan staat de volledige tekst van een notitie van de student.
+
+Opdracht:
+- Maak een duidelijke, overzichtelijke samenvatting in het Nederlands.
+- Schrijf in 3 tot 8 korte alinea's of bullets.
+- Focus op de kernbegrippen, definities en verbanden.
+- Schrijf alsof je het uitlegt aan je toekomstige zelf vlak voor het examen.
+- Vermijd irrelevante details en herhaling.
+
+BELANGRIJK:
+- GEEN JSON, GEEN markdown codeblokken.
+- Gewoon normale, lopende tekst (je mag wel korte lijstjes gebruiken).
+"""
+
+
 def generate_summary_from_note(course_name: str, note_title: str, note_content: str) -> Tuple[str, str]:
     """
     Genereer een korte, duidelijke samenvatting op basis van één notitie.
@@ -251,36 +417,18 @@ def generate_summary_from_note(course_name: str, note_title: str, note_content:
 
     title_text = (note_title or "Ongetitelde notitie").strip()
 
-    prompt = f"""
-Je bent een studie-assistent in de app Study OS.
-
-Vak: "{course_name}"
-Notitie-titel: "{title_text}"
-
-Hieronder staat de volledige tekst van de notitie van de student:
-
------------------ BEGIN NOTITIE -----------------
-{note_content}
------------------ EINDE NOTITIE -----------------
-
-Opdracht:
-- Maak een duidelijke, overzichtelijke samenvatting in het Nederlands.
-- Schrijf in 3 tot 8 korte alinea's of bullets.
-- Focus op de kernbegrippen, definities en verbanden.
-- Schrijf alsof je het uitlegt aan je toekomstige zelf vlak voor het examen.
-- Vermijd irrelevante details en herhaling.
-
-BELANGRIJK:
-- GEEN JSON, GEEN markdown codeblokken.
-- Gewoon normale, lopende tekst (je mag wel korte lijstjes gebruiken).
-"""
+    prompt, _ = build_prompt(
+        "summary_from_note",
+        NOTE_SUMMARY_INSTRUCTIONS,
+        [
+            ("VAK", course_name),
+            ("NOTITIE-TITEL", title_text),
+            ("NOTITIE", note_content),
+        ],
+    )
 
     try:
-        resp = client.responses.create(
-            model="gpt-4.1-mini",
-            input=prompt,
-        )
-        text = resp.output_text.strip()
+        text = _call_ai("summary_from_note", prompt)
         if not text:
             return "", "AI gaf een leeg antwoord bij samenvatting."
         return text, None
@@ -289,17 +437,12 @@ BELANGRIJK:
         return "", f"Er ging iets mis bij het genereren van een samenvatting: {e}"
 
 
-def generate_topics_from_text(text, max_topics=12):
-    """
-    Neemt pure text als input en laat AI een lijst van topics/hoofdstukken genereren.
-    Retourneert: (topics_list, error_text)
-    """
-
-    prompt = f"""
+TOPICS_INSTRUCTIONS = """
 Je bent een studie-assistent in Study OS.
 
-Hieronder staat de tekst van een cursus. 
-Genereer een duidelijke, gestructureerde lijst van maximaal {max_topics} hoofdstukken of topics.
+Onderaan staat de tekst van een cursus.
+Genereer een duidelijke, gestructureerde lijst van hoofdstukken of topics,
+niet meer dan het gevraagde maximum.
 
 Regels:
 - Hou het kort maar duidelijk.
@@ -307,28 +450,33 @@ Regels:
 - Antwoord in ÉÉN geldig JSON-object, zonder extra tekst, zonder markdown.
 
 Structuur:
-{{
+{
   "topics": [
     "Hoofdstuk 1 titel",
     "Hoofdstuk 2 titel",
     "Hoofdstuk 3 titel"
   ]
-}}
-
-Hier is de text:
---------------------
-{text}
---------------------
+}
 """
 
-    try:
-        resp = client.responses.create(
-            model="gpt-4.1-mini",
-            input=prompt,
-        )
 
-        raw = resp.output_text.strip()
-        print("AI raw JSON voor topics:", raw)
+def generate_topics_from_text(text, max_topics=12):
+    """
+    Neemt pure text als input en laat AI een lijst van topics/hoofdstukken genereren.
+    Retourneert: (topics_list, error_text)
+    """
+
+    prompt, _ = build_prompt(
+        "topics",
+        TOPICS_INSTRUCTIONS,
+        [
+            ("MAXIMAAL AANTAL TOPICS", str(max_topics)),
+            ("TEKST VAN DE CURSUS", text),
+        ],
+    )
+
+    try:
+        raw = _call_ai("topics", prompt)
 
         data = json.loads(raw)
         topics = data.get("topics", [])
@@ -344,6 +492,7 @@ Hier is de text:
         return cleaned, None
 
     except json.JSONDecodeError as e:
+        ai_metrics.record_json_error("topics")
         print("JSON-fout bij AI topics:", e)
         return [], f"JSON-fout: {e}"
 
@@ -423,6 +572,21 @@ def _build_course_context(course: dict, notes_data: dict, max_chars: int = 9000)
     return context
 
 
+CHAT_INSTRUCTIONS = (
+    "Je bent een rustige, duidelijke AI-study coach voor het vak dat in de "
+    "context hieronder staat. Je helpt de student dit vak te begrijpen, legt dingen "
+    "uit in eenvoudige taal en verwijst naar hun eigen topics, vragen, "
+    "blokplanning en notities waar relevant.\n\n"
+    "Belangrijke richtlijnen:\n"
+    "- Geef concrete inhoudelijke uitleg, geen vage motivatiespeeches.\n"
+    "- Verwijs naar het examen en planning als dat helpt.\n"
+    "- Als iets niet in de context zit, zeg dat eerlijk en antwoord dan met algemene kennis.\n"
+    "- Antwoord in het Nederlands, tenzij de vraag duidelijk in een andere taal is.\n"
+    "- Houd antwoorden compact maar duidelijk.\n"
+    "- Geef één duidelijk, beknopt antwoord als de vak-coach op de NIEUWE VRAAG onderaan."
+)
+
+
 def chat_with_course_assistant(
     course: dict,
     notes_data: dict,
@@ -451,98 +615,43 @@ def chat_with_course_assistant(
 
     history_text = "\n".join(history_lines) if history_lines else "(nog geen vorig gesprek)"
 
-    # 3) Systeem-instructie
-    name = course.get("name", "dit vak")
-    system_text = (
-        "Je bent een rustige, duidelijke AI-study coach voor het vak "
-        f"'{name}'. Je helpt de student dit vak te begrijpen, legt dingen "
-        "uit in eenvoudige taal en verwijst naar hun eigen topics, vragen, "
-        "blokplanning en notities waar relevant.\n\n"
-        "Belangrijke richtlijnen:\n"
-        "- Geef concrete inhoudelijke uitleg, geen vage motivatiespeeches.\n"
-        "- Verwijs naar het examen en planning als dat helpt.\n"
-        "- Als iets niet in de context zit, zeg dat eerlijk en antwoord dan met algemene kennis.\n"
-        "- Antwoord in het Nederlands, tenzij de vraag duidelijk in een andere taal is.\n"
-        "- Houd antwoorden compact maar duidelijk."
-    )
-
-    # 4) Prompt opbouwen als ÉÉN tekst (zoals je andere werkende functies)
-    prompt = (
-        system_text
-        + "\n\n--- CONTEXT OVER DIT VAK ---\n"
-        + context
-        + "\n\n--- VORIG GESPREK ---\n"
-        + history_text
-        + "\n\n--- NIEUWE VRAAG VAN DE STUDENT ---\n"
-        + user_message
-        + "\n\nGeef nu één duidelijk, beknopt antwoord als de vak-coach."
+    # 3) Prompt opbouwen als ÉÉN tekst (zoals je andere werkende functies):
+    #    vaste coach-instructie eerst, daarna context, gesprek en nieuwe vraag
+    prompt, _ = build_prompt(
+        "chat",
+        CHAT_INSTRUCTIONS,
+        [
+            ("CONTEXT OVER DIT VAK", context),
+            ("VORIG GESPREK", history_text),
+            ("NIEUWE VRAAG VAN DE STUDENT", user_message),
+        ],
     )
 
     try:
-        resp = client.responses.create(
-            model="gpt-4.1-mini",   # zelfde model als in je andere functies
-            input=prompt,
-        )
         # Zelfde manier als generate_questions / test_ai
-        reply_text = resp.output_text.strip()
+        reply_text = _call_ai("chat", prompt)
         error_text = ""
     except Exception as e:
         reply_text = "Er ging iets mis bij het genereren van een antwoord."
         error_text = str(e)
         print("AI CHAT ERROR:", e)  # => zie je in de terminal
 
-    # 5) History: we gaan ervan uit dat history het user-bericht al bevat.
+    # 4) History: we gaan ervan uit dat history het user-bericht al bevat.
     # We voegen dus alleen het assistant-antwoord toe.
     new_history = trimmed_history + [
         {"role": "assistant", "content": reply_text},
     ]
 
     return reply_text, new_history, error_text
-def generate_exam_for_course(
-    course: dict,
-    notes_data: dict,
-    num_questions: int = 10
-) -> Tuple[List[Dict], str]:
-    """
-    Genereer een examenset (mix van multiple choice + open vragen)
-    op basis van:
-      - course (topics, qa, blocks, summaries...)
-      - notes_data (notitie-mappen + inhoud)
-
-    Output:
-      - (questions_list, error_text)
-      - questions_list is een lijst van dicts met structuur:
-
-        {
-          "type": "mc" of "open",
-          "question": "vraagtekst",
-          "options": ["optie A", "optie B", ...],      # alleen bij type == "mc"
-          "correct_option_index": 1,                   # index in 'options'
-          "model_answer": "modelantwoord / oplossing",
-          "explanation": "korte uitleg"
-        }
-    """
 
-    # Bouw compacte context over het vak (hergebruik helper)
-    try:
-        context = _build_course_context(course, notes_data, max_chars=6000)
-    except Exception:
-        context = ""
-
-    course_name = course.get("name", "Onbekend vak")
-    exam_date = course.get("exam_date") or "Onbekend"
 
-    prompt = f"""
-Je bent een docent aan een hogeschool. Je maakt examen-vragen voor het vak "{course_name}".
+EXAM_INSTRUCTIONS = """
+Je bent een docent aan een hogeschool. Je maakt examen-vragen voor het vak dat onderaan staat.
 
-Hieronder heb je context over het vak, inclusief topics, oefenvragen, blokplanning en notities:
-
----------------- CONTEXT ----------------
-{context}
------------------------------------------
+Onderaan heb je context over het vak, inclusief topics, oefenvragen, blokplanning en notities.
 
 Opdracht:
-- Genereer een examen met in totaal {num_questions} vragen.
+- Genereer een examen met in totaal het gevraagde aantal vragen.
 - Mix:
   - multiple choice vragen (minstens de helft)
   - open vragen (kort open antwoord)
@@ -553,9 +662,9 @@ BELANGRIJK:
 - Geef je antwoord in ÉÉN geldig JSON-object, zonder extra tekst, zonder markdown.
 - Structuur EXACT als volgt:
 
-{{
+{
   "questions": [
-    {{
+    {
       "type": "mc",
       "question": "Volledige vraagtekst hier",
       "options": [
@@ -567,17 +676,17 @@ BELANGRIJK:
       "correct_option_index": 1,
       "model_answer": "Korte uitleg waarom dit het juiste antwoord is.",
       "explanation": "Extra toelichting (optioneel, mag gelijk zijn aan model_answer)."
-    }},
-    {{
+    },
+    {
       "type": "open",
       "question": "Open vraag hier",
       "options": [],
       "correct_option_index": -1,
       "model_answer": "Kort modelantwoord of kernpunten die verwacht worden.",
       "explanation": "Korte uitleg van de oplossing."
-    }}
+    }
   ]
-}}
+}
 
 Regels:
 - 'questions' is altijd een lijst.
@@ -592,13 +701,52 @@ Regels:
 - Gebruik gewone dubbele aanhalingstekens in de JSON.
 """
 
+
+def generate_exam_for_course(
+    course: dict,
+    notes_data: dict,
+    num_questions: int = 10
+) -> Tuple[List[Dict], str]:
+    """
+    Genereer een examenset (mix van multiple choice + open vragen)
+    op basis van:
+      - course (topics, qa, blocks, summaries...)
+      - notes_data (notitie-mappen + inhoud)
+
+    Output:
+      - (questions_list, error_text)
+      - questions_list is een lijst van dicts met structuur:
+
+        {
+          "type": "mc" of "open",
+          "question": "vraagtekst",
+          "options": ["optie A", "optie B", ...],      # alleen bij type == "mc"
+          "correct_option_index": 1,                   # index in 'options'
+          "model_answer": "modelantwoord / oplossing",
+          "explanation": "korte uitleg"
+        }
+    """
+
+    # Bouw compacte context over het vak (hergebruik helper)
     try:
-        resp = client.responses.create(
-            model="gpt-4.1-mini",
-            input=prompt,
-        )
-        raw = resp.output_text.strip()
-        print("AI raw JSON voor examen:", raw)
+        context = _build_course_context(course, notes_data, max_chars=6000)
+    except Exception:
+        context = ""
+
+    course_name = course.get("name", "Onbekend vak")
+
+    prompt, _ = build_prompt(
+        "exam",
+        EXAM_INSTRUCTIONS,
+        [
+            ("AANTAL VRAGEN", str(num_questions)),
+            ("VAK", course_name),
+            ("CONTEXT", context),
+        ],
+    )
+
+    try:
+        raw = _call_ai("exam", prompt)
 
         data = json.loads(raw)
         questions = data.get("questions", [])
@@ -660,6 +808,7 @@ Regels:
         return cleaned, None
 
     except json.JSONDecodeError as e:
+        ai_metrics.record_json_error("exam")
         print("JSON-fout bij AI examen:", e)
         return [], f"JSON-fout bij het parsen van het examen: {e}"
 
@@ -667,74 +816,59 @@ Regels:
         print("AI-fout bij examen genereren:", e)
         return [], f"Er ging iets mis bij het genereren van het examen: {e}"
 
-def extract_text_from_pdf(filepath):
+def extract_text_from_pdf(filepath, max_chars: int = None):
     """
     Leest simpele tekst uit een PDF bestand via PyPDF2.
     (Niet perfect, maar genoeg voor onze MVP.)
+    De tekst per pagina komt uit de cache van pdf_text, dus een PDF wordt
+    maar één keer echt geparsed.
+
+    Met max_chars stoppen we met lezen zodra er genoeg tekst is
+    (het resultaat kan iets langer zijn: de laatste pagina gaat volledig mee).
     """
     try:
-        text = ""
-        with open(filepath, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            for page in reader.pages:
-                txt = page.extract_text()
-                if txt:
-                    text += "\n" + txt
-        return text
+        if max_chars is None:
+            pages = pdf_text.extract_pages(filepath)
+        else:
+            pages = pdf_text.iter_pages(filepath, max_chars=max_chars)
+        return "".join("\n" + txt for txt in pages if txt)
     except Exception as e:
         print("PDF extract error:", e)
         return ""
 
 
-def generate_study_blocks_for_course(course, max_blocks=8):
+def extract_text_from_file(filepath, max_chars: int = None):
     """
-    Laat de AI een studieplanning maken (studieblokken) voor één vak.
-
-    Input: course = dict met minstens:
-      - "name"
-      - "topics" (lijst, mag leeg zijn)
-      - "exam_date" (YYYY-MM-DD, mag leeg zijn)
-
-    Retourneert: (blocks_list, error_text)
-      - blocks_list = lijst van dicts met keys: 'title', 'duration', 'when'
-      - error_text = None als ok, anders foutstring
+    Zelfde als extract_text_from_pdf, maar voor elk formaat uit extractors
+    (pdf, docx, pptx, txt). Niet-ondersteunde bestanden geven "".
     """
+    if filepath.lower().endswith(".pdf"):
+        return extract_text_from_pdf(filepath, max_chars=max_chars)
+    if not extractors.is_supported(filepath):
+        return ""
+    try:
+        pages = extractors.iter_pages(filepath, max_chars=max_chars)
+        return "".join("\n" + txt for txt in pages if txt)
+    except Exception as e:
+        print("Extract error:", e)
+        return ""
 
-    course_name = course.get("name", "dit vak")
-    topics = course.get("topics") or []
-    exam_date_str = course.get("exam_date", "").strip()
-
-    if topics:
-        topics_text = "\n".join(f"- {t}" for t in topics)
-    else:
-        topics_text = "- Geen specifieke topics. Verdeel de leerstof in logische blokken."
 
-    days_left = None
-    if exam_date_str:
-        try:
-            exam_date = datetime.strptime(exam_date_str, "%Y-%m-%d").date()
-            days_left = (exam_date - date.today()).days
-        except Exception:
-            pass
+def extract_pages_from_file(filepath) -> List[str]:
+    """Tekst per pagina/slide (via de cache van pdf_text), of [] als het niet lukt."""
+    try:
+        return extractors.extract_pages(filepath)
+    except Exception as e:
+        print("Extract error:", e)
+        return []
 
-    if days_left is None:
-        days_info = "Er is geen geldige examendatum ingesteld."
-    else:
-        days_info = f"Er zijn nog ongeveer {days_left} dagen tot het examen."
 
-    prompt = f"""
+STUDY_BLOCKS_INSTRUCTIONS = """
 Je bent een studieplanner in de app Study OS.
 
-Vak: "{course_name}"
-
-Topics / hoofdstukken:
-{topics_text}
-
-Info over examen:
-- {days_info}
-
 Opdracht:
-- Maak een eenvoudige maar realistische studieplanning in maximaal {max_blocks} blokken.
+- Maak een eenvoudige maar realistische studieplanning voor het vak dat onderaan
+  staat, niet meer blokken dan het gevraagde maximum.
 - Elk blok is een concreet stukje werk (bijv. "Hoofdstuk 3 lezen", "Oefenvragen zenuwstelsel").
 - Verdeel de blokken verspreid in de tijd (bijv. vandaag, morgen, later deze week, enz.).
 - Houd de duur tussen 20 en 60 minuten.
@@ -743,20 +877,20 @@ BELANGRIJK:
 - Antwoord in ÉÉN geldig JSON-object, zonder extra uitleg, zonder markdown.
 - Structuur van de JSON is precies:
 
-{{
+{
   "blocks": [
-    {{
+    {
       "title": "Korte titel van het studieblok",
       "duration": "30 min",
       "when": "Vandaag"
-    }},
-    {{
+    },
+    {
       "title": "Volgend blok",
       "duration": "40 min",
       "when": "Morgen"
-    }}
+    }
   ]
-}}
+}
 
 Regels voor 'when':
 - Gebruik korte Nederlandse labels zoals "Vandaag", "Morgen", "Binnen 2 dagen",
@@ -764,14 +898,50 @@ Regels voor 'when':
 - Schrijf GEEN exacte datums, alleen woorden/labels.
 """
 
-    try:
-        resp = client.responses.create(
-            model="gpt-4.1-mini",
-            input=prompt,
-        )
 
-        raw = resp.output_text.strip()
-        print("AI raw JSON voor study blocks:", raw)
+def generate_study_blocks_for_course(course, max_blocks=8):
+    """
+    Laat de AI een studieplanning maken (studieblokken) voor één vak.
+
+    Input: course = dict met minstens:
+      - "name"
+      - "topics" (lijst, mag leeg zijn)
+      - "exam_date" (YYYY-MM-DD, mag leeg zijn)
+
+    Retourneert: (blocks_list, error_text)
+      - blocks_list = lijst van dicts met keys: 'title', 'duration', 'when'
+      - error_text = None als ok, anders foutstring
+    """
+
+    course_name = course.get("name", "dit vak")
+    topics = course.get("topics") or []
+    exam_date_str = course.get("exam_date", "").strip()
+
+    if topics:
+        topics_text = "\n".join(f"- {t}" for t in topics)
+    else:
+        topics_text = "- Geen specifieke topics. Verdeel de leerstof in logische blokken."
+
+    days_left = dates.days_until(exam_date_str)
+
+    if days_left is None:
+        days_info = "Er is geen geldige examendatum ingesteld."
+    else:
+        days_info = f"Er zijn nog ongeveer {days_left} dagen tot het examen."
+
+    prompt, _ = build_prompt(
+        "study_blocks",
+        STUDY_BLOCKS_INSTRUCTIONS,
+        [
+            ("MAXIMAAL AANTAL BLOKKEN", str(max_blocks)),
+            ("VAK", course_name),
+            ("INFO OVER EXAMEN", days_info),
+            ("TOPICS / HOOFDSTUKKEN", topics_text),
+        ],
+    )
+
+    try:
+        raw = _call_ai("study_blocks", prompt)
 
         data = json.loads(raw)
         blocks = data.get("blocks", [])
@@ -801,6 +971,7 @@ Regels voor 'when':
         return cleaned, None
 
     except json.JSONDecodeError as e:
+        ai_metrics.record_json_error("study_blocks")
         print("JSON-fout bij AI study blocks:", e)
         return [], f"JSON-fout: {e}"
 
@@ -809,6 +980,35 @@ Regels voor 'when':
         return [], f"Fout bij AI study blocks: {e}"
 
 
+TOPIC_SUMMARIES_INSTRUCTIONS = """
+Je bent een studie-assistent in Study OS.
+
+Onderaan staan het vak en de topics/hoofdstukken.
+
+Opdracht:
+- Maak voor elk topic een korte, duidelijke samenvatting in het Nederlands.
+- Schrijf in begrijpelijke taal (niveau eerstejaars student).
+- Focus op de kern: wat moet je zeker begrijpen/onthouden per topic?
+
+BELANGRIJK:
+- Antwoord in ÉÉN geldig JSON-object, zonder extra tekst, zonder markdown.
+- Structuur exact als:
+
+{
+  "summaries": [
+    {
+      "topic": "Naam van het topic 1 (exact of bijna exact zoals onderaan)",
+      "summary": "Korte, duidelijke samenvatting van topic 1 in 2–4 zinnen."
+    },
+    {
+      "topic": "Naam van topic 2",
+      "summary": "Samenvatting van topic 2"
+    }
+  ]
+}
+"""
+
+
 def generate_summaries_for_topics(course, max_topics=8):
     """
     Genereer korte samenvattingen per topic voor één vak.
@@ -831,45 +1031,17 @@ def generate_summaries_for_topics(course, max_topics=8):
     topics = topics[:max_topics]
     topics_text = "\n".join(f"- {t}" for t in topics)
 
-    prompt = f"""
-Je bent een studie-assistent in Study OS.
-
-Vak: "{course_name}"
-
-Hier zijn de topics/hoofdstukken:
-{topics_text}
-
-Opdracht:
-- Maak voor elk topic een korte, duidelijke samenvatting in het Nederlands.
-- Schrijf in begrijpelijke taal (niveau eerstejaars student).
-- Focus op de kern: wat moet je zeker begrijpen/onthouden per topic?
-
-BELANGRIJK:
-- Antwoord in ÉÉN geldig JSON-object, zonder extra tekst, zonder markdown.
-- Structuur exact als:
-
-{{
-  "summaries": [
-    {{
-      "topic": "Naam van het topic 1 (exact of bijna exact zoals hierboven)",
-      "summary": "Korte, duidelijke samenvatting van topic 1 in 2–4 zinnen."
-    }},
-    {{
-      "topic": "Naam van topic 2",
-      "summary": "Samenvatting van topic 2"
-    }}
-  ]
-}}
-"""
+    prompt, _ = build_prompt(
+        "topic_summaries",
+        TOPIC_SUMMARIES_INSTRUCTIONS,
+        [
+            ("VAK", course_name),
+            ("TOPICS / HOOFDSTUKKEN", topics_text),
+        ],
+    )
 
     try:
-        resp = client.responses.create(
-            model="gpt-4.1-mini",
-            input=prompt,
-        )
-
-        raw = resp.output_text.strip()
-        print("AI raw JSON voor topic-summaries:", raw)
+        raw = _call_ai("topic_summaries", prompt)
 
         data = json.loads(raw)
         items = data.get("summaries", [])
@@ -892,6 +1064,7 @@ BELANGRIJK:
         return cleaned, None
 
     except json.JSONDecodeError as e:
+        ai_metrics.record_json_error("topic_summaries")
         print("JSON-fout bij AI topic-summaries:", e)
         return [], f"JSON-fout: {e}"
 
@@ -900,30 +1073,10 @@ BELANGRIJK:
         return [], f"Fout bij AI topic-summaries: {e}"
 
 
-def generate_answer_feedback(question_text: str, model_answer: str, user_answer: str) -> str:
-    """
-    Geef vriendelijke, duidelijke feedback op het antwoord van de student.
-
-    Input:
-      - question_text: de oefenvraag
-      - model_answer: het beoogde modelantwoord
-      - user_answer: wat de student heeft ingevuld
-
-    Output:
-      - Een tekst (Nederlands) met feedback en tips.
-    """
-
-    prompt = f"""
+ANSWER_FEEDBACK_INSTRUCTIONS = """
 Je bent een vriendelijke studiecoach in de app Study OS.
 
-Dit is de vraag:
-"{question_text}"
-
-Modelantwoord (referentie):
-"{model_answer}"
-
-Antwoord van de student:
-"{user_answer}"
+Onderaan staan een oefenvraag, het modelantwoord en het antwoord van de student.
 
 Opdracht:
 - Vergelijk het antwoord van de student met het modelantwoord.
@@ -938,17 +1091,59 @@ Schrijf in informele maar respectvolle toon, alsof je een medestudent bent die g
 Geen JSON, geen lijst met bulletpoints, gewoon normale lopende tekst.
 """
 
+
+def generate_answer_feedback(question_text: str, model_answer: str, user_answer: str) -> str:
+    """
+    Geef vriendelijke, duidelijke feedback op het antwoord van de student.
+
+    Input:
+      - question_text: de oefenvraag
+      - model_answer: het beoogde modelantwoord
+      - user_answer: wat de student heeft ingevuld
+
+    Output:
+      - Een tekst (Nederlands) met feedback en tips.
+    """
+
+    prompt, _ = build_prompt(
+        "answer_feedback",
+        ANSWER_FEEDBACK_INSTRUCTIONS,
+        [
+            ("VRAAG", question_text),
+            ("MODELANTWOORD (REFERENTIE)", model_answer),
+            ("ANTWOORD VAN DE STUDENT", user_answer),
+        ],
+    )
+
     try:
-        resp = client.responses.create(
-            model="gpt-4.1-mini",
-            input=prompt,
-        )
-        text = resp.output_text.strip()
-        return text
+        return _call_ai("answer_feedback", prompt)
     except Exception as e:
         print("AI-fout bij answer feedback:", e)
         return f"Er ging iets mis bij het genereren van feedback: {e}"
 
+PDF_STRUCTURE_INSTRUCTIONS = """
+Je bent een AI-studieassistent in Study OS.
+
+Onderaan staat de tekst van een geüploade cursus (PDF).
+
+Genereer de volgende elementen:
+
+1. Een lijst met topics / hoofdstukken (niet meer dan het gevraagde maximum).
+2. Een korte samenvatting van maximaal 6 alinea's.
+3. Een lijst van 10-20 kernbegrippen (key concepts) die centraal staan in dit vak.
+
+BELANGRIJK:
+- Antwoord in ÉÉN geldig JSON-object, zonder extra tekst.
+- Structuur EXACT zo:
+
+{
+  "topics": ["...", "..."],
+  "summary": "Korte samenvatting hier...",
+  "concepts": ["...", "..."]
+}
+"""
+
+
 def generate_structured_data_from_pdf(course_name: str, extracted_text: str, max_topics: int = 12):
     """
     Neemt pure tekst van een PDF en genereert:
@@ -962,51 +1157,303 @@ def generate_structured_data_from_pdf(course_name: str, extracted_text: str, max
     if not extracted_text.strip():
         return [], "", [], "Geen tekst gevonden in PDF."
 
-    prompt = f"""
+    prompt, _ = build_prompt(
+        "pdf_structure",
+        PDF_STRUCTURE_INSTRUCTIONS,
+        [
+            ("MAXIMAAL AANTAL TOPICS", str(max_topics)),
+            ("VAK", course_name),
+            ("TEKST VAN DE CURSUS (PDF)", extracted_text[:PDF_STRUCTURE_MAX_CHARS]),
+        ],
+    )
+
+    try:
+        raw = _call_ai("pdf_structure", prompt)
+
+        data = json.loads(raw)
+
+        topics = data.get("topics", [])
+        summary = data.get("summary", "")
+        concepts = data.get("concepts", [])
+
+        return topics, summary, concepts, None
+
+    except json.JSONDecodeError as e:
+        ai_metrics.record_json_error("pdf_structure")
+        print("JSON-fout bij AI PDF:", e)
+        return [], "", [], f"JSON-fout: {e}"
+
+    except Exception as e:
+        print("AI-fout PDF:", e)
+        return [], "", [], f"AI-fout: {e}"
+
+
+# ==== Lange PDF's: map-reduce ====
+# generate_structured_data_from_pdf ziet maar de eerste 6000 tekens. Voor een
+# volledige cursus knippen we de tekst in chunks (op pagina's en koppen, zie
+# chunking.py), vragen per chunk topics/kernbegrippen/korte samenvatting
+# (map, parallel) en voegen die daarna samen (reduce): eerst lokaal
+# ontdubbelen, dan één AI-aanroep die er een nette lijst van maakt.
+
+PDF_CHUNK_INSTRUCTIONS = """
 Je bent een AI-studieassistent in Study OS.
 
-Vak: "{course_name}"
+Onderaan staat één STUK uit een langere cursustekst (PDF).
+
+Haal uit dit stuk:
+1. De topics / hoofdstukken die hier behandeld worden (maximaal 6).
+2. De belangrijkste kernbegrippen (maximaal 10).
+3. Een samenvatting van dit stuk in 2-4 zinnen.
 
-Hieronder staat de volledige tekst van een geüploade cursus (PDF):
+BELANGRIJK:
+- Alleen wat in dit stuk staat, niets verzinnen.
+- Antwoord in ÉÉN geldig JSON-object, zonder extra tekst.
+- Structuur EXACT zo:
 
-----------------------  
-{extracted_text[:6000]}  
-----------------------
+{
+  "topics": ["...", "..."],
+  "summary": "Korte samenvatting van dit stuk...",
+  "concepts": ["...", "..."]
+}
+"""
 
-Genereer de volgende elementen:
+PDF_MERGE_INSTRUCTIONS = """
+Je bent een AI-studieassistent in Study OS.
 
-1. Een lijst met maximaal {max_topics} topics / hoofdstukken.
-2. Een korte samenvatting van maximaal 6 alinea's.
-3. Een lijst van 10-20 kernbegrippen (key concepts) die centraal staan in dit vak.
+Een lange cursus (PDF) is in stukken geanalyseerd. Onderaan staan de
+kandidaat-topics, kandidaat-kernbegrippen en de samenvattingen per stuk,
+in de volgorde van de cursus.
+
+Maak daarvan:
+1. Eén lijst met topics / hoofdstukken (niet meer dan het gevraagde maximum),
+   in de volgorde van de cursus. Voeg overlappende topics samen.
+2. Een samenvatting van de hele cursus van maximaal 6 alinea's.
+3. Een lijst van 10-20 kernbegrippen (zonder dubbels).
 
 BELANGRIJK:
 - Antwoord in ÉÉN geldig JSON-object, zonder extra tekst.
 - Structuur EXACT zo:
 
-{{
+{
   "topics": ["...", "..."],
   "summary": "Korte samenvatting hier...",
   "concepts": ["...", "..."]
-}}
+}
 """
 
-    try:
-        resp = client.responses.create(
-            model="gpt-4.1-mini",
-            input=prompt
-        )
 
-        raw = resp.output_text.strip()
-        print("AI raw JSON voor PDF:", raw)
+def _dedupe_key(text: str) -> str:
+    """Vergelijkingssleutel: zonder nummering, leestekens en hoofdletters."""
+    text = re.sub(r"^[\s\d.)\-–:]+", "", str(text))
+    return re.sub(r"[^\w]+", " ", text).strip().casefold()
 
-        data = json.loads(raw)
 
-        topics = data.get("topics", [])
-        summary = data.get("summary", "")
-        concepts = data.get("concepts", [])
+def dedupe_preserving_order(items: List[str]) -> List[str]:
+    """Verwijder (bijna-)dubbels, eerste voorkomen blijft staan."""
+    seen = set()
+    result = []
+    for item in items:
+        key = _dedupe_key(item)
+        if key and key not in seen:
+            seen.add(key)
+            result.append(str(item).strip())
+    return result
 
-        return topics, summary, concepts, None
 
+def _chunk_label(chunk: Dict) -> str:
+    if chunk["page_start"] == chunk["page_end"]:
+        pages = f"p. {chunk['page_start']}"
+    else:
+        pages = f"p. {chunk['page_start']}-{chunk['page_end']}"
+    return f"{chunk['source']}, {pages}" if chunk.get("source") else pages
+
+
+def _map_pdf_chunk(course_name: str, chunk: Dict):
+    """Map-stap: topics/kernbegrippen/samenvatting van één chunk (of None bij fout)."""
+    prompt, _ = build_prompt(
+        "pdf_chunk",
+        PDF_CHUNK_INSTRUCTIONS,
+        [
+            ("VAK", course_name),
+            ("BRON", _chunk_label(chunk)),
+            ("STUK VAN DE CURSUS", chunk["text"]),
+        ],
+    )
+    try:
+        data = json.loads(_call_ai("pdf_chunk", prompt))
+        if not isinstance(data, dict):
+            raise ValueError(f"verwacht een JSON-object, kreeg {type(data).__name__}")
+        return {
+            "topics": [str(t) for t in data.get("topics") or [] if t],
+            "concepts": [str(c) for c in data.get("concepts") or [] if c],
+            "summary": str(data.get("summary") or "").strip(),
+            "label": _chunk_label(chunk),
+        }
+    except (json.JSONDecodeError, ValueError, TypeError) as e:
+        ai_metrics.record_json_error("pdf_chunk")
+        print(f"JSON-fout bij PDF-stuk ({_chunk_label(chunk)}):", e)
+        return None
     except Exception as e:
-        print("AI-fout PDF:", e)
-        return [], "", [], f"AI-fout: {e}"
\ No newline at end of file
+        print(f"AI-fout bij PDF-stuk ({_chunk_label(chunk)}):", e)
+        return None
+
+
+def _result_chars(result: Dict) -> int:
+    """Ongeveer hoeveel tekens een map-resultaat inneemt in de merge-prompt."""
+    return (
+        sum(len(t) + 3 for t in result["topics"])
+        + sum(len(c) + 3 for c in result["concepts"])
+        + len(result["summary"]) + len(result["label"]) + 4
+    )
+
+
+def _merge_groups(results: List[Dict]) -> List[List[Dict]]:
+    """
+    Verdeel de resultaten (in volgorde) in groepen die samen in het budget van
+    één pdf_merge-prompt passen. Een groep telt altijd minstens twee
+    resultaten, zodat elke ronde het aantal minstens halveert.
+    """
+    room = PROMPT_BUDGETS["pdf_merge"] * CHARS_PER_TOKEN - len(PDF_MERGE_INSTRUCTIONS) - 500
+    groups: List[List[Dict]] = []
+    current: List[Dict] = []
+    size = 0
+    for result in results:
+        chars = _result_chars(result)
+        if current and size + chars > room and len(current) >= 2:
+            groups.append(current)
+            current, size = [], 0
+        current.append(result)
+        size += chars
+    if current:
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        else:
+            groups.append(current)
+    return groups
+
+
+def _merge_pdf_group(course_name: str, results: List[Dict], max_topics: int) -> Dict:
+    """
+    Eén merge-aanroep over een groep resultaten (lokaal ontdubbeld).
+    Lukt die niet, dan valt het terug op de lokale samenvoeging.
+    """
+    topics = dedupe_preserving_order([t for r in results for t in r["topics"]])
+    concepts = dedupe_preserving_order([c for r in results for c in r["concepts"]])
+    summaries = [f"[{r['label']}] {r['summary']}" for r in results if r["summary"]]
+    label = results[0]["label"] if len(results) == 1 else f"{results[0]['label']} – {results[-1]['label']}"
+
+    prompt, _ = build_prompt(
+        "pdf_merge",
+        PDF_MERGE_INSTRUCTIONS,
+        [
+            ("MAXIMAAL AANTAL TOPICS", str(max_topics)),
+            ("VAK", course_name),
+            ("KANDIDAAT-TOPICS", "\n".join(f"- {t}" for t in topics)),
+            ("KANDIDAAT-KERNBEGRIPPEN", "\n".join(f"- {c}" for c in concepts)),
+            ("SAMENVATTINGEN PER STUK", "\n\n".join(summaries)),
+        ],
+    )
+    try:
+        data = json.loads(_call_ai("pdf_merge", prompt))
+        merged_topics = dedupe_preserving_order(data.get("topics", []))[:max_topics]
+        merged_concepts = dedupe_preserving_order(data.get("concepts", []))
+        summary = str(data.get("summary", "")).strip()
+        if merged_topics or summary:
+            return {
+                "topics": merged_topics,
+                "concepts": merged_concepts or concepts[:20],
+                "summary": summary,
+                "label": label,
+            }
+    except json.JSONDecodeError as e:
+        ai_metrics.record_json_error("pdf_merge")
+        print("JSON-fout bij samenvoegen PDF:", e)
+    except Exception as e:
+        print("AI-fout bij samenvoegen PDF:", e)
+
+    return {
+        "topics": topics[:max_topics],
+        "concepts": concepts[:20],
+        "summary": "\n\n".join(r["summary"] for r in results if r["summary"]),
+        "label": label,
+    }
+
+
+def _reduce_pdf_chunks(course_name: str, results: List[Dict], max_topics: int):
+    """
+    Reduce-stap, hiërarchisch: zolang alles niet in één merge-prompt past,
+    worden groepen die wel passen eerst apart samengevoegd (parallel), en
+    daarna de tussenresultaten. Zo wordt niets uit de kandidaten of
+    samenvattingen weggeknipt door het budget.
+    """
+    level = results
+    while True:
+        groups = _merge_groups(level)
+        if len(groups) == 1:
+            merged = _merge_pdf_group(course_name, groups[0], max_topics)
+            return merged["topics"], merged["summary"], merged["concepts"]
+        print(f"PDF reduce: {len(level)} resultaten in {len(groups)} groepen")
+        with ThreadPoolExecutor(max_workers=max(1, min(AI_PARALLEL_CALLS, len(groups)))) as pool:
+            level = list(pool.map(lambda g: _merge_pdf_group(course_name, g, max_topics), groups))
+
+
+def generate_structured_data_from_pages(
+    course_name: str,
+    documents: List[Tuple[str, List[str]]],
+    max_topics: int = 12,
+    progress=None,
+    done: Dict[int, Dict] = None,
+):
+    """
+    Zelfde resultaat als generate_structured_data_from_pdf, maar over de
+    VOLLEDIGE tekst van één of meer PDF's.
+
+    documents: lijst van (bestandsnaam, [tekst per pagina])
+    progress:  optioneel, progress(klaar, totaal) na elke gelezen chunk
+    done:      optioneel, chunk-index -> map-resultaat van een vorige (deels
+               mislukte) run; die stukken gaan niet opnieuw naar de AI. Wordt
+               in place bijgewerkt met alle gelukte stukken van deze run.
+
+    Retourneert: (topics_list, summary_text, concepts_list, error, failed_chunks)
+      - failed_chunks: indexen van de stukken waarvan de AI-stap mislukte
+        (het resultaat dekt die stukken dan niet; opnieuw proberen)
+    """
+    chunks = []
+    for source, pages in documents:
+        chunks.extend(chunking.chunk_pages(pages, PDF_CHUNK_CHARS, source=source))
+
+    if not chunks:
+        return [], "", [], "Geen tekst gevonden in PDF.", []
+
+    # Past alles in één venster: gewoon de gewone aanroep
+    if len(chunks) == 1:
+        return (*generate_structured_data_from_pdf(course_name, chunks[0]["text"], max_topics), [])
+
+    # Map: elke chunk apart, parallel; stukken die een vorige run al deed
+    # (zelfde paginabereik) worden hergebruikt
+    results = [None] * len(chunks)
+    for i, result in (done or {}).items():
+        if 0 <= i < len(chunks) and result and result.get("label") == _chunk_label(chunks[i]):
+            results[i] = result
+    todo = [i for i, r in enumerate(results) if r is None]
+    reused = len(chunks) - len(todo)
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, min(AI_PARALLEL_CALLS, len(todo)))) as pool:
+            futures = {pool.submit(_map_pdf_chunk, course_name, chunks[i]): i for i in todo}
+            for count, fut in enumerate(as_completed(futures), start=reused + 1):
+                results[futures[fut]] = fut.result()
+                if progress:
+                    progress(count, len(chunks))
+    if done is not None:
+        done.clear()
+        done.update((i, r) for i, r in enumerate(results) if r)
+
+    ok = [r for r in results if r]
+    failed = [i for i, r in enumerate(results) if not r]
+    print(f"PDF map-reduce: {len(chunks)} stukken, {len(ok)} gelukt ({reused} van een vorige run)")
+    if not ok:
+        return [], "", [], "AI-fout: geen enkel stuk van de PDF kon verwerkt worden.", failed
+
+    # Reduce: samenvoegen (volgorde van de cursus blijft behouden)
+    topics, summary, concepts = _reduce_pdf_chunks(course_name, ok, max_topics)
+    return topics, summary, concepts, None, failed
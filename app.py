@@ -1,20 +1,49 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+from flask import Flask, render_template, request, redirect, url_for, jsonify, g, has_request_context
 from werkzeug.utils import secure_filename
+from markupsafe import escape
 import os
 import json
+import time
 import random
-from datetime import date, datetime
+import threading
 import ai_utils
+import ai_metrics
+import blobstore
+import dates
+import extractors
+import file_index
+import ingest
+import jobs
+import migrations
+import question_dedupe
+import search_index
+import snapshot
+import store
+import textstore
+import uploads
 
 app = Flask(__name__)
 
 # === Paden & configuratie ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
+# Vakken/projecten worden bewaard als snapshot (zie snapshot.py); de
+# JSON-bestanden worden alleen nog ingelezen zolang er geen snapshot is
+# (eerste start / terugzetten van een backup) en zijn het exportformaat.
 DATA_FILE = os.path.join(BASE_DIR, "courses_data.json")
 PROJECTS_FILE = os.path.join(BASE_DIR, "projects_data.json")
+DATA_SNAPSHOT = os.path.join(BASE_DIR, "courses_data.snap")
+PROJECTS_SNAPSHOT = os.path.join(BASE_DIR, "projects_data.snap")
+JOBS_FILE = os.path.join(BASE_DIR, "jobs_data.json")
+# Inhoud van notities en AI-chats (los van courses_data.json, zie textstore.py)
+TEXT_FOLDER = os.path.join(BASE_DIR, "text_store")
+
+# Meerdere worker-processen (bv. gunicorn -w 4) op dezelfde data: zet
+# STUDYOS_SHARED_STORE=1 (zie store.py, gedeelde modus).
+SHARED_STORE = os.getenv("STUDYOS_SHARED_STORE", "0") == "1"
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)  # zorg dat map bestaat
+textstore.configure(TEXT_FOLDER)
 
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = 25 * 1024 * 1024  # max 25 MB per upload
@@ -25,14 +54,27 @@ def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def course_file_path(course: dict, filename: str) -> str:
+    """Pad op schijf van een bestand van een vak (zie blobstore)."""
+    return blobstore.file_path(app.config["UPLOAD_FOLDER"], course, filename)
+
+
 # === Data laden & opslaan ===
 
 def load_courses():
-    """Laad cursussen uit JSON-bestand, of gebruik startdata als het niet bestaat."""
+    """
+    Laad cursussen uit de snapshot, anders uit het JSON-bestand (oud formaat
+    of backup), of gebruik startdata als geen van beide bestaat.
+    Retourneert (vakken, digests); digests alleen bij een snapshot (zie
+    store.Store), anders None.
+    """
+    loaded = snapshot.load_indexed(DATA_SNAPSHOT)
+    if loaded is not None:
+        return loaded
     if os.path.exists(DATA_FILE):
         try:
             with open(DATA_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+                return json.load(f), None
         except Exception:
             # als het bestand corrupt is, vallen we terug op defaults
             pass
@@ -91,45 +133,416 @@ def load_courses():
             "qa": [],
             "blocks": [],
         },
-    ]
+    ], None
 
 
 def save_courses():
-    """Schrijf huidige data naar JSON-bestand."""
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(courses_data, f, ensure_ascii=False, indent=2)
+    """Schrijf huidige data naar de snapshot (consistente kopie, zie store.py)."""
+    course_store.save()
+
 
+# Velden die bij elke weergave opnieuw berekend worden, in een kopie
+# (course_view/project_view); ze horen niet in de opgeslagen records
+COURSE_DERIVED_KEYS = (
+    "days_to_exam", "progress_pct", "progress_label",
+    "mastered_questions", "total_questions", "risk_status",
+)
+PROJECT_DERIVED_KEYS = ("days_to_deadline", "status")
 
 # Globale 'database' in geheugen, geladen bij start
-courses_data = load_courses()
+courses_data, _digests = load_courses()
+course_store = store.Store(
+    DATA_SNAPSHOT, courses_data, shared=SHARED_STORE, digests=_digests,
+    volatile_keys=COURSE_DERIVED_KEYS, on_reload=lambda: reload_search_index(),
+    prepare=lambda course: normalize_course(course),
+)
 
 def load_projects():
-    """Laad projecten uit JSON-bestand, of geef lege lijst als het niet bestaat."""
+    """Laad projecten uit de snapshot of het JSON-bestand, of geef een lege lijst (+ digests)."""
+    loaded = snapshot.load_indexed(PROJECTS_SNAPSHOT)
+    if loaded is not None:
+        return loaded
     if os.path.exists(PROJECTS_FILE):
         try:
             with open(PROJECTS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+                return json.load(f), None
         except Exception:
             pass
-    return []
+    return [], None
 
 
 def save_projects():
-    """Schrijf projecten naar JSON-bestand."""
-    with open(PROJECTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(projects_data, f, ensure_ascii=False, indent=2)
+    """Schrijf projecten naar de snapshot (consistente kopie, zie store.py)."""
+    project_store.save()
 
 
 # Globale projecten-lijst
-projects_data = load_projects()
+projects_data, _digests = load_projects()
+project_store = store.Store(
+    PROJECTS_SNAPSHOT, projects_data, shared=SHARED_STORE, digests=_digests,
+    volatile_keys=PROJECT_DERIVED_KEYS, on_reload=lambda: reload_search_index(),
+)
+
+# === Locks per request ===
+# Elke request neemt vooraf de locks die hij nodig heeft (zie store.py) en
+# geeft ze vrij na de route (dan wordt ook opgeslagen); routes zelf hoeven
+# niets te doen. In de gedeelde modus worden eerst de wijzigingen van andere
+# processen ingeladen.
+#   - route met course_id/project_id: lees- of schrijflock op dat ene item
+#     (verwijderen: schrijflock op de hele lijst, want de indexen schuiven op)
+#   - andere routes: leeslock op beide lijsten, of schrijflock bij POST
+#     (nieuw vak/project, demo laden, upload afronden, ...)
+
+# GET-routes die toch iets bewaren (demo-vak toevoegen)
+WRITING_GET_ENDPOINTS = {"load_demo_course"}
+# Routes die geen vakken/projecten aanraken (een upload-stuk kan lang duren)
+UNLOCKED_ENDPOINTS = {"static", "upload_chunk", "job_status", "ai_test", "ai_metrics_overview"}
+
+
+def _request_locks():
+    writes = request.method not in ("GET", "HEAD") or request.endpoint in WRITING_GET_ENDPOINTS
+    args = request.view_args or {}
+    is_delete = (request.endpoint or "").startswith("delete_")
+
+    for key, item_store in (("course_id", course_store), ("project_id", project_store)):
+        if key not in args:
+            continue
+        if is_delete and writes:
+            return [item_store.writing()]
+        return [item_store.at(args[key], write=writes)]
+
+    if writes:
+        return [course_store.writing(), project_store.writing()]
+    return [course_store.reading(), project_store.reading()]
+
+
+@app.before_request
+def acquire_request_locks():
+    if request.endpoint is None or request.endpoint in UNLOCKED_ENDPOINTS:
+        return
+    course_store.refresh()
+    project_store.refresh()
+    g.store_locks = _request_locks()
+    for lock in g.store_locks:
+        lock.__enter__()
+
+
+def _release_store_locks():
+    for lock in reversed(g.pop("store_locks", [])):
+        lock.__exit__(None, None, None)
+
+
+@app.after_request
+def release_request_locks(response):
+    # vrijgeven vóór het antwoord vertrekt: een uitgesteld opslaan dat botst
+    # met een ander proces (store.ConflictError) wordt zo nog een 409
+    try:
+        _release_store_locks()
+    except store.ConflictError as e:
+        print(e)
+        return conflict_response(e)
+    # pas na het opslaan: opruimen ziet dan wat echt op schijf staat
+    if g.pop("collect_garbage", False) or (
+        request.method not in ("GET", "HEAD") and time.monotonic() - _last_gc >= GC_INTERVAL
+    ):
+        collect_garbage_in_background(g.pop("gc_dropped_legacy", []))
+    return response
+
+
+@app.teardown_request
+def release_request_locks_on_error(exc):
+    # na een exception in de route is after_request niet gelopen
+    try:
+        _release_store_locks()
+    except store.ConflictError as e:
+        print(e)
+
+
+def conflict_response(e: store.ConflictError):
+    message = "Dit werd intussen in een ander venster/proces gewijzigd. Herlaad de pagina en probeer opnieuw."
+    if request.accept_mimetypes.best == "application/json":
+        return app.make_response((jsonify({"error": message, "conflict": e.names}), 409))
+    return app.make_response((message, 409))
+
+# === AI-achtergrondtaken ===
+# Trage AI-routes zetten een job in deze wachtrij en antwoorden meteen.
+AI_JOB_WORKERS = int(os.getenv("STUDYOS_AI_WORKERS", "2"))
+# Max. aantal AI-jobs dat per vak tegelijk draait
+AI_JOBS_PER_COURSE = int(os.getenv("STUDYOS_AI_JOBS_PER_COURSE", "1"))
+if SHARED_STORE:
+    # elk proces heeft zijn eigen wachtrij; status opvragen kijkt ook bij de andere
+    job_queue = jobs.JobQueue(
+        jobs.process_path(JOBS_FILE), workers=AI_JOB_WORKERS,
+        max_per_course=AI_JOBS_PER_COURSE, peer_pattern=jobs.process_path(JOBS_FILE, "*"),
+    )
+else:
+    job_queue = jobs.JobQueue(JOBS_FILE, workers=AI_JOB_WORKERS, max_per_course=AI_JOBS_PER_COURSE)
+
+# Uploads in stukken (zie uploads.py); mag groter zijn dan MAX_CONTENT_LENGTH,
+# want die geldt nu per stuk
+CHUNKED_UPLOAD_MAX_SIZE = 200 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+chunked_uploads = uploads.ChunkedUploads(
+    os.path.join(UPLOAD_FOLDER, blobstore.BLOB_DIRNAME, ".partial"),
+    max_size=CHUNKED_UPLOAD_MAX_SIZE,
+)
+
+SEARCH_PER_PAGE = 20
+SEARCH_KIND_LABELS = {
+    "course": "Vak",
+    "topic": "Topic",
+    "summary": "Samenvatting",
+    "qa": "Vraag",
+    "note": "Notitie",
+    "project": "Project",
+    "task": "Taak",
+}
+
+JOB_LABELS = {
+    "topics": "AI: topics genereren",
+    "summaries": "AI: samenvattingen per topic",
+    "plan": "AI: studieplanning",
+    "questions": "AI: oefenvragen",
+    "exam": "AI: examen genereren",
+    "pdf": "AI: PDF-analyse",
+    "note_questions": "AI: vragen uit notitie",
+    "note_summary": "AI: samenvatting uit notitie",
+    "ingest": "Bestand verwerken",
+}
+
+# Afgeronde jobs blijven zo lang zichtbaar op de vakpagina (seconden)
+RECENT_JOB_SECONDS = 15 * 60
+
+# Hoeveel cursustekst (in tekens) de topics-stap per bestand gebruikt.
+# Meer lezen heeft geen zin: de prompt wordt toch op dit budget ingekort.
+TOPICS_TEXT_BUDGET = ai_utils.PROMPT_BUDGETS["topics"] * ai_utils.CHARS_PER_TOKEN
+
+# Na een upload meteen ook topics laten genereren (STUDYOS_INGEST_TOPICS=0 om uit te zetten)
+INGEST_AUTO_TOPICS = os.getenv("STUDYOS_INGEST_TOPICS", "1") != "0"
+
+
+# Volgorde van risk_status voor de AI-wachtrij (kleiner = eerst)
+RISK_PRIORITY = {
+    "Examen alarm": 0,
+    "Nog even doorduwen": 1,
+    "Extra focus nodig": 1,
+    "Ready voor examen": 2,
+    "Op schema": 2,
+    "Rustig opstarten": 3,
+    "Ruime marge": 3,
+}
+
+
+def ai_job_priority(course: dict):
+    """
+    Prioriteit van een AI-job voor dit vak: eerst op risk_status
+    ("Examen alarm" vooraan), daarna op dagen tot het examen.
+    Vakken zonder (toekomstige) examendatum komen achteraan.
+    """
+    view = course_view(course)
+    days = view["days_to_exam"]
+    if days is None or days < 0:
+        return (9, 9999)
+    return (RISK_PRIORITY.get(view["risk_status"], 4), days)
+
+
+def submit_ai_job(kind: str, course_id: int, work, apply) -> str:
+    """
+    Zet een AI-job in de wachtrij voor dit vak (met prioriteit) en geef het job-id.
+    `work` draait in een worker-thread zonder locks: het mag het vak zelf niet
+    lezen, enkel invoer die de route vooraf vastlegde (course_store.copy_of,
+    onder de lock van de request). `apply` krijgt de schrijflock.
+    """
+    course = courses_data[course_id]
+
+    def apply_and_index(result):
+        # draait in een worker-thread: zelf de schrijflock op het vak nemen
+        course_store.refresh()
+        with course_store.writing(course):
+            current_id = course_store.index_of(course)
+            if current_id is None:
+                print(f"Vak '{course.get('name', '')}' is intussen verwijderd; resultaat genegeerd.")
+                return
+            if apply is not None:
+                apply(result)
+            index_course(current_id)
+
+    return job_queue.submit(
+        kind, course_id, course.get("name", ""), work, apply_and_index,
+        priority=ai_job_priority(course),
+    )
+
+
+def enqueue_ai_job(kind: str, course_id: int, work, apply, redirect_url: str):
+    """
+    Zet een AI-job in de wachtrij voor dit vak.
+    JSON-clients krijgen 202 + job-id terug, formulieren een redirect.
+    """
+    job_id = submit_ai_job(kind, course_id, work, apply)
+
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({
+            "job_id": job_id,
+            "status_url": url_for("job_status", job_id=job_id),
+        }), 202
+    return redirect(redirect_url)
+
+
+def recent_ai_jobs(course_id: int):
+    """Lopende + recent afgeronde AI-jobs van een vak, met leesbaar label."""
+    course = courses_data[course_id]
+    now = time.time()
+    result = []
+    for job in job_queue.jobs_for_course(course_id, course.get("name", "")):
+        finished_at = job.get("finished_at")
+        if finished_at and now - finished_at > RECENT_JOB_SECONDS:
+            continue
+        job["label"] = JOB_LABELS.get(job["kind"], job["kind"])
+        result.append(job)
+    return result
+
+# === Globale zoekindex ===
+# Zie search_index.py. De index wordt één keer opgebouwd bij het opstarten
+# (na de migraties, zie verder); daarna houden we hem bij na elke POST (enkel
+# het vak/project uit de URL) en na elke AI-job. /search leest alleen.
+
+search_idx = search_index.SearchIndex()
+# volledige herbouw (nieuw/verwijderd vak, herladen) één tegelijk
+_search_lock = threading.Lock()
+
+
+def course_search_docs(course_id: int, course: dict):
+    """Zoekbare documenten van één vak (zie search_index voor het formaat)."""
+    base = f"c{course_id}"
+    name = course.get("name", "")
+
+    def doc(suffix, kind, title, text, endpoint, **params):
+        return {
+            "id": f"{base}:{suffix}", "kind": kind, "title": title or "", "text": text or "",
+            "context": name, "endpoint": endpoint, "params": dict(course_id=course_id, **params),
+        }
+
+    yield doc("course", "course", name, f"{course.get('tag', '')} {course.get('chapters', '')}", "course_detail")
+    for i, topic in enumerate(course.get("topics") or []):
+        yield doc(f"topic:{i}", "topic", topic, "", "course_detail", view="topics")
+    summaries = course.get("summaries") or {}
+    if isinstance(summaries, dict):
+        for topic, summary in summaries.items():
+            yield doc(f"summary:{topic}", "summary", topic, summary, "course_detail", view="topics")
+    for i, qa in enumerate(course.get("qa") or []):
+        yield doc(f"qa:{i}", "qa", qa.get("question", ""), qa.get("answer", ""), "course_detail", view="questions")
+    notes = course.get("notes")
+    if isinstance(notes, dict):
+        for fi, folder in enumerate(notes.get("folders") or []):
+            for ni, note in enumerate(folder.get("notes") or []):
+                yield doc(
+                    f"note:{fi}:{ni}", "note", note.get("title", ""), textstore.note_text(note, cache=False),
+                    "course_notes", folder=fi, note=ni,
+                )
+
+
+def project_search_docs(project_id: int, project: dict):
+    """Zoekbare documenten van één project: het project zelf + taken."""
+    base = f"p{project_id}"
+    title = project.get("title", "")
+    yield {
+        "id": f"{base}:project", "kind": "project", "title": title,
+        "text": f"{project.get('description', '')}\n{project.get('notes', '')}",
+        "context": project.get("tag", ""), "endpoint": "project_detail",
+        "params": {"project_id": project_id},
+    }
+    for i, task in enumerate(project.get("tasks") or []):
+        yield {
+            "id": f"{base}:task:{i}", "kind": "task", "title": task.get("title", ""), "text": "",
+            "context": title, "endpoint": "project_detail", "params": {"project_id": project_id},
+        }
+
+
+def index_course(course_id: int):
+    if 0 <= course_id < len(courses_data):
+        search_idx.update_group(f"course:{course_id}", course_search_docs(course_id, courses_data[course_id]))
+
+
+def index_project(project_id: int):
+    if 0 <= project_id < len(projects_data):
+        search_idx.update_group(f"project:{project_id}", project_search_docs(project_id, projects_data[project_id]))
+
+
+def reload_search_index():
+    """Na het inladen van wijzigingen van een ander proces."""
+    rebuild_search_index()
+
+
+def rebuild_search_index():
+    """Alles (opnieuw) indexeren; ongewijzigde documenten worden overgeslagen."""
+    with _search_lock:
+        search_idx.remove_groups_from("course:", len(courses_data))
+        search_idx.remove_groups_from("project:", len(projects_data))
+        for i in range(len(courses_data)):
+            index_course(i)
+        for i in range(len(projects_data)):
+            index_project(i)
+
+
+@app.after_request
+def update_search_index(response):
+    """Na een wijziging (POST) de zoekindex van het betrokken vak/project bijwerken."""
+    if request.method != "POST":
+        return response
+
+    args = request.view_args or {}
+    is_delete = (request.endpoint or "").startswith("delete_")
+    if "course_id" in args and not is_delete:
+        index_course(args["course_id"])
+    elif "project_id" in args and not is_delete:
+        index_project(args["project_id"])
+    else:
+        # nieuw vak/project, verwijderen (indexen schuiven op), ...
+        rebuild_search_index()
+    return response
+
+
+@app.route("/search")
+def global_search():
+    """
+    Zoeken over alle vakken, topics, samenvattingen, vragen, notities en projecten.
+    ?q=...&page=1&kind=note (kind optioneel, mag meerdere keren)
+    """
+    query = request.args.get("q", "").strip()
+    page = max(1, request.args.get("page", 1, type=int))
+    kinds = set(request.args.getlist("kind")) or None
+
+    start = time.perf_counter()
+    found = search_idx.search(query, page=page, per_page=SEARCH_PER_PAGE, kinds=kinds)
+    took_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    for r in found["results"]:
+        r["url"] = url_for(r["endpoint"], **r["params"])
+
+    if request.accept_mimetypes.best == "application/json":
+        for r in found["results"]:
+            r["snippet"] = "".join(text for text, _ in r["snippet"])
+        return jsonify(dict(found, query=query, took_ms=took_ms))
+
+    pages = max(1, -(-found["total"] // SEARCH_PER_PAGE))
+    return render_template(
+        "search.html",
+        query=query,
+        kinds=kinds or set(),
+        kind_labels=SEARCH_KIND_LABELS,
+        found=found,
+        pages=pages,
+        took_ms=took_ms,
+        indexed=len(search_idx),
+    )
+
 
 @app.route("/projects")
 def projects_overview():
     """
     Overzicht van alle projecten (thesis, eindwerk, papers, ...).
     """
-    attach_project_deadlines()
-    return render_template("projects.html", projects=projects_data)
+    return render_template("projects.html", projects=project_views())
 
 
 @app.route("/projects/new", methods=["POST"])
@@ -154,9 +567,8 @@ def new_project():
         "tasks": [],
         "notes": "",
     }
-    projects_data.append(project)
+    projects_data.append(normalize_project(project))
     save_projects()
-    attach_project_deadlines()
 
     project_id = len(projects_data) - 1
     return redirect(url_for("project_detail", project_id=project_id))
@@ -167,8 +579,7 @@ def project_detail(project_id: int):
     if not (0 <= project_id < len(projects_data)):
         return redirect(url_for("projects_overview"))
 
-    attach_project_deadlines()
-    project = projects_data[project_id]
+    project = project_view(projects_data[project_id])
     return render_template(
         "project_detail.html",
         project=project,
@@ -239,13 +650,11 @@ def exams_overview():
     """
     Overzichtspagina met alle vakken gesorteerd op examendatum + status.
     """
-    attach_exam_countdown()  # zorgt voor days_to_exam, progress en risk_status
-
     upcoming = []
     past = []
     no_date = []
 
-    for c in courses_data:
+    for c in course_views():  # met days_to_exam, progress en risk_status
         d = c.get("days_to_exam")
         if d is None:
             no_date.append(c)
@@ -270,7 +679,7 @@ def exams_overview():
 
 def ensure_notes_structure(course: dict):
     """
-    Zorgt ervoor dat course['notes'] een geldige structuur heeft:
+    Geeft course['notes'] terug:
     {
       "folders": [
         {
@@ -281,69 +690,106 @@ def ensure_notes_structure(course: dict):
         }
       ]
     }
+    Die structuur is gegarandeerd door het schema (zie migrations.py);
+    hier wordt niets meer rechtgezet.
     """
-    notes = course.get("notes")
-    if not isinstance(notes, dict):
-        notes = {"folders": []}
-        course["notes"] = notes
-
-    if "folders" not in notes or not isinstance(notes["folders"], list):
-        notes["folders"] = []
+    return course["notes"]
 
-    return notes
 def ensure_ai_history(course: dict):
     """
-    Zorgt ervoor dat course['ai_chat_history'] een lijst is.
+    Geeft de AI-chatgeschiedenis van een vak als (nieuwe) lijst; die staat
+    in een apart bestand (course['ai_chat_ref'], zie textstore.py).
     Structuur: [{"role": "user"|"assistant", "content": "..."}]
+    Wijzigingen bewaren met textstore.store_chat().
     """
-    history = course.get("ai_chat_history")
-    if not isinstance(history, list):
-        history = []
-        course["ai_chat_history"] = history
-    return history
+    return textstore.load_chat(course)
 
-def attach_project_deadlines():
+
+def normalize_course(course: dict) -> dict:
     """
-    Voeg days_to_deadline + simpele status toe aan elk project.
-    deadline: YYYY-MM-DD of leeg.
+    Breng een vak naar de laatste schemaversie (migrations.py; enkel als het
+    record ouder is) en zet de notities klaar als LazyNote (textstore).
+    Gebeurt bij het laden en bij het aanmaken van een vak, zodat weergaves
+    en tellingen niets meer hoeven om te zetten.
     """
-    today = date.today()
-    for p in projects_data:
-        deadline_str = p.get("deadline") or ""
-        p["days_to_deadline"] = None
-
-        if deadline_str:
-            try:
-                d = datetime.strptime(deadline_str, "%Y-%m-%d").date()
-                p["days_to_deadline"] = (d - today).days
-            except ValueError:
-                p["days_to_deadline"] = None
+    migrations.migrate(course, "course")
+    textstore.externalize_chat(course)
+    textstore.externalize_notes(course)
+    return course
+
+
+def normalize_project(project: dict) -> dict:
+    migrations.migrate(project, "project")
+    return project
+
+
+# Migraties één keer, vak per vak, bij het opstarten. Een record dat al op
+# de laatste schemaversie staat kost hier één dict-lookup (+ notities als
+# LazyNote); alleen als er echt iets omgezet werd, wordt er opgeslagen (en
+# pas dan coderen de stores elk record opnieuw). Opruimen (textstore, blobs)
+# gebeurt niet bij het opstarten maar in de achtergrond, zie
+# collect_garbage_in_background.
+_changed = {
+    course_store: migrations.migrate_all(courses_data, "course"),
+    project_store: migrations.migrate_all(projects_data, "project"),
+}
+for _course in courses_data:
+    # ook na de migraties: inhoud die toch nog in het record staat
+    if textstore.externalize_chat(_course) | textstore.externalize_notes(_course):
+        _changed[course_store] += 1
+for _store, _count in _changed.items():
+    if not _count:
+        continue
+    try:
+        _store.save()
+    except store.ConflictError:
+        # gedeelde modus: een ander proces dat tegelijk startte was ons voor
+        # met hetzelfde rechtzetten; zijn versie inladen
+        _store.refresh()
 
-        # Kleine statuslogica
-        progress = int(p.get("progress_pct", 0) or 0)
-        days = p["days_to_deadline"]
+# Zoekindex één keer opbouwen, voor de eerste request (zie "Globale zoekindex")
+rebuild_search_index()
 
-        if days is None:
-            status = "Geen deadline"
-        elif days < 0:
-            status = "Deadline voorbij"
-        elif days <= 7:
-            if progress >= 70:
-                status = "Laatste sprint"
-            else:
-                status = "Deadline alarm"
-        elif days <= 21:
-            if progress >= 50:
-                status = "Op schema"
-            else:
-                status = "Extra focus nodig"
+def project_view(project: dict) -> dict:
+    """
+    Kopie van een project voor de weergave, met days_to_deadline + simpele
+    status (PROJECT_DERIVED_KEYS); het opgeslagen project blijft ongemoeid.
+    deadline: YYYY-MM-DD of leeg (aantal dagen gecachet per dag, zie dates.py).
+    """
+    p = dict(project)
+    p["days_to_deadline"] = dates.days_until(p.get("deadline"))
+
+    # Kleine statuslogica
+    progress = p.get("progress_pct", 0)
+    days = p["days_to_deadline"]
+
+    if days is None:
+        status = "Geen deadline"
+    elif days < 0:
+        status = "Deadline voorbij"
+    elif days <= 7:
+        if progress >= 70:
+            status = "Laatste sprint"
         else:
-            if progress >= 30:
-                status = "Rustige opbouw"
-            else:
-                status = "Opstart"
+            status = "Deadline alarm"
+    elif days <= 21:
+        if progress >= 50:
+            status = "Op schema"
+        else:
+            status = "Extra focus nodig"
+    else:
+        if progress >= 30:
+            status = "Rustige opbouw"
+        else:
+            status = "Opstart"
+
+    p["status"] = status
+    return p
 
-        p["status"] = status
+
+def project_views() -> list:
+    """project_view() van elk project, in dezelfde volgorde (index = project_id)."""
+    return [project_view(p) for p in projects_data]
 
 # === Helpers voor AI-demo functies ===
 
@@ -370,7 +816,6 @@ def generate_auto_questions_for_course(course: dict, max_questions: int = 6):
         topics = [course.get("name", "deze cursus")]
 
     existing = {item.get("question", "") for item in course.get("qa", [])}
-    course.setdefault("qa", [])
 
     random_topics = topics[:]
     random.shuffle(random_topics)
@@ -385,9 +830,9 @@ def generate_auto_questions_for_course(course: dict, max_questions: int = 6):
             q = template.format(topic=topic)
             if q in existing:
                 continue
-            course["qa"].append({"question": q, "answer": "—"})
             existing.add(q)
-            created += 1
+            added, _ = question_dedupe.add_questions(course, [{"question": q, "answer": "—"}])
+            created += added
 
 
 def generate_auto_plan_for_course(course: dict, max_blocks: int = 6):
@@ -434,6 +879,8 @@ def compute_course_progress(course: dict):
     - hoeveelheid structuur (topics, vragen, blokken, summaries)
     - hoe goed je de vragen al kent (flashcard stats: correct/wrong)
     - en leid een eenvoudige exam-status af (risk_status).
+    Schrijft de velden in `course`: geef een weergave mee (course_view),
+    niet het opgeslagen vak.
     """
 
     topics = course.get("topics") or []
@@ -463,8 +910,8 @@ def compute_course_progress(course: dict):
     # 2) Mastery-score (hoeveel vragen je echt al "kent")
     mastered = 0
     for item in qa:
-        correct = int(item.get("correct", 0) or 0)
-        wrong = int(item.get("wrong", 0) or 0)
+        correct = item.get("correct", 0)
+        wrong = item.get("wrong", 0)
         # simpele regel: minstens 1x "Ik wist deze" en niet vaker fout dan juist
         if correct > 0 and correct >= wrong:
             mastered += 1
@@ -526,36 +973,35 @@ def compute_course_progress(course: dict):
     course["risk_status"] = risk_status
 
 
-def attach_exam_countdown():
+def course_view(course: dict) -> dict:
     """
-    Voeg 'days_to_exam' toe aan elk vak op basis van exam_date (YYYY-MM-DD).
-    En bereken ook automatisch een voortgangsscore + status per vak.
+    Kopie van een vak voor de weergave, met 'days_to_exam' op basis van
+    exam_date (YYYY-MM-DD; aantal dagen gecachet per dag, zie dates.py) en
+    een voortgangsscore + status (COURSE_DERIVED_KEYS).
+    Het opgeslagen vak wordt niet aangeraakt: een GET-route heeft er
+    hoogstens een leeslock op. De kopie is ondiep; topics, qa, ... worden
+    enkel gelezen.
     """
-    today = date.today()
-    for course in courses_data:
-        exam_str = course.get("exam_date")
-        course["days_to_exam"] = None
+    view = dict(course)
+    view["days_to_exam"] = dates.days_until(course.get("exam_date"))
+    compute_course_progress(view)
+    return view
 
-        if exam_str:
-            try:
-                exam_date = datetime.strptime(exam_str, "%Y-%m-%d").date()
-                course["days_to_exam"] = (exam_date - today).days
-            except ValueError:
-                course["days_to_exam"] = None
 
-        # Na het updaten van days_to_exam ook progress + risk_status berekenen
-        compute_course_progress(course)
+def course_views() -> list:
+    """course_view() van elk vak, in dezelfde volgorde (index = course_id)."""
+    return [course_view(course) for course in courses_data]
 
 
 # === Routes ===
 
 @app.route("/")
 def home():
-    attach_exam_countdown()
+    views = course_views()
 
     # Verzamel alle blokken die voor "Vandaag" gepland staan
     today_blocks = []
-    for idx, course in enumerate(courses_data):
+    for idx, course in enumerate(views):
         for block in course.get("blocks", []):
             when_text = (block.get("when") or "").lower()
             if "vandaag" in when_text:
@@ -571,7 +1017,7 @@ def home():
 
     # Focus-vakken bepalen (meest dringend t.o.v. examen)
     focus_candidates = []
-    for idx, course in enumerate(courses_data):
+    for idx, course in enumerate(views):
         days = course.get("days_to_exam")
         status = (course.get("risk_status") or "").lower()
 
@@ -602,14 +1048,13 @@ def home():
 
     return render_template(
         "index.html",
-        courses=courses_data,
+        courses=views,
         today_blocks=today_blocks,
         focus_courses=focus_courses,
     )
 @app.route("/courses")
 def courses():
-    attach_exam_countdown()
-    return render_template("courses.html", courses=courses_data)
+    return render_template("courses.html", courses=course_views())
 
 
 @app.route("/courses/new", methods=["GET", "POST"])
@@ -622,7 +1067,7 @@ def new_course():
         questions = request.form.get("questions", "").strip()
 
         if name:
-            courses_data.append(
+            courses_data.append(normalize_course(
                 {
                     "name": name,
                     "chapters": chapters or "Nog geen hoofdstukken",
@@ -635,7 +1080,7 @@ def new_course():
                     "qa": [],
                     "blocks": [],
                 }
-            )
+            ))
             save_courses()
 
         return redirect(url_for("courses"))
@@ -690,8 +1135,6 @@ def course_notes(course_id: int):
             active_note = None
             note_index = 0
 
-    save_courses()  # structuur bewaren als hij net aangemaakt is
-
     # AI-botnaam
     assistant_name = f"{course.get('name', 'Vak')} Coach"
 
@@ -706,6 +1149,7 @@ def course_notes(course_id: int):
         active_note=active_note,
         ai_history=history,
         assistant_name=assistant_name,
+        ai_jobs=recent_ai_jobs(course_id),
     )
 
 @app.route("/courses/<int:course_id>/notes/folders/add", methods=["POST"])
@@ -738,6 +1182,7 @@ def delete_notes_folder(course_id: int, folder_index: int):
     if 0 <= folder_index < len(folders):
         del folders[folder_index]
         save_courses()
+        request_garbage_collection()
 
     return redirect(url_for("course_notes", course_id=course_id))
 
@@ -759,7 +1204,7 @@ def add_note(course_id: int, folder_index: int):
     if title:
         folder = folders[folder_index]
         folder.setdefault("notes", [])
-        folder["notes"].append({"title": title, "content": ""})
+        folder["notes"].append(textstore.new_note(title))
         save_courses()
         note_index = len(folder["notes"]) - 1
         return redirect(url_for("course_notes", course_id=course_id, folder=folder_index, note=note_index))
@@ -815,6 +1260,7 @@ def delete_note(course_id: int, folder_index: int, note_index: int):
     if 0 <= note_index < len(notes_list):
         del notes_list[note_index]
         save_courses()
+        request_garbage_collection()
 
     return redirect(url_for("course_notes", course_id=course_id, folder=folder_index))
 
@@ -855,7 +1301,7 @@ def course_notes_ai_chat(course_id: int):
         new_history = history
         error_text = str(e)
 
-    course["ai_chat_history"] = new_history
+    textstore.store_chat(course, new_history)
     save_courses()
 
     return jsonify({
@@ -872,34 +1318,85 @@ def course_notes_ai_clear(course_id: int):
         return jsonify({"error": "Onbekend vak"}), 400
 
     course = courses_data[course_id]
-    course["ai_chat_history"] = []
+    textstore.store_chat(course, [])
     save_courses()
+    request_garbage_collection()
 
     return jsonify({"ok": True})
 
 @app.route("/courses/<int:course_id>")
 def course_detail(course_id: int):
     if 0 <= course_id < len(courses_data):
-        attach_exam_countdown()
-        course = courses_data[course_id]
+        course = course_view(courses_data[course_id])
     else:
         return redirect(url_for("courses"))
 
     # welke subpagina van het vak willen we tonen?
     view = request.args.get("view", "overview")
 
-    # progress / risk_status opnieuw berekenen (als je compute_course_progress hebt)
-    try:
-        compute_course_progress(course)
-    except Exception:
-        pass
-
     return render_template(
         "course_detail.html",
         course=course,
         course_id=course_id,
         view=view,
+        ai_jobs=recent_ai_jobs(course_id),
+        is_extractable=extractors.is_supported,
+        meta_error=request.args.get("meta_error"),
+    )
+@app.route("/courses/<int:course_id>/search")
+def course_search(course_id: int):
+    """
+    Zoek in de tekst van alle bestanden van dit vak (per pagina).
+    Bestanden die de ingest-job nog niet indexeerde worden overgeslagen.
+    JSON-clients krijgen de resultaten als JSON, anders de vakpagina met view=search.
+    """
+    if not (0 <= course_id < len(courses_data)):
+        return redirect(url_for("courses"))
+
+    course = courses_data[course_id]
+    query = request.args.get("q", "").strip()
+    files = [
+        (f, course_file_path(course, f))
+        for f in course.get("files", [])
+        if extractors.is_supported(f) and os.path.exists(course_file_path(course, f))
+    ]
+
+    start = time.perf_counter()
+    results = file_index.search(files, query) if query else []
+    took_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({
+            "query": query,
+            "took_ms": took_ms,
+            "results": [
+                {
+                    "file": r["file"],
+                    "page": r["page"],
+                    "score": r["score"],
+                    "snippet": "".join(text for text, _ in r["snippet"]),
+                    "snippet_html": "".join(
+                        f"<mark>{escape(text)}</mark>" if hit else str(escape(text))
+                        for text, hit in r["snippet"]
+                    ),
+                }
+                for r in results
+            ],
+        })
+
+    return render_template(
+        "course_detail.html",
+        course=course_view(course),
+        course_id=course_id,
+        view="search",
+        ai_jobs=recent_ai_jobs(course_id),
+        is_extractable=extractors.is_supported,
+        query=query,
+        results=results,
+        took_ms=took_ms,
     )
+
+
 @app.route("/courses/<int:course_id>/delete", methods=["POST"])
 def delete_course(course_id: int):
     """
@@ -910,12 +1407,15 @@ def delete_course(course_id: int):
     if not (0 <= course_id < len(courses_data)):
         return redirect(url_for("courses"))
 
-    # Optioneel: hier zouden we ook geüploade bestanden van dit vak kunnen verwijderen.
-    # Voor nu laten we de files fysiek staan om risico op verkeerde delete te vermijden.
-
     # Vak verwijderen uit de lijst
-    del courses_data[course_id]
+    course = courses_data.pop(course_id)
     save_courses()
+    question_dedupe.forget(course)
+
+    # Bestanden waar geen ander vak nog naar verwijst opruimen
+    refs = course.get("file_blobs") or {}
+    legacy = [f for f in course.get("files", []) if f not in refs]
+    request_garbage_collection(dropped_legacy=legacy)
 
     return redirect(url_for("courses"))
 
@@ -938,24 +1438,30 @@ def course_exam(course_id: int):
         except Exception:
             num_q = 10
         num_q = max(4, min(num_q, 30))  # 4–30 vragen
+        # de job werkt op een kopie (zie submit_ai_job)
+        source = course_store.copy_of(course)
+
+        def work(progress):
+            questions, error_text = ai_utils.generate_exam_for_course(
+                course=source,
+                notes_data=ensure_notes_structure(source),
+                num_questions=num_q,
+            )
+            if error_text:
+                print("Exam gen error:", error_text)
+            if not questions:
+                raise RuntimeError(error_text or "Geen examenvragen ontvangen.")
+            return questions
 
-        questions, error_text = ai_utils.generate_exam_for_course(
-            course=course,
-            notes_data=notes_data,
-            num_questions=num_q,
-        )
-
-        if questions:
+        def apply(questions):
             course["exam_session"] = {
                 "questions": questions,
                 "num_questions": len(questions),
             }
             course["exam_result"] = None
             save_courses()
-            return redirect(url_for("course_exam_take", course_id=course_id))
 
-        if error_text:
-            print("Exam gen error:", error_text)
+        return enqueue_ai_job("exam", course_id, work, apply, url_for("course_exam", course_id=course_id))
 
     # als er al een examen bestaat, laten we dat zien op de config-pagina
     exam_session = course.get("exam_session")
@@ -968,6 +1474,7 @@ def course_exam(course_id: int):
         mode="config",
         exam_session=exam_session,
         exam_result=exam_result,
+        ai_jobs=recent_ai_jobs(course_id),
     )
 @app.route("/courses/<int:course_id>/exam/take", methods=["GET", "POST"])
 def course_exam_take(course_id: int):
@@ -1087,12 +1594,23 @@ def edit_course_meta(course_id: int):
         course["questions"] = questions
 
     # Examendatum: zelfs lege string is toegestaan => verwijdert datum
-    course["exam_date"] = exam_date
+    # "25 jan", "25/01/2026", ... meteen als YYYY-MM-DD bewaren; zelfde regel
+    # als migratie course v3: onleesbare invoer gaat naar exam_date_raw
+    iso = dates.to_iso(exam_date)
+    course["exam_date"] = iso or ""
+    error = None
+    if iso is None and exam_date:
+        course["exam_date_raw"] = exam_date
+        error = f"Examendatum '{exam_date}' niet herkend; gebruik YYYY-MM-DD (of bv. 25/01/2026)."
+    else:
+        course.pop("exam_date_raw", None)
 
-    # Na wijzigingen: opnieuw countdown + progress berekenen
     save_courses()
-    attach_exam_countdown()
 
+    if error:
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify({"error": error}), 400
+        return redirect(url_for("course_detail", course_id=course_id, meta_error=error))
     return redirect(url_for("course_detail", course_id=course_id))
 
 @app.route("/backup")
@@ -1101,17 +1619,35 @@ def backup_overview():
     Grote export/backup-weergave van alle vakken (en eventueel projecten).
     Alles netjes onder elkaar om te kunnen bewaren/kopiëren/printen.
     """
-    attach_exam_countdown()
-
     # Probeer projecten als ze bestaan, anders gewoon lege lijst
     projects = globals().get("projects_data", [])
 
     return render_template(
         "backup.html",
-        courses=courses_data,
+        courses=course_views(),
         projects=projects,
     )
 
+@app.route("/backup/<kind>.json")
+def backup_json(kind: str):
+    """
+    Volledige JSON-export (zelfde formaat als courses_data.json /
+    projects_data.json, met notitie-inhoud en chats erin). Terugzetten: het
+    bestand als courses_data.json bewaren en courses_data.snap verwijderen.
+    """
+    if kind == "courses":
+        data = [textstore.inline_course(c) for c in course_store.snapshot()]
+        body = course_store.export_json(data)
+    elif kind == "projects":
+        body = project_store.export_json()
+    else:
+        return redirect(url_for("backup_overview"))
+    return app.response_class(
+        body,
+        mimetype="application/json",
+        headers={"Content-Disposition": f"attachment; filename={kind}_data.json"},
+    )
+
 @app.route("/courses/<int:course_id>/export")
 def export_course(course_id: int):
     """
@@ -1125,8 +1661,7 @@ def export_course(course_id: int):
     if not (0 <= course_id < len(courses_data)):
         return redirect(url_for("courses"))
 
-    attach_exam_countdown()
-    course = courses_data[course_id]
+    course = course_view(courses_data[course_id])
 
     # summaries altijd als dict
     summaries = course.get("summaries")
@@ -1156,18 +1691,227 @@ def upload_course_file(course_id: int):
 
     original_name = file.filename
     safe_name = secure_filename(original_name)
-    disk_name = f"course{course_id}_{safe_name}"
-    save_path = os.path.join(app.config["UPLOAD_FOLDER"], disk_name)
+    if not allowed_file(safe_name):
+        return redirect(url_for("course_detail", course_id=course_id))
+
+    # Eerst naar een tijdelijk bestand, daarna op inhoud (hash) in de store
+    upload_folder = app.config["UPLOAD_FOLDER"]
+    tmp_path = blobstore.incoming_path(upload_folder)
+    file.save(tmp_path)
+    blob = blobstore.put_file(upload_folder, tmp_path, safe_name)
+
+    job_id = add_course_file(course_id, safe_name, blob)
+
+    redirect_url = url_for("course_detail", course_id=course_id, view="files")
+    if job_id and request.accept_mimetypes.best == "application/json":
+        return jsonify({
+            "job_id": job_id,
+            "status_url": url_for("job_status", job_id=job_id),
+        }), 202
+    return redirect(redirect_url)
+
+
+def add_course_file(course_id: int, filename: str, blob: str):
+    """
+    Koppel een blob aan het vak en start de verwerking (alleen formaten met een extractor).
+    Retourneert het job-id van de verwerking, of None als er niets te doen is.
+    """
+    course = courses_data[course_id]
+    if not register_course_file(course, filename, blob):
+        # exact hetzelfde bestand stond er al
+        return None
+
+    save_path = course_file_path(course, filename)
+    if not extractors.is_supported(filename):
+        return None
+
+    # Zelfde inhoud al verwerkt in een ander vak? Dan hergebruiken we dat.
+    known = ingest.known_entry(courses_data, blobstore.blob_sha(blob))
+    if known:
+        ingest.ensure_ingest_state(course)[filename] = known
+        for t in known.get(ingest.STEP_TOPICS) or []:
+            if t not in course.setdefault("topics", []):
+                course["topics"].append(t)
+        save_courses()
+        return None
+
+    # Zwaar werk (tekst, chunks, topics) meteen op de achtergrond starten
+    def work(progress):
+        return ingest.run_pipeline(
+            save_path,
+            with_topics=INGEST_AUTO_TOPICS,
+            topics_max_chars=TOPICS_TEXT_BUDGET,
+            progress=progress,
+        )
+
+    def apply(result):
+        sha = result["sha256"]
+        ingest.record_result(
+            course, filename, sha, ingest.STEP_CHUNKS, result["chunks"],
+            num_pages=result["num_pages"],
+        )
+        if result["topics"] is not None:
+            ingest.record_result(course, filename, sha, ingest.STEP_TOPICS, result["topics"])
+            course.setdefault("topics", [])
+            for t in result["topics"]:
+                if t not in course["topics"]:
+                    course["topics"].append(t)
+        save_courses()
+
+    return submit_ai_job("ingest", course_id, work, apply)
+
+
+@app.route("/courses/<int:course_id>/uploads", methods=["POST"])
+def start_chunked_upload(course_id: int):
+    """Begin een upload in stukken. Body (JSON): {"filename": "...", "size": 12345}."""
+    if not (0 <= course_id < len(courses_data)):
+        return jsonify({"error": "Onbekend vak."}), 404
+
+    data = request.get_json(silent=True) or {}
+    safe_name = secure_filename(str(data.get("filename", "")))
+    if not safe_name or not allowed_file(safe_name):
+        return jsonify({"error": "Bestandstype niet toegelaten."}), 400
+    try:
+        size = int(data.get("size"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Ongeldige grootte."}), 400
+
+    # de upload onthoudt de uid van het vak, niet de index (zie uploads.py)
+    course = courses_data[course_id]
+    if store.UID_KEY not in course:
+        course_store.uid_of(course)
+        save_courses()
+
+    chunked_uploads.cleanup_stale()
+    try:
+        meta = chunked_uploads.start(course[store.UID_KEY], safe_name, size)
+    except uploads.UploadError as e:
+        return jsonify({"error": str(e)}), 413
+
+    return jsonify({
+        "upload_id": meta["id"],
+        "offset": 0,
+        "size": size,
+        "chunk_size": UPLOAD_CHUNK_SIZE,
+        "upload_url": url_for("upload_chunk", upload_id=meta["id"]),
+    }), 201
 
-    file.save(save_path)
 
-    # We slaan de BESTANDSNAAM OP DIE OP SCHIJF STAAT, zodat AI 'm kan vinden
-    if "files" not in course:
-        course["files"] = []
-    course["files"].append(disk_name)
+@app.route("/uploads/<upload_id>", methods=["GET", "PUT"])
+def upload_chunk(upload_id: str):
+    """
+    GET: huidige offset (om te hervatten).
+    PUT ?offset=N: ruwe bytes van het volgende stuk (wordt gestreamd, niet gebufferd).
+    """
+    try:
+        if request.method == "GET":
+            meta = chunked_uploads.status(upload_id)
+        else:
+            offset = request.args.get("offset", type=int)
+            if offset is None:
+                return jsonify({"error": "offset ontbreekt."}), 400
+            meta = chunked_uploads.append(upload_id, offset, request.stream)
+    except uploads.OffsetMismatch as e:
+        return jsonify({"error": str(e), "offset": e.offset}), 409
+    except uploads.UnknownUpload as e:
+        return jsonify({"error": str(e)}), 404
+    except uploads.UploadError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"upload_id": upload_id, "offset": meta["offset"], "size": meta["size"]})
+
+
+@app.route("/uploads/<upload_id>/complete", methods=["POST"])
+def complete_chunked_upload(upload_id: str):
+    """Rond een upload in stukken af: atomisch naar de blob-store + verwerking starten."""
+    try:
+        meta, part_path, sha = chunked_uploads.finish(upload_id)
+    except uploads.OffsetMismatch as e:
+        return jsonify({"error": "Upload nog niet volledig.", "offset": e.offset}), 409
+    except uploads.UploadError as e:
+        return jsonify({"error": str(e)}), 404
+
+    course_id = course_store.index_of_uid(meta.get("course_uid"))
+    if course_id is None:
+        os.remove(part_path)
+        return jsonify({"error": "Onbekend vak."}), 404
+
+    blob = blobstore.put_file(app.config["UPLOAD_FOLDER"], part_path, meta["filename"], sha=sha)
+    job_id = add_course_file(course_id, meta["filename"], blob)
+
+    result = {"filename": meta["filename"], "sha256": sha, "job_id": job_id}
+    if job_id:
+        result["status_url"] = url_for("job_status", job_id=job_id)
+    return jsonify(result), 201
+
+
+def register_course_file(course: dict, filename: str, blob: str) -> bool:
+    """
+    Koppel een blob onder `filename` aan het vak en sla op.
+    Een nieuwe versie onder dezelfde naam vervangt de oude (de oude blob
+    wordt opgeruimd als niemand er nog naar verwijst).
+    Retourneert False als exact dit bestand al bij het vak stond.
+    """
+    refs = blobstore.ensure_file_refs(course)
+    course.setdefault("files", [])
+    if filename in course["files"] and refs.get(filename) == blob:
+        return False
+
+    replaced = filename in course["files"]
+    if not replaced:
+        course["files"].append(filename)
+    refs[filename] = blob
     save_courses()
 
-    return redirect(url_for("course_detail", course_id=course_id))
+    if replaced:
+        request_garbage_collection(dropped_legacy=[filename])
+    return True
+
+
+# === Opruimen (blobs, tekstbestanden) ===
+# Na een request die iets verwijdert (vak, notitie, map, chat, vervangen
+# bestand) en verder hoogstens elke GC_INTERVAL seconden na een schrijvende
+# request; altijd in een aparte thread en pas nadat de request opgeslagen is.
+GC_INTERVAL = 10 * 60
+
+_gc_lock = threading.Lock()
+_last_gc = 0.0
+
+
+def request_garbage_collection(dropped_legacy=()):
+    """Opruimen zodra deze request opgeslagen is (buiten een request: meteen)."""
+    if not has_request_context():
+        collect_garbage_in_background(dropped_legacy)
+        return
+    g.collect_garbage = True
+    g.gc_dropped_legacy = g.get("gc_dropped_legacy", []) + list(dropped_legacy)
+
+
+def collect_garbage_in_background(dropped_legacy=()):
+    """
+    Ruim blobs en tekstbestanden zonder verwijzing op in een aparte thread,
+    op een consistente kopie van alle vakken (course_store.snapshot() neemt
+    zelf de leeslocks). In de gedeelde modus eerst de wijzigingen van andere
+    processen inladen; bestanden jonger dan blobstore.GC_MIN_AGE /
+    textstore.GC_MIN_AGE blijven sowieso staan.
+    """
+    global _last_gc
+    _last_gc = time.monotonic()
+    dropped_legacy = list(dropped_legacy)
+
+    def run():
+        with _gc_lock:
+            try:
+                course_store.refresh()
+                courses = course_store.snapshot()
+                blobstore.collect_garbage(app.config["UPLOAD_FOLDER"], courses, dropped_legacy=dropped_legacy)
+                textstore.collect_garbage(courses)
+                # vakken die een ander proces verwijderde
+                question_dedupe.prune(courses)
+            except Exception as e:
+                print("Opruimen mislukt:", e)
+
+    threading.Thread(target=run, name="studyos-gc", daemon=True).start()
 
 
 @app.route("/courses/<int:course_id>/topics/add", methods=["POST"])
@@ -1197,9 +1941,7 @@ def add_question(course_id: int):
     a = request.form.get("answer", "").strip()
 
     if q:
-        if "qa" not in course:
-            course["qa"] = []
-        course["qa"].append({"question": q, "answer": a or "—"})
+        question_dedupe.add_questions(course, [{"question": q, "answer": a or "—"}])
         save_courses()
 
     return redirect(url_for("course_detail", course_id=course_id))
@@ -1214,21 +1956,27 @@ def auto_questions(course_id: int):
         return redirect(url_for("courses"))
 
     course = courses_data[course_id]
+    source = course_store.copy_of(course)
 
-    new_questions, error_text = ai_utils.generate_questions_for_course(
-        course,
-        max_questions=6,
-    )
+    def work(progress):
+        new_questions, error_text = ai_utils.generate_questions_for_course(
+            source,
+            max_questions=6,
+        )
+        if error_text:
+            print(error_text)
+        if not new_questions:
+            raise RuntimeError(error_text or "Geen vragen ontvangen.")
+        return new_questions
 
-    if new_questions:
-        course.setdefault("qa", [])
-        course["qa"].extend(new_questions)
+    def apply(new_questions):
+        question_dedupe.add_questions(course, new_questions)
         save_courses()
 
-    if error_text:
-        print(error_text)
-
-    return redirect(url_for("course_detail", course_id=course_id))
+    return enqueue_ai_job(
+        "questions", course_id, work, apply,
+        url_for("course_detail", course_id=course_id, view="questions"),
+    )
 
 
 @app.route("/courses/<int:course_id>/plan/add", methods=["POST"])
@@ -1259,7 +2007,7 @@ def add_block(course_id: int):
 @app.route("/courses/<int:course_id>/topics/auto", methods=["POST"])
 def auto_generate_topics(course_id: int):
     """
-    AI: topics genereren op basis van geüploade PDF's.
+    AI: topics genereren op basis van geüploade bestanden (PDF, slides, docx, txt).
     We werken rechtstreeks op de globale courses_data en gebruiken save_courses()
     zonder argument.
     """
@@ -1267,37 +2015,58 @@ def auto_generate_topics(course_id: int):
         return redirect(url_for("courses"))
 
     course = courses_data[course_id]
+    source = course_store.copy_of(course)
+    source_files = [f for f in source.get("files", []) if extractors.is_supported(f)]
+    paths = {f: course_file_path(source, f) for f in source_files}
+
+    def work(progress):
+        # Geen bruikbare bestanden: algemene topics voor dit vak
+        if not source_files:
+            progress(60, "AI genereert topics")
+            topics, error = ai_utils.generate_topics_from_text(
+                "Geen tekst gevonden. Genereer algemene topics voor dit vak.", max_topics=12
+            )
+            if not topics:
+                raise RuntimeError(error or "Geen topics ontvangen.")
+            return [(None, None, topics)]
+
+        # Alleen nieuwe of gewijzigde bestanden gaan nog naar de AI
+        todo = ingest.pending_files(source, source_files, paths, ingest.STEP_TOPICS)
+        results = []
+        errors = []
+        for i, (filename, sha) in enumerate(todo):
+            progress(int(90 * i / len(todo)), f"AI genereert topics voor {ingest.display_name(filename)}")
+            # niet meer tekst lezen dan de prompt aankan
+            text = ai_utils.extract_text_from_file(paths[filename], max_chars=TOPICS_TEXT_BUDGET)
+            if not text.strip():
+                results.append((filename, sha, []))
+                continue
+            topics, error = ai_utils.generate_topics_from_text(text, max_topics=12)
+            if not topics:
+                print("AI topic generation error:", error)
+                errors.append(error or "Geen topics ontvangen.")
+                continue
+            results.append((filename, sha, topics))
 
-    # 1. Verzamel tekst uit alle geüploade files
-    all_text = ""
-
-    for filename in course.get("files", []):
-        path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        if filename.lower().endswith(".pdf"):
-            extracted = ai_utils.extract_text_from_pdf(path)
-            if extracted:
-                all_text += "\n" + extracted
-
-    if not all_text.strip():
-        all_text = "Geen tekst gevonden. Genereer algemene topics voor dit vak."
-
-    # 2. Laat AI topics genereren
-    topics, error = ai_utils.generate_topics_from_text(all_text, max_topics=12)
+        if errors and not results:
+            raise RuntimeError(errors[0])
+        return results
 
-    if topics:
+    def apply(results):
         if "topics" not in course or not isinstance(course["topics"], list):
             course["topics"] = []
 
-        for t in topics:
-            if t not in course["topics"]:
-                course["topics"].append(t)
+        for filename, sha, topics in results:
+            if filename:
+                ingest.record_result(course, filename, sha, ingest.STEP_TOPICS, topics)
+            for t in topics:
+                if t not in course["topics"]:
+                    course["topics"].append(t)
 
+        ingest.forget_missing(course)
         save_courses()
 
-    if error:
-        print("AI topic generation error:", error)
-
-    return redirect(url_for("course_detail", course_id=course_id))
+    return enqueue_ai_job("topics", course_id, work, apply, url_for("course_detail", course_id=course_id))
 
 @app.route("/courses/<int:course_id>/summaries/auto", methods=["POST"])
 def auto_generate_summaries(course_id: int):
@@ -1309,13 +2078,20 @@ def auto_generate_summaries(course_id: int):
         return redirect(url_for("courses"))
 
     course = courses_data[course_id]
+    source = course_store.copy_of(course)
 
-    summaries, error_text = ai_utils.generate_summaries_for_topics(
-        course,
-        max_topics=8,
-    )
+    def work(progress):
+        summaries, error_text = ai_utils.generate_summaries_for_topics(
+            source,
+            max_topics=8,
+        )
+        if error_text:
+            print(error_text)
+        if not summaries:
+            raise RuntimeError(error_text or "Geen samenvattingen ontvangen.")
+        return summaries
 
-    if summaries:
+    def apply(summaries):
         # we slaan samenvattingen op in een dict per topic
         existing = course.get("summaries")
         if not isinstance(existing, dict):
@@ -1328,10 +2104,7 @@ def auto_generate_summaries(course_id: int):
         course["summaries"] = existing
         save_courses()
 
-    if error_text:
-        print(error_text)
-
-    return redirect(url_for("course_detail", course_id=course_id))
+    return enqueue_ai_job("summaries", course_id, work, apply, url_for("course_detail", course_id=course_id))
 
 
 @app.route("/courses/<int:course_id>/plan/auto", methods=["POST"])
@@ -1344,21 +2117,28 @@ def auto_plan(course_id: int):
         return redirect(url_for("courses"))
 
     course = courses_data[course_id]
+    source = course_store.copy_of(course)
 
-    blocks, error_text = ai_utils.generate_study_blocks_for_course(
-        course,
-        max_blocks=8,
-    )
+    def work(progress):
+        blocks, error_text = ai_utils.generate_study_blocks_for_course(
+            source,
+            max_blocks=8,
+        )
+        if error_text:
+            print(error_text)
+        if not blocks:
+            raise RuntimeError(error_text or "Geen studieblokken ontvangen.")
+        return blocks
 
-    if blocks:
+    def apply(blocks):
         course.setdefault("blocks", [])
         course["blocks"].extend(blocks)
         save_courses()
 
-    if error_text:
-        print(error_text)
-
-    return redirect(url_for("course_detail", course_id=course_id))
+    return enqueue_ai_job(
+        "plan", course_id, work, apply,
+        url_for("course_detail", course_id=course_id, view="plan"),
+    )
 
 @app.route("/courses/<int:course_id>/topics/clear", methods=["POST"])
 def clear_topics(course_id: int):
@@ -1379,9 +2159,9 @@ def stats_overview():
     - aantal (en beheersing van) oefenvragen
     - examengerelateerde info
     """
-    attach_exam_countdown()  # zorgt dat days_to_exam, progress, risk_status up-to-date zijn
+    views = course_views()  # met days_to_exam, progress, risk_status
 
-    total_courses = len(courses_data)
+    total_courses = len(views)
 
     total_questions = 0
     total_mastered = 0
@@ -1396,7 +2176,7 @@ def stats_overview():
     # Voor “top courses” op basis van aantal vragen
     courses_with_counts = []
 
-    for c in courses_data:
+    for c in views:
         q_total = int(c.get("total_questions", 0) or 0)
         q_mastered = int(c.get("mastered_questions", 0) or 0)
 
@@ -1459,6 +2239,20 @@ def clear_questions(course_id: int):
     return redirect(url_for("course_detail", course_id=course_id))
 
 
+@app.route("/courses/<int:course_id>/questions/dedupe", methods=["POST"])
+def dedupe_questions(course_id: int):
+    """Bijna-dubbele vragen samenvoegen (tellingen van de flashcards blijven behouden)."""
+    if not (0 <= course_id < len(courses_data)):
+        return redirect(url_for("courses"))
+
+    course = courses_data[course_id]
+    removed = question_dedupe.dedupe_questions(course)
+    if removed:
+        print(f"{removed} dubbele vragen samengevoegd ({course.get('name', '')})")
+        save_courses()
+    return redirect(url_for("course_detail", course_id=course_id, view="questions"))
+
+
 @app.route("/courses/<int:course_id>/plan/clear", methods=["POST"])
 def clear_plan(course_id: int):
     if not (0 <= course_id < len(courses_data)):
@@ -1538,13 +2332,13 @@ def flashcards(course_id: int):
     indexed = list(enumerate(qa_list))
 
     def is_strong(card):
-        correct = int(card.get("correct", 0) or 0)
-        wrong = int(card.get("wrong", 0) or 0)
+        correct = card.get("correct", 0)
+        wrong = card.get("wrong", 0)
         return correct > 0 and correct >= wrong
 
     def is_weak(card):
-        correct = int(card.get("correct", 0) or 0)
-        wrong = int(card.get("wrong", 0) or 0)
+        correct = card.get("correct", 0)
+        wrong = card.get("wrong", 0)
         # "nog moeilijk": nooit juist OF vaker fout dan juist
         return correct == 0 or wrong > correct
 
@@ -1643,13 +2437,13 @@ def rate_flashcard(course_id: int):
     indexed = list(enumerate(qa_list))
 
     def is_strong(card):
-        correct = int(card.get("correct", 0) or 0)
-        wrong = int(card.get("wrong", 0) or 0)
+        correct = card.get("correct", 0)
+        wrong = card.get("wrong", 0)
         return correct > 0 and correct >= wrong
 
     def is_weak(card):
-        correct = int(card.get("correct", 0) or 0)
-        wrong = int(card.get("wrong", 0) or 0)
+        correct = card.get("correct", 0)
+        wrong = card.get("wrong", 0)
         return correct == 0 or wrong > correct
 
     if mode == "strong":
@@ -1738,6 +2532,30 @@ def ai_test():
     return f"<pre>{text}</pre>"
 
 
+@app.route("/metrics")
+def ai_metrics_overview():
+    """
+    Tellers van alle AI-aanroepen (tokens, latency-histogram, retries,
+    JSON-fouten, cache-hits) per soort aanroep, als JSON.
+    """
+    data = ai_metrics.snapshot()
+    data["last_prompts"] = ai_metrics.last_prompts()
+    return jsonify(data)
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id: str):
+    """
+    Status van één AI-job (voor polling vanuit de UI of een script).
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Onbekende job"}), 404
+    job["label"] = JOB_LABELS.get(job["kind"], job["kind"])
+    job["queue_position"] = job_queue.queue_position(job_id)
+    return jsonify(job)
+
+
 @app.route("/demo")
 def load_demo_course():
     """Voeg één demo-vak toe met voorbeeldtopics, vragen en blokken (met 'Vandaag')."""
@@ -1776,7 +2594,7 @@ def load_demo_course():
         ],
     }
 
-    courses_data.append(demo_course)
+    courses_data.append(normalize_course(demo_course))
     save_courses()
     return redirect(url_for("home"))
 
@@ -1809,30 +2627,35 @@ def auto_questions_from_note(course_id: int, folder_index: int, note_index: int)
     note_title = active_note.get("title", "Ongetitelde notitie")
     note_content = active_note.get("content", "")
 
+    course_name = course.get("name", "Onbekend vak")
+
     # AI vragen genereren
-    new_questions, error_text = ai_utils.generate_questions_from_note(
-        course_name=course.get("name", "Onbekend vak"),
-        note_title=note_title,
-        note_content=note_content,
-        max_questions=6,
-    )
+    def work(progress):
+        new_questions, error_text = ai_utils.generate_questions_from_note(
+            course_name=course_name,
+            note_title=note_title,
+            note_content=note_content,
+            max_questions=6,
+        )
+        if error_text:
+            print("AI vragen uit notitie error:", error_text)
+        if not new_questions:
+            raise RuntimeError(error_text or "Geen vragen ontvangen.")
+        return new_questions
 
-    if new_questions:
-        course.setdefault("qa", [])
-        course["qa"].extend(new_questions)
+    def apply(new_questions):
+        question_dedupe.add_questions(course, new_questions)
         save_courses()
 
-    if error_text:
-        print("AI vragen uit notitie error:", error_text)
-
     # Terug naar dezelfde notitie
-    return redirect(
+    return enqueue_ai_job(
+        "note_questions", course_id, work, apply,
         url_for(
             "course_notes",
             course_id=course_id,
             folder=folder_index,
             note=note_index,
-        )
+        ),
     )
 
 @app.route("/courses/<int:course_id>/notes/<int:folder_index>/notes/<int:note_index>/summary/auto", methods=["POST"])
@@ -1863,48 +2686,42 @@ def auto_summary_from_note(course_id: int, folder_index: int, note_index: int):
     note_title = source_note.get("title", "Ongetitelde notitie")
     note_content = source_note.get("content", "")
 
-    summary_text, error_text = ai_utils.generate_summary_from_note(
-        course_name=course.get("name", "Onbekend vak"),
-        note_title=note_title,
-        note_content=note_content,
-    )
-
-    if summary_text:
-        summary_title = f"Samenvatting – {note_title}"
-        new_note = {
-            "title": summary_title,
-            "content": summary_text,
-        }
-
-        # Zorg dat de notes-lijst terug in de folder en course zit
-        folder["notes"].append(new_note)
-        # notes_data zit al op course["notes"] via ensure_notes_structure
-        course["notes"] = notes_data
-        save_courses()
+    course_name = course.get("name", "Onbekend vak")
 
-        # index van nieuwe note = laatste
-        new_index = len(folder["notes"]) - 1
-
-        return redirect(
-            url_for(
-                "course_notes",
-                course_id=course_id,
-                folder=folder_index,
-                note=new_index,
-            )
+    def work(progress):
+        summary_text, error_text = ai_utils.generate_summary_from_note(
+            course_name=course_name,
+            note_title=note_title,
+            note_content=note_content,
         )
+        if error_text:
+            print("AI samenvatting uit notitie error:", error_text)
+        if not summary_text:
+            raise RuntimeError(error_text or "Geen samenvatting ontvangen.")
+        return summary_text
 
-    if error_text:
-        print("AI samenvatting uit notitie error:", error_text)
+    def apply(summary_text):
+        summary_title = f"Samenvatting – {note_title}"
+        # de map opnieuw opzoeken: intussen kan ze verwijderd/verschoven zijn
+        # of kan het record herladen zijn (gedeelde modus)
+        current_folders = ensure_notes_structure(course)["folders"]
+        if not (0 <= folder_index < len(current_folders)):
+            print(f"Map {folder_index} van '{course_name}' bestaat niet meer; samenvatting genegeerd.")
+            return
+        new_note = textstore.new_note(summary_title, summary_text)
+        current_folders[folder_index].setdefault("notes", []).append(new_note)
+        save_courses()
 
-    # Als er geen summary was, ga gewoon terug naar de originele note
-    return redirect(
+    # De samenvatting verschijnt als nieuwe notitie in dezelfde map zodra
+    # de job klaar is; tot dan gaan we terug naar de originele note
+    return enqueue_ai_job(
+        "note_summary", course_id, work, apply,
         url_for(
             "course_notes",
             course_id=course_id,
             folder=folder_index,
             note=note_index,
-        )
+        ),
     )
 
 @app.route("/courses/<int:course_id>/pdf/process", methods=["POST"])
@@ -1913,26 +2730,79 @@ def process_pdf_ai(course_id: int):
         return redirect(url_for("courses"))
 
     course = courses_data[course_id]
+    source = course_store.copy_of(course)
+    source_files = [f for f in source.get("files", []) if extractors.is_supported(f)]
+    paths = {f: course_file_path(source, f) for f in source_files}
+    course_name = source.get("name", "Onbekend vak")
+
+    def work(progress):
+        # Alleen nieuwe of gewijzigde bestanden worden (volledig) geanalyseerd
+        todo = ingest.pending_files(source, source_files, paths, ingest.STEP_STRUCTURE)
+        results = []
+        errors = []
+        for i, (filename, sha) in enumerate(todo):
+            name = ingest.display_name(filename)
+            base = int(95 * i / len(todo))
+            step = 95 / len(todo)
+            progress(base, f"Tekst uit {name}")
+            pages = ai_utils.extract_pages_from_file(paths[filename])
+            if not any(p.strip() for p in pages):
+                # geen tekst (bv. een scan): onthouden, zodat we het niet blijven proberen
+                results.append((filename, sha, len(pages), [], "", [], [], {}))
+                continue
 
-    # Verzamel tekst van ALLE PDF's van dit vak
-    all_text = ""
-    for filename in course.get("files", []):
-        path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        if filename.lower().endswith(".pdf"):
-            text = ai_utils.extract_text_from_pdf(path)
-            if text:
-                all_text += "\n" + text
-
-    # AI analyse
-    topics, summary, concepts, error = ai_utils.generate_structured_data_from_pdf(
-        course_name=course.get("name", "Onbekend vak"),
-        extracted_text=all_text,
-    )
+            # AI analyse per stuk (parallel), daarna samenvoegen; stukken die
+            # een vorige, deels mislukte run al deed worden hergebruikt
+            done_chunks = ingest.partial_results(source, filename, sha, ingest.STEP_STRUCTURE)
+            topics, summary, concepts, error, failed = ai_utils.generate_structured_data_from_pages(
+                course_name=course_name,
+                documents=[(name, pages)],
+                progress=lambda done, total: progress(
+                    base + int(step * done / total), f"AI: {name}, stuk {done}/{total}"
+                ),
+                done=done_chunks,
+            )
+            if error:
+                print("PDF AI error:", error)
+                errors.append(error)
+                continue
+            if failed:
+                print(f"PDF {name}: stukken {failed} mislukt; volgende keer opnieuw")
+            results.append((filename, sha, len(pages), topics, summary, concepts, failed, done_chunks))
+
+        if errors and not results:
+            raise RuntimeError(errors[0])
+        return results
+
+    def apply(results):
+        for filename, sha, num_pages, topics, summary, concepts, failed, done_chunks in results:
+            if failed:
+                # deels gelukt: wel tonen, maar de stap blijft open
+                ingest.record_failed_chunks(
+                    course, filename, sha, ingest.STEP_STRUCTURE, failed,
+                    done=done_chunks, num_pages=num_pages,
+                )
+            else:
+                ingest.record_result(
+                    course, filename, sha, ingest.STEP_STRUCTURE,
+                    {"topics": topics, "summary": summary, "concepts": concepts},
+                    num_pages=num_pages,
+                )
+            if topics or summary or concepts:
+                apply_pdf_structure(course, topics, summary, concepts, source=ingest.display_name(filename))
+        ingest.forget_missing(course)
+        save_courses()
 
-    if error:
-        print("PDF AI error:", error)
-        return redirect(url_for("course_detail", course_id=course_id))
+    return enqueue_ai_job("pdf", course_id, work, apply, url_for("course_detail", course_id=course_id))
 
+
+def apply_pdf_structure(course: dict, topics, summary, concepts, source: str = None):
+    """
+    Zet topics + samenvatting/kernbegrippen uit een PDF-analyse op het vak.
+    Met source krijgen de notities de bestandsnaam in de titel; een notitie
+    met dezelfde titel (bv. van een vorige versie van de PDF) wordt vervangen.
+    (Opslaan doet de aanroeper.)
+    """
     # Topics toevoegen
     if topics:
         course.setdefault("topics", [])
@@ -1942,31 +2812,33 @@ def process_pdf_ai(course_id: int):
 
     # Samenvatting → nieuwe notitie
     notes_data = ensure_notes_structure(course)
+    suffix = source or "PDF"
 
-    summary_note = {
-        "title": "Samenvatting uit PDF",
-        "content": summary,
-    }
-
-    concepts_note = {
-        "title": "Kernbegrippen uit PDF",
-        "content": "\n".join(f"- {c}" for c in concepts),
-    }
+    summary_note = textstore.new_note(f"Samenvatting uit {suffix}", summary)
+    concepts_note = textstore.new_note(
+        f"Kernbegrippen uit {suffix}", "\n".join(f"- {c}" for c in concepts)
+    )
 
-    # in map 0 zetten, of nieuwe map "AI Extracties" maken
-    if notes_data["folders"]:
-        notes_data["folders"][0]["notes"].append(summary_note)
-        notes_data["folders"][0]["notes"].append(concepts_note)
-    else:
-        notes_data["folders"] = [{
-            "name": "AI Extracties",
-            "notes": [summary_note, concepts_note]
-        }]
+    for new_note in (summary_note, concepts_note):
+        replaced = False
+        for folder in notes_data["folders"]:
+            for i, note in enumerate(folder.get("notes", [])):
+                if note.get("title") == new_note["title"]:
+                    folder["notes"][i] = new_note
+                    replaced = True
+        if replaced:
+            continue
+
+        # in map 0 zetten, of nieuwe map "AI Extracties" maken
+        if notes_data["folders"]:
+            notes_data["folders"][0].setdefault("notes", []).append(new_note)
+        else:
+            notes_data["folders"] = [{
+                "name": "AI Extracties",
+                "notes": [new_note]
+            }]
 
     course["notes"] = notes_data
-    save_courses()
-
-    return redirect(url_for("course_detail", course_id=course_id))
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,163 @@
+import os
+import time
+import uuid
+from typing import Dict, Iterable, List, Set
+
+import pdf_text
+
+# ==== Bestanden op inhoud (content-addressed) ====
+# Uploads werden opgeslagen als course{id}_{naam}: dezelfde PDF in twee vakken
+# stond dus twee keer op schijf (en werd twee keer geparsed), delete_course
+# liet bestanden achter en na het verwijderen van een vak kon een nieuw vak
+# met hetzelfde index-nummer op een oude bestandsnaam botsen.
+#
+# Nu krijgt elk bestand een naam op basis van zijn inhoud:
+#   <uploads>/blobs/<sha256><ext>
+# Per vak staat in course["file_blobs"] welke blob bij welke bestandsnaam
+# hoort (de referentietabel); course["files"] blijft de lijst met namen.
+# Identieke uploads delen dus één blob. Een blob waar geen enkel vak nog
+# naar verwijst wordt door collect_garbage() opgeruimd, samen met de
+# tekst-cache van pdf_text.
+#
+# Oude uploads (zonder entry in file_blobs) blijven gewoon in <uploads>/
+# staan en werken zoals vroeger.
+#
+# Een blob staat al in blobs/ vóór een vak ernaar verwijst (put_file, daarna
+# register_course_file). collect_garbage() laat daarom blobs die jonger zijn
+# dan GC_MIN_AGE staan; put_file() zet de mtime van een bestaande blob op nu
+# als dezelfde inhoud opnieuw binnenkomt.
+
+BLOB_DIRNAME = "blobs"
+INCOMING_PREFIX = ".incoming-"
+# Blobs zonder verwijzing pas na zoveel seconden opruimen
+GC_MIN_AGE = 60 * 60
+
+
+def blob_dir(upload_folder: str) -> str:
+    return os.path.join(upload_folder, BLOB_DIRNAME)
+
+
+def blob_name(sha: str, filename: str) -> str:
+    """Naam van de blob: de hash + de extensie van het origineel."""
+    ext = os.path.splitext(filename)[1].lower()
+    return f"{sha}{ext}"
+
+
+def blob_sha(blob: str) -> str:
+    """De sha256 zit in de blobnaam zelf."""
+    return os.path.splitext(blob)[0]
+
+
+def blob_path(upload_folder: str, blob: str) -> str:
+    return os.path.join(blob_dir(upload_folder), blob)
+
+
+def incoming_path(upload_folder: str) -> str:
+    """Tijdelijk pad voor een binnenkomende upload (in dezelfde map als de blobs)."""
+    folder = blob_dir(upload_folder)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{INCOMING_PREFIX}{uuid.uuid4().hex}")
+
+
+def put_file(upload_folder: str, src_path: str, filename: str, sha: str = None) -> str:
+    """
+    Neem een (tijdelijk) bestand op in de store en geef de blobnaam terug.
+    Bestaat dezelfde inhoud al, dan wordt het nieuwe bestand weggegooid.
+    """
+    sha = sha or pdf_text.file_sha256(src_path)
+    blob = blob_name(sha, filename)
+    target = blob_path(upload_folder, blob)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    if os.path.exists(target):
+        os.remove(src_path)
+        # opnieuw in gebruik: niet meer "oud" voor collect_garbage
+        os.utime(target)
+    else:
+        # atomisch: ofwel staat de volledige blob er, ofwel niets
+        os.replace(src_path, target)
+    return blob
+
+
+def ensure_file_refs(course: dict) -> Dict[str, str]:
+    """Zorgt ervoor dat course['file_blobs'] een dict is (bestandsnaam -> blob)."""
+    refs = course.get("file_blobs")
+    if not isinstance(refs, dict):
+        refs = {}
+        course["file_blobs"] = refs
+    return refs
+
+
+def file_path(upload_folder: str, course: dict, filename: str) -> str:
+    """Pad op schijf van een bestand van dit vak (blob, of oude upload)."""
+    blob = (course.get("file_blobs") or {}).get(filename)
+    if blob:
+        return blob_path(upload_folder, blob)
+    return os.path.join(upload_folder, filename)
+
+
+def ref_counts(courses: Iterable[dict]) -> Dict[str, int]:
+    """Aantal verwijzingen per blob, over alle vakken."""
+    counts: Dict[str, int] = {}
+    for course in courses:
+        refs = course.get("file_blobs") or {}
+        for filename in course.get("files", []):
+            blob = refs.get(filename)
+            if blob:
+                counts[blob] = counts.get(blob, 0) + 1
+    return counts
+
+
+def legacy_files(courses: Iterable[dict]) -> Set[str]:
+    """Oude uploads (zonder blob) waar nog een vak naar verwijst."""
+    names = set()
+    for course in courses:
+        refs = course.get("file_blobs") or {}
+        names.update(f for f in course.get("files", []) if f not in refs)
+    return names
+
+
+def collect_garbage(
+    upload_folder: str,
+    courses: List[dict],
+    dropped_legacy: Iterable[str] = (),
+    min_age: float = GC_MIN_AGE,
+) -> List[str]:
+    """
+    Verwijder blobs zonder verwijzing die ouder zijn dan min_age seconden
+    (+ hun tekst-cache). `courses` moet een consistente kopie van ALLE vakken
+    zijn (bv. course_store.snapshot()).
+    dropped_legacy: oude uploads die net losgekoppeld zijn; die worden ook
+    verwijderd als geen ander vak ze nog gebruikt.
+    Retourneert de verwijderde bestandsnamen.
+    """
+    removed = []
+    referenced = ref_counts(courses)
+    folder = blob_dir(upload_folder)
+    cutoff = time.time() - min_age
+
+    if os.path.isdir(folder):
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if not os.path.isfile(path):
+                continue
+            if name.startswith(INCOMING_PREFIX) or name in referenced:
+                continue
+            if os.path.getmtime(path) > cutoff:
+                continue
+            pdf_text.drop_cached_pages(path, blob_sha(name))
+            os.remove(path)
+            removed.append(name)
+
+    still_used = legacy_files(courses)
+    for name in dropped_legacy:
+        path = os.path.join(upload_folder, name)
+        if name not in still_used and os.path.isfile(path):
+            pdf_text.drop_cached_pages(path, pdf_text.content_hash(path))
+            os.remove(path)
+            removed.append(name)
+
+    if removed:
+        print(f"Opgeruimd: {len(removed)} bestand(en) zonder verwijzing")
+    return removed
+
@@ -0,0 +1,111 @@
+import re
+from typing import Dict, List
+
+# ==== Tekst opdelen in stukken (chunks) ====
+# Lange cursusteksten passen niet in één prompt. We knippen ze daarom op
+# natuurlijke grenzen: eerst op pagina's, en binnen een (te) lange pagina op
+# koppen ("Hoofdstuk 3", "2.1 Inleiding", "SAMENVATTING"), dan op alinea's
+# en pas als laatste redmiddel midden in de tekst.
+#
+# Een chunk is een dict:
+#   {"source": "cursus.pdf", "page_start": 1, "page_end": 3, "text": "..."}
+# (paginanummers 1-based, inclusief)
+
+# Regels die op een kop lijken
+HEADING_RE = re.compile(
+    r"^\s*("
+    r"(?i:hoofdstuk|chapter|deel|part|module|les|lesson)\s+\w+"  # Hoofdstuk 3 ...
+    r"|\d+(\.\d+)*\.?\s+[A-ZÀ-Ý]"                                # 2.1 Inleiding
+    r"|[A-ZÀ-Ý][A-ZÀ-Ý0-9 ,:&'-]{3,60}$"                         # SAMENVATTING
+    r")",
+    re.MULTILINE,
+)
+
+# Een nieuwe chunk mag op een kop beginnen als de huidige al zo vol zit
+HEADING_BREAK_FILL = 0.5
+
+
+def starts_with_heading(text: str) -> bool:
+    """Begint de tekst (eerste niet-lege regel) met iets dat op een kop lijkt?"""
+    for line in text.splitlines():
+        if line.strip():
+            return bool(HEADING_RE.match(line))
+    return False
+
+
+def _split_on(text: str, positions: List[int]) -> List[str]:
+    bounds = [0] + [p for p in positions if p > 0] + [len(text)]
+    return [text[a:b] for a, b in zip(bounds, bounds[1:]) if text[a:b].strip()]
+
+
+def split_long_text(text: str, max_chars: int) -> List[str]:
+    """
+    Knip één te lange tekst in stukken van hooguit max_chars,
+    bij voorkeur op koppen, anders op alinea's, anders hard.
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    for pattern in (HEADING_RE, re.compile(r"\n\s*\n")):
+        cuts = [m.start() for m in pattern.finditer(text)]
+        parts = _split_on(text, cuts)
+        if len(parts) > 1:
+            # stukken terug samenvoegen zolang ze onder max_chars blijven
+            merged = []
+            for part in parts:
+                if merged and len(merged[-1]) + len(part) <= max_chars:
+                    merged[-1] += part
+                else:
+                    merged.append(part)
+            result = []
+            for part in merged:
+                result.extend(split_long_text(part, max_chars) if len(part) > max_chars else [part])
+            return result
+
+    return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+
+def chunk_pages(pages: List[str], max_chars: int, source: str = "") -> List[Dict]:
+    """
+    Groepeer paginateksten tot chunks van hooguit max_chars tekens.
+    Pagina's worden niet gesplitst tenzij één pagina alleen al te lang is.
+    Begint een pagina met een kop en is de huidige chunk al half vol,
+    dan starten we daar een nieuwe chunk.
+    """
+    chunks: List[Dict] = []
+    current = None
+
+    def flush():
+        nonlocal current
+        if current and current["text"].strip():
+            chunks.append(current)
+        current = None
+
+    for number, page in enumerate(pages, start=1):
+        page = page or ""
+        if not page.strip():
+            continue
+
+        if len(page) > max_chars:
+            flush()
+            for part in split_long_text(page, max_chars):
+                chunks.append({"source": source, "page_start": number, "page_end": number, "text": part})
+            continue
+
+        if current is not None:
+            too_long = len(current["text"]) + 1 + len(page) > max_chars
+            heading_break = (
+                starts_with_heading(page)
+                and len(current["text"]) >= max_chars * HEADING_BREAK_FILL
+            )
+            if too_long or heading_break:
+                flush()
+
+        if current is None:
+            current = {"source": source, "page_start": number, "page_end": number, "text": page}
+        else:
+            current["text"] += "\n" + page
+            current["page_end"] = number
+
+    flush()
+    return chunks
@@ -0,0 +1,132 @@
+import re
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+# ==== Datums uit invoer en oude data ====
+# exam_date/deadline horen YYYY-MM-DD te zijn, maar oudere data (en
+# handmatige invoer) bevat ook "25 jan", "2 februari", "25/01/2026", ...
+# parse_date() leest die zo soepel mogelijk; lukt het niet, dan None.
+#
+# De countdowns (course_view/project_view in app.py, prioriteit van
+# AI-jobs) vragen bij elke request voor elk vak/project het aantal dagen
+# op. Ze komen in een kopie voor de weergave, nooit in het opgeslagen
+# record. days_until() onthoudt per datumtekst het aantal dagen; die cache
+# wordt pas geleegd als de kalenderdag verandert
+# (een datum zonder jaartal kan dan ook een ander jaar krijgen). Een
+# onleesbare waarde wordt dus één keer per dag geprobeerd, niet per request.
+
+MONTHS = {
+    "jan": 1, "januari": 1, "january": 1,
+    "feb": 2, "februari": 2, "february": 2,
+    "mrt": 3, "maa": 3, "maart": 3, "mar": 3, "march": 3,
+    "apr": 4, "april": 4,
+    "mei": 5, "may": 5,
+    "jun": 6, "juni": 6, "june": 6,
+    "jul": 7, "juli": 7, "july": 7,
+    "aug": 8, "augustus": 8, "august": 8,
+    "sep": 9, "sept": 9, "september": 9,
+    "okt": 10, "oct": 10, "oktober": 10, "october": 10,
+    "nov": 11, "november": 11,
+    "dec": 12, "december": 12,
+}
+
+NUMERIC_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y", "%Y/%m/%d")
+
+# Zonder jaartal: dit jaar, tenzij de datum dan al meer dan zoveel dagen
+# voorbij is (dan volgend jaar; "25 jan" in oktober = januari erop)
+YEARLESS_PAST_DAYS = 183
+
+# Meer verschillende datumteksten dan dit: cache gewoon leegmaken
+MAX_CACHED = 4096
+
+_DAY_MONTH_RE = re.compile(r"^(\d{1,2})\.?\s*([a-z]+)\.?,?\s*(\d{4})?$")
+_MONTH_DAY_RE = re.compile(r"^([a-z]+)\.?\s*(\d{1,2}),?\s*(\d{4})?$")
+
+
+def _yearless(day: int, month: int, today: date) -> Optional[date]:
+    for year in (today.year, today.year + 1):
+        try:
+            candidate = date(year, month, day)
+        except ValueError:  # 29 feb
+            continue
+        if candidate >= today - timedelta(days=YEARLESS_PAST_DAYS):
+            return candidate
+    return None
+
+
+def parse_date(value, today: Optional[date] = None) -> Optional[date]:
+    """Datum uit YYYY-MM-DD of een oud/vrij formaat, of None."""
+    if isinstance(value, date):
+        return value
+    text = (value or "").strip().lower() if isinstance(value, str) else ""
+    if not text:
+        return None
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in NUMERIC_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+
+    match = _DAY_MONTH_RE.match(text)
+    if match:
+        day, month_name, year = match.groups()
+    else:
+        match = _MONTH_DAY_RE.match(text)
+        if not match:
+            return None
+        month_name, day, year = match.groups()
+    month = MONTHS.get(month_name) or MONTHS.get(month_name[:3])
+    if not month:
+        return None
+    if year:
+        try:
+            return date(int(year), month, int(day))
+        except ValueError:
+            return None
+    return _yearless(int(day), month, today or date.today())
+
+
+def to_iso(value, today: Optional[date] = None) -> Optional[str]:
+    """Zelfde als parse_date, maar als "YYYY-MM-DD"-tekst."""
+    parsed = parse_date(value, today)
+    return parsed.isoformat() if parsed else None
+
+
+# ---- countdown-cache ----
+
+_lock = threading.Lock()
+_cache_day: Optional[date] = None
+_days: Dict[str, Optional[int]] = {}
+
+
+def _today_cache() -> Tuple[date, Dict[str, Optional[int]]]:
+    global _cache_day, _days
+    today = date.today()
+    if today != _cache_day:
+        with _lock:
+            if today != _cache_day:
+                _days = {}
+                _cache_day = today
+    return today, _days
+
+
+def days_until(value) -> Optional[int]:
+    """Dagen van vandaag tot deze datum (negatief = voorbij), of None."""
+    if not value:
+        return None
+    today, cache = _today_cache()
+    try:
+        return cache[value]
+    except KeyError:
+        pass
+    parsed = parse_date(value, today)
+    days = (parsed - today).days if parsed else None
+    if len(cache) >= MAX_CACHED:
+        cache.clear()
+    cache[value] = days
+    return days
@@ -0,0 +1,226 @@
+import os
+import re
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, Iterator, List, Optional
+
+import pdf_text
+
+# ==== Tekst uit geüploade bestanden ====
+# Eén ingang voor alle bestandstypes: per extensie staat hier een extractor
+# die de tekst per "pagina" teruggeeft (PDF: pagina, pptx: slide,
+# docx/txt: pagina-einde of ongeveer PAGE_CHARS tekens). Zo gaan slides en
+# Word-documenten door dezelfde cache (pdf_text) en dezelfde chunking als
+# PDF's, in plaats van stilletjes overgeslagen te worden.
+#
+# docx en pptx zijn zip-bestanden met XML; die lezen we met de standaard-
+# bibliotheek, er is dus geen extra package nodig. Oude .doc/.ppt (binair)
+# worden niet ondersteund.
+#
+# Nieuw formaat toevoegen:
+#
+#   @register(".odt")
+#   def _iter_odt(path):
+#       yield "tekst van pagina 1"
+#       ...
+
+# Een docx/txt zonder expliciete pagina-einden knippen we op ongeveer zoveel tekens
+PAGE_CHARS = 3000
+
+EXTRACTORS: Dict[str, Callable[[str], Iterator[str]]] = {}
+
+
+def register(*extensions: str):
+    """Decorator: registreer een extractor voor één of meer extensies (met punt)."""
+    def decorator(func):
+        for ext in extensions:
+            EXTRACTORS[ext.lower()] = func
+        return func
+    return decorator
+
+
+def _extension(filename: str) -> str:
+    return os.path.splitext(filename)[1].lower()
+
+
+def is_supported(filename: str) -> bool:
+    """Kunnen we tekst halen uit dit bestand?"""
+    return _extension(filename) in EXTRACTORS
+
+
+# ---- lezen via de cache ----
+
+def extract_pages(path: str) -> List[str]:
+    """Tekst per pagina/slide van een ondersteund bestand, via de cache van pdf_text."""
+    ext = _extension(path)
+    if ext == ".pdf":
+        # PDF's hebben een eigen (parallelle) leesroute
+        return pdf_text.extract_pages(path)
+    return list(iter_pages(path))
+
+
+def iter_pages(path: str, max_chars: int = None) -> Iterator[str]:
+    """
+    Zelfde als pdf_text.iter_pages, maar voor elk ondersteund formaat:
+    pagina per pagina, en stoppen zodra max_chars gehaald is.
+    """
+    ext = _extension(path)
+    if ext == ".pdf":
+        yield from pdf_text.iter_pages(path, max_chars=max_chars)
+        return
+
+    extractor = EXTRACTORS.get(ext)
+    if extractor is None:
+        raise ValueError(f"Geen extractor voor {ext or 'bestanden zonder extensie'}")
+
+    sha = pdf_text.content_hash(path)
+    entry = pdf_text.load_cached_pages(path, sha)
+    if entry and all(p is not None for p in entry["pages"]):
+        pages = entry["pages"]
+        extractor = None
+    else:
+        pages = []
+
+    total = 0
+    source = iter(pages) if extractor is None else extractor(path)
+    for page in source:
+        if extractor is not None:
+            pages.append(page)
+        yield page
+        total += len(page)
+        if max_chars is not None and total >= max_chars:
+            # niet alles gelezen: het aantal pagina's is nog onbekend,
+            # dus (nog) niets in de cache zetten
+            return
+
+    if extractor is not None:
+        pdf_text.save_cached_pages(path, sha, pages)
+
+
+# ---- formaten ----
+
+@register(".pdf")
+def _iter_pdf(path: str) -> Iterator[str]:
+    # Alleen voor de volledigheid van de registry; extract_pages/iter_pages
+    # gebruiken voor PDF's rechtstreeks pdf_text (cache + parallel lezen).
+    yield from pdf_text.iter_pages(path)
+
+
+def _paged(paragraphs: Iterator[Optional[str]]) -> Iterator[str]:
+    """
+    Groepeer alinea's tot pagina's. None in de stroom = expliciet
+    pagina-einde; anders wordt een pagina afgesloten rond PAGE_CHARS.
+    """
+    current: List[str] = []
+    size = 0
+    for para in paragraphs:
+        if para is None or (size and size + len(para) > PAGE_CHARS):
+            if current:
+                yield "\n".join(current)
+            current, size = [], 0
+            if para is None:
+                continue
+        current.append(para)
+        size += len(para) + 1
+    if current:
+        yield "\n".join(current)
+
+
+@register(".txt")
+def _iter_txt(path: str) -> Iterator[str]:
+    def paragraphs():
+        buf: List[str] = []
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                # form feed = pagina-einde (bv. uit pdftotext)
+                parts = line.split("\f")
+                for i, part in enumerate(parts):
+                    if i:
+                        if buf:
+                            yield "".join(buf).strip()
+                            buf = []
+                        yield None
+                    if part.strip():
+                        buf.append(part)
+                    elif buf:
+                        yield "".join(buf).strip()
+                        buf = []
+        if buf:
+            yield "".join(buf).strip()
+
+    yield from _paged(paragraphs())
+
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+@register(".docx")
+def _iter_docx(path: str) -> Iterator[str]:
+    def paragraphs():
+        with zipfile.ZipFile(path) as zf, zf.open("word/document.xml") as f:
+            texts: List[str] = []
+            page_break = False
+            for event, el in ET.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    continue
+                if el.tag == f"{W_NS}t" and el.text:
+                    texts.append(el.text)
+                elif el.tag == f"{W_NS}tab":
+                    texts.append("\t")
+                elif el.tag == f"{W_NS}br" and el.get(f"{W_NS}type") == "page":
+                    page_break = True
+                elif el.tag == f"{W_NS}p":
+                    text = "".join(texts).strip()
+                    texts = []
+                    if text:
+                        yield text
+                    if page_break:
+                        yield None
+                        page_break = False
+                    el.clear()
+
+    yield from _paged(paragraphs())
+
+
+A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+P_NS = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def _pptx_slide_order(zf: zipfile.ZipFile) -> List[str]:
+    """Slide-bestanden in presentatievolgorde (valt terug op het nummer in de naam)."""
+    try:
+        rels = ET.fromstring(zf.read("ppt/_rels/presentation.xml.rels"))
+        targets = {
+            rel.get("Id"): posixpath.normpath(posixpath.join("ppt", rel.get("Target")))
+            for rel in rels.iter(f"{REL_NS}Relationship")
+        }
+        pres = ET.fromstring(zf.read("ppt/presentation.xml"))
+        order = [targets[s.get(f"{R_NS}id")] for s in pres.iter(f"{P_NS}sldId")]
+        if order:
+            return order
+    except (KeyError, ET.ParseError):
+        pass
+
+    slides = [n for n in zf.namelist() if re.fullmatch(r"ppt/slides/slide\d+\.xml", n)]
+    return sorted(slides, key=lambda n: int(re.search(r"(\d+)\.xml$", n).group(1)))
+
+
+@register(".pptx")
+def _iter_pptx(path: str) -> Iterator[str]:
+    with zipfile.ZipFile(path) as zf:
+        for name in _pptx_slide_order(zf):
+            try:
+                root = ET.fromstring(zf.read(name))
+            except (KeyError, ET.ParseError):
+                yield ""
+                continue
+            lines = []
+            for para in root.iter(f"{A_NS}p"):
+                text = "".join(t.text or "" for t in para.iter(f"{A_NS}t")).strip()
+                if text:
+                    lines.append(text)
+            # één "pagina" per slide, ook als die leeg is (paginanummer = slidenummer)
+            yield "\n".join(lines)
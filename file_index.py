@@ -0,0 +1,288 @@
+import os
+import re
+import json
+import math
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import pdf_text
+
+# ==== Zoeken in cursusbestanden (per pagina) ====
+# Per bestand bouwen we één keer een omgekeerde index (woord -> pagina's) en
+# bewaren die naast de tekst-cache: <map>/.text_cache/<sha256>.index.json.
+# Net als de tekst hangt de index aan de inhoud (sha), dus een bestand dat
+# in twee vakken zit wordt maar één keer geïndexeerd.
+#
+# Zoeken in een vak = de indexen van zijn bestanden combineren en de pagina's
+# rangschikken met BM25. Alleen de postings van de zoekwoorden worden
+# bekeken, dus dat blijft snel ook bij duizenden pagina's. Geladen indexen
+# blijven (beperkt) in het geheugen.
+#
+# Voor de snippets schrijft build_index de paginatekst (witruimte samengevoegd)
+# achter elkaar in <sha256>.pages.txt; de index bewaart per pagina
+# [byte-offset, lengte]. Een zoekopdracht leest zo alleen de pagina's die in
+# de resultaten komen, niet de hele tekst-cache van het bestand.
+#
+# Indexeren gebeurt in de ingest-job na een upload (ingest.run_pipeline). Bij
+# het zoeken wordt nooit tekst uitgelezen: een bestand zonder index wordt
+# hoogstens uit de tekst-cache geïndexeerd, anders overgeslagen.
+
+INDEX_VERSION = 2
+INDEX_SUFFIX = ".index.json"
+PAGES_SUFFIX = ".pages.txt"
+# Aantal bestandsindexen dat in het geheugen blijft
+MAX_LOADED_INDEXES = 64
+
+# BM25-parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SNIPPET_CHARS = 240
+MIN_TOKEN_LEN = 2
+
+# Korte woorden die bijna overal in voorkomen (nl + en)
+STOPWORDS = {
+    "de", "het", "een", "en", "van", "in", "op", "te", "dat", "die", "is", "zijn",
+    "met", "voor", "niet", "aan", "er", "om", "ook", "als", "bij", "of", "naar",
+    "dan", "door", "wordt", "worden", "deze", "dit", "je", "we", "wat", "kan",
+    "the", "and", "of", "to", "in", "is", "are", "for", "on", "with", "as", "by",
+    "an", "be", "this", "that", "it", "or", "from", "at",
+}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_lock = threading.Lock()
+_loaded: "OrderedDict[str, Dict]" = OrderedDict()
+
+
+def normalize(word: str) -> str:
+    """Kleine letters en zonder accenten (café -> cafe)."""
+    word = unicodedata.normalize("NFKD", word.lower())
+    return "".join(ch for ch in word if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        tok for tok in (normalize(m.group(0)) for m in _TOKEN_RE.finditer(text or ""))
+        if len(tok) >= MIN_TOKEN_LEN and tok not in STOPWORDS
+    ]
+
+
+def _index_path(path: str, sha: str) -> str:
+    return pdf_text.sidecar_path(path, sha, INDEX_SUFFIX)
+
+
+def _pages_path(path: str, sha: str) -> str:
+    return pdf_text.sidecar_path(path, sha, PAGES_SUFFIX)
+
+
+def _write_atomic(target: str, data: bytes):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, target)
+
+
+def build_index(path: str, sha: str, pages: List[str]) -> Dict:
+    """Bouw de index van één bestand en schrijf ze weg naast de tekst-cache."""
+    postings: Dict[str, List[List[int]]] = {}
+    doc_len = []
+    page_offsets = []
+    texts = []
+    offset = 0
+    for page_no, text in enumerate(pages, start=1):
+        data = " ".join((text or "").split()).encode("utf-8")
+        page_offsets.append([offset, len(data)])
+        texts.append(data)
+        offset += len(data)
+        counts: Dict[str, int] = {}
+        tokens = tokenize(text)
+        for tok in tokens:
+            counts[tok] = counts.get(tok, 0) + 1
+        doc_len.append(len(tokens))
+        for tok, tf in counts.items():
+            postings.setdefault(tok, []).append([page_no, tf])
+
+    index = {
+        "version": INDEX_VERSION,
+        "sha256": sha,
+        "num_pages": len(pages),
+        "doc_len": doc_len,
+        "page_offsets": page_offsets,
+        "postings": postings,
+        "updated_at": time.time(),
+    }
+
+    # eerst de tekst, dan de index: een index verwijst nooit naar een ontbrekend bestand
+    _write_atomic(_pages_path(path, sha), b"".join(texts))
+    _write_atomic(
+        _index_path(path, sha),
+        json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    )
+
+    _remember(sha, index)
+    return index
+
+
+def _remember(sha: str, index: Dict):
+    with _lock:
+        _loaded[sha] = index
+        _loaded.move_to_end(sha)
+        while len(_loaded) > MAX_LOADED_INDEXES:
+            _loaded.popitem(last=False)
+
+
+def load_index(path: str, sha: str) -> Optional[Dict]:
+    """Index van dit bestand (uit geheugen of schijf), of None als er nog geen is."""
+    with _lock:
+        index = _loaded.get(sha)
+        if index is not None:
+            _loaded.move_to_end(sha)
+            return index
+
+    index_file = _index_path(path, sha)
+    if not os.path.exists(index_file):
+        return None
+    try:
+        with open(index_file, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except Exception:
+        return None
+    if index.get("version") != INDEX_VERSION or index.get("sha256") != sha:
+        return None
+
+    _remember(sha, index)
+    return index
+
+
+def cached_index(path: str) -> Optional[Tuple[str, Dict]]:
+    """
+    (sha, index) van een bestand, of None als het nog niet geïndexeerd is.
+    Staat de tekst al in de cache van pdf_text (bv. een index van een oudere
+    versie), dan wordt de index daaruit gebouwd; tekst uitlezen doet dit nooit.
+    """
+    sha = pdf_text.content_hash(path)
+    index = load_index(path, sha)
+    if index is None:
+        entry = pdf_text.load_cached_pages(path, sha)
+        pages = (entry or {}).get("pages")
+        if not pages or any(p is None for p in pages):
+            return None
+        index = build_index(path, sha, pages)
+    return sha, index
+
+
+def page_text(path: str, sha: str, index: Dict, page_no: int) -> str:
+    """Tekst van één pagina, rechtstreeks uit <sha>.pages.txt."""
+    offsets = index.get("page_offsets") or []
+    if not (0 < page_no <= len(offsets)):
+        return ""
+    start, length = offsets[page_no - 1]
+    try:
+        with open(_pages_path(path, sha), "rb") as f:
+            f.seek(start)
+            return f.read(length).decode("utf-8", errors="replace")
+    except OSError:
+        return ""
+
+
+# ---- zoeken ----
+
+def make_snippet(text: str, terms: set) -> List[Tuple[str, bool]]:
+    """
+    Stukje tekst rond de eerste treffer, als lijst van (tekst, is_treffer),
+    zodat de template zelf kan escapen en <mark> toevoegen.
+    """
+    text = " ".join((text or "").split())
+    matches = [m for m in _TOKEN_RE.finditer(text) if normalize(m.group(0)) in terms]
+    if matches:
+        start = max(0, matches[0].start() - SNIPPET_CHARS // 3)
+    else:
+        start = 0
+    end = min(len(text), start + SNIPPET_CHARS)
+    # niet midden in een woord beginnen/eindigen
+    if start > 0:
+        space = text.find(" ", start)
+        start = space + 1 if 0 <= space < matches[0].start() else start
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+
+    parts: List[Tuple[str, bool]] = []
+    if start > 0:
+        parts.append(("… ", False))
+    pos = start
+    for m in matches:
+        if m.start() < start or m.end() > end:
+            continue
+        if m.start() > pos:
+            parts.append((text[pos:m.start()], False))
+        parts.append((m.group(0), True))
+        pos = m.end()
+    if pos < end:
+        parts.append((text[pos:end], False))
+    if end < len(text):
+        parts.append((" …", False))
+    return parts
+
+
+def search(files: List[Tuple[str, str]], query: str, limit: int = 20) -> List[Dict]:
+    """
+    Zoek in de bestanden van een vak.
+    files: [(bestandsnaam, pad)]; bestanden zonder index worden overgeslagen.
+
+    Retourneert de beste pagina's: [{"file", "page", "score", "snippet"}]
+    (snippet = lijst van (tekst, is_treffer)).
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+
+    indexes = []
+    for filename, path in files:
+        try:
+            found = cached_index(path)
+        except Exception as e:
+            print(f"Index-fout ({filename}):", e)
+            continue
+        if found is not None:
+            indexes.append((filename, path) + found)
+
+    total_pages = sum(idx["num_pages"] for _, _, _, idx in indexes)
+    if not total_pages:
+        return []
+    avg_len = (sum(sum(idx["doc_len"]) for _, _, _, idx in indexes) / total_pages) or 1.0
+
+    # document frequency per term over ALLE pagina's van het vak
+    df = {t: sum(len(idx["postings"].get(t, ())) for _, _, _, idx in indexes) for t in terms}
+
+    scores: Dict[Tuple[int, int], float] = {}
+    for file_no, (_, _, _, idx) in enumerate(indexes):
+        for t in terms:
+            postings = idx["postings"].get(t)
+            if not postings:
+                continue
+            idf = math.log(1 + (total_pages - df[t] + 0.5) / (df[t] + 0.5))
+            for page_no, tf in postings:
+                length = idx["doc_len"][page_no - 1]
+                norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len))
+                key = (file_no, page_no)
+                scores[key] = scores.get(key, 0.0) + idf * norm
+
+    ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+
+    results = []
+    term_set = set(terms)
+    for (file_no, page_no), score in ranked:
+        filename, path, sha, idx = indexes[file_no]
+        results.append({
+            "file": filename,
+            "page": page_no,
+            "score": round(score, 3),
+            "snippet": make_snippet(page_text(path, sha, idx, page_no), term_set),
+        })
+    return results
@@ -0,0 +1,201 @@
+import re
+import time
+from typing import Dict, List, Tuple
+
+import ai_utils
+import chunking
+import extractors
+import file_index
+import pdf_text
+
+# ==== Per-bestand verwerkingsstatus ====
+# "AI: topics genereren" en "PDF verwerken" lazen vroeger ALLE bestanden van
+# een vak opnieuw en stuurden alles naar de AI. Nu houden we per bestand bij
+# wat er al uit gehaald is, in course["ingest"]:
+#
+#   {
+#     "course1_cursus.pdf": {
+#       "sha256": "...",            # inhoud waarop de resultaten gebaseerd zijn
+#       "num_pages": 51,
+#       "chunks": [[1, 6], [7, 9]], # paginabereik per chunk (of None)
+#       "topics": [...],            # resultaat van de topics-stap (of None)
+#       "structure": {              # resultaat van de PDF-analyse (of None)
+#         "topics": [...], "summary": "...", "concepts": [...]
+#       },
+#       "updated_at": 1700000000.0
+#     }
+#   }
+#
+# Mislukt een deel van de stukken, dan blijft de stap open en staan de
+# gelukte stukken in "<stap>_chunk_results" (de mislukte in
+# "<stap>_failed_chunks"); de volgende run doet alleen de mislukte opnieuw.
+#
+# De paginatekst zelf staat niet hier maar in de cache van pdf_text (op sha).
+# Verandert de inhoud van een bestand (andere sha), dan vervallen de
+# resultaten van dat bestand en wordt alleen dat bestand opnieuw verwerkt.
+#
+# Bij een upload draait run_pipeline() meteen op de achtergrond (als job):
+# hash -> tekst uitlezen (komt in de cache) -> chunks -> zoekindex -> eventueel topics.
+# Tegen dat de student het vak opent is het zware werk dan al gedaan.
+
+STEP_CHUNKS = "chunks"
+STEP_TOPICS = "topics"
+STEP_STRUCTURE = "structure"
+
+
+def ensure_ingest_state(course: dict) -> Dict[str, Dict]:
+    """Zorgt ervoor dat course['ingest'] een dict is (bestandsnaam -> status)."""
+    state = course.get("ingest")
+    if not isinstance(state, dict):
+        state = {}
+        course["ingest"] = state
+    return state
+
+
+def display_name(filename: str) -> str:
+    """Bestandsnaam zonder het 'course3_'-voorvoegsel van de uploadmap."""
+    return re.sub(r"^course\d+_", "", filename)
+
+
+def pending_files(course: dict, files: List[str], paths: Dict[str, str], step: str) -> List[Tuple[str, str]]:
+    """
+    Bestanden waarvoor `step` nog moet draaien: nieuw, of inhoud gewijzigd.
+    paths: bestandsnaam -> pad op schijf.
+    Retourneert [(bestandsnaam, sha256)], in de volgorde van `files`.
+    """
+    state = ensure_ingest_state(course)
+    result = []
+    for filename in files:
+        try:
+            sha = pdf_text.content_hash(paths[filename])
+        except OSError as e:
+            print(f"Bestand niet leesbaar ({filename}):", e)
+            continue
+        entry = state.get(filename)
+        if entry and entry.get("sha256") == sha and entry.get(step) is not None:
+            continue
+        result.append((filename, sha))
+    return result
+
+
+def record_result(course: dict, filename: str, sha: str, step: str, result, num_pages: int = None):
+    """Sla het resultaat van één stap voor één bestand op."""
+    state = ensure_ingest_state(course)
+    entry = state.get(filename)
+    if not entry or entry.get("sha256") != sha:
+        # nieuw bestand of nieuwe inhoud: oude resultaten vervallen
+        entry = {"sha256": sha, "num_pages": None, STEP_CHUNKS: None, STEP_TOPICS: None, STEP_STRUCTURE: None}
+        state[filename] = entry
+    if num_pages is not None:
+        entry["num_pages"] = num_pages
+    entry[step] = result
+    entry.pop(f"{step}_failed_chunks", None)
+    entry.pop(f"{step}_chunk_results", None)
+    entry["updated_at"] = time.time()
+
+
+def record_failed_chunks(
+    course: dict, filename: str, sha: str, step: str, failed: List[int],
+    done: Dict[int, Dict] = None, num_pages: int = None,
+):
+    """
+    Stap deels mislukt: onthoud welke stukken ontbreken en wat de gelukte
+    stukken opleverden (done: chunk-index -> resultaat), maar markeer de stap
+    niet als klaar. pending_files geeft het bestand de volgende keer terug en
+    partial_results() zorgt dat dan alleen de ontbrekende stukken opnieuw gaan.
+    """
+    record_result(course, filename, sha, step, None, num_pages=num_pages)
+    entry = ensure_ingest_state(course)[filename]
+    entry[f"{step}_failed_chunks"] = list(failed)
+    if done:
+        # JSON: sleutels als tekst
+        entry[f"{step}_chunk_results"] = {str(i): r for i, r in done.items()}
+
+
+def partial_results(course: dict, filename: str, sha: str, step: str) -> Dict[int, Dict]:
+    """Resultaten per stuk van een vorige, deels mislukte run op dezelfde inhoud."""
+    entry = ensure_ingest_state(course).get(filename) or {}
+    if entry.get("sha256") != sha:
+        return {}
+    return {int(i): r for i, r in (entry.get(f"{step}_chunk_results") or {}).items()}
+
+
+def known_entry(courses: List[dict], sha: str):
+    """
+    Verwerkingsstatus van dezelfde inhoud in een ander vak (kopie), of None.
+    Zo wordt een PDF die al in een ander vak zit niet opnieuw verwerkt.
+    """
+    for other in courses:
+        # andere vakken worden zonder lock gelezen: eerst een kopie van de waarden
+        for entry in list((other.get("ingest") or {}).values()):
+            if entry.get("sha256") == sha and entry.get(STEP_CHUNKS) is not None:
+                return dict(entry, updated_at=time.time())
+    return None
+
+
+def forget_missing(course: dict):
+    """Vergeet de status van bestanden die niet meer bij het vak horen."""
+    state = ensure_ingest_state(course)
+    files = set(course.get("files", []))
+    for filename in list(state):
+        if filename not in files:
+            del state[filename]
+
+
+def all_topics(course: dict, step: str = STEP_TOPICS) -> List[str]:
+    """Alle topics die een stap tot nu toe uit de bestanden van dit vak haalde."""
+    topics = []
+    for filename in course.get("files", []):
+        entry = ensure_ingest_state(course).get(filename) or {}
+        result = entry.get(step)
+        if step == STEP_STRUCTURE:
+            result = (result or {}).get("topics")
+        for t in result or []:
+            if t not in topics:
+                topics.append(t)
+    return topics
+
+
+def run_pipeline(path: str, with_topics: bool = False, topics_max_chars: int = None, progress=None) -> Dict:
+    """
+    Verwerk één geüpload bestand: hash, tekst per pagina, chunks, zoekindex
+    en (optioneel) topics. Raakt het vak zelf niet aan; het resultaat wordt
+    daarna met record_result() opgeslagen.
+
+    Retourneert: {"sha256", "num_pages", "chunks", "topics"}
+    (topics is None als die stap niet gevraagd of mislukt is)
+    """
+    progress = progress or (lambda pct, message="": None)
+
+    progress(5, "Hash berekenen")
+    sha = pdf_text.content_hash(path)
+
+    progress(15, "Tekst uitlezen")
+    pages = extractors.extract_pages(path)
+
+    progress(60, "Opdelen in stukken")
+    chunks = chunking.chunk_pages(pages, ai_utils.PDF_CHUNK_CHARS)
+
+    progress(65, "Zoekindex bouwen")
+    if file_index.load_index(path, sha) is None:
+        file_index.build_index(path, sha, pages)
+
+    topics = None
+    if with_topics:
+        if not chunks:
+            topics = []
+        else:
+            progress(70, "AI genereert topics")
+            text = ai_utils.extract_text_from_file(path, max_chars=topics_max_chars)
+            topics, error = ai_utils.generate_topics_from_text(text, max_topics=12)
+            if not topics:
+                # topics zijn een extraatje: de rest van de verwerking is wel gelukt
+                print("AI topic generation error bij upload:", error)
+                topics = None
+
+    return {
+        "sha256": sha,
+        "num_pages": len(pages),
+        "chunks": [[c["page_start"], c["page_end"]] for c in chunks],
+        "topics": topics,
+    }
@@ -0,0 +1,281 @@
+import os
+import glob
+import json
+import time
+import uuid
+import threading
+from typing import Callable, Dict, List, Optional
+
+# ==== Achtergrondtaken voor AI ====
+# Lange AI-aanroepen (topics, samenvattingen, planning, examen, PDF-analyse,
+# vragen/samenvatting uit notities) draaien niet meer binnen de request.
+# De route zet een job in de wachtrij en krijgt meteen een job-id terug;
+# een paar worker-threads voeren de AI-stap uit en passen daarna het
+# resultaat toe op het vak. De jobtabel staat in een JSON-bestand zodat
+# de status een herstart overleeft.
+#
+# Een job bestaat uit twee functies:
+#   work(progress)  -> result   de trage AI-stap; progress(pct, message)
+#   apply(result)   -> None     resultaat op het vak zetten + opslaan
+#
+# Volgorde: niet first-come-first-served, maar op prioriteit (een tuple,
+# kleiner = dringender; app.py baseert die op risk_status en days_to_exam).
+# Bij gelijke prioriteit gaat het vak voor dat nu het minst draait en het
+# minst vaak aan de beurt was (eerlijk verdelen), daarna de oudste job.
+# Per vak draaien nooit meer dan max_per_course jobs tegelijk.
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Hoeveel afgeronde jobs we in de tabel bewaren
+MAX_FINISHED_JOBS = 200
+# Voortgang (progress) wordt hoogstens om de zoveel seconden weggeschreven;
+# statuswijzigingen (gestart, klaar, mislukt) altijd meteen
+PROGRESS_SAVE_INTERVAL = 2.0
+# Boven zoveel vakken in de eerlijkheidstellers: vakken zonder wachtende of
+# lopende job vergeten
+MAX_SERVED_KEYS = 500
+
+
+def process_path(path: str, pid=None) -> str:
+    """jobs_data.json -> jobs_data.<pid>.json (één jobtabel per proces)."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid() if pid is None else pid}{ext}"
+
+
+class JobQueue:
+    def __init__(self, path: str, workers: int = 2, max_per_course: int = 1, peer_pattern: str = None):
+        """
+        peer_pattern: glob van de jobtabellen van andere processen (gedeelde
+        modus); get() kijkt daar als de job hier niet bekend is.
+        """
+        self.path = path
+        self.peer_pattern = peer_pattern
+        self.workers = max(1, workers)
+        self.max_per_course = max(1, max_per_course)
+        self._cond = threading.Condition()
+        self._pending: List[str] = []
+        self._running: Dict[str, int] = {}
+        self._served: Dict[str, int] = {}
+        self._tasks: Dict[str, tuple] = {}
+        self._threads: List[threading.Thread] = []
+        self._last_save = 0.0
+        self.jobs: Dict[str, Dict] = self._load()
+
+    # ---- persistente jobtabel ----
+
+    def _load(self) -> Dict[str, Dict]:
+        """Laad de jobtabel; jobs die bij een herstart nog liepen zijn verloren."""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                jobs = json.load(f)
+        except Exception:
+            return {}
+
+        for job in jobs.values():
+            if job.get("status") in (JOB_QUEUED, JOB_RUNNING):
+                job["status"] = JOB_FAILED
+                job["error"] = "Onderbroken door een herstart van de server."
+                job["finished_at"] = time.time()
+        return jobs
+
+    def _save(self):
+        """Schrijf de jobtabel weg (aanroepen met self._cond vast)."""
+        finished = [j for j in self.jobs.values() if j["status"] in (JOB_DONE, JOB_FAILED)]
+        if len(finished) > MAX_FINISHED_JOBS:
+            finished.sort(key=lambda j: j.get("finished_at") or 0)
+            for job in finished[: len(finished) - MAX_FINISHED_JOBS]:
+                del self.jobs[job["id"]]
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.jobs, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self._last_save = time.monotonic()
+
+    # ---- publieke API ----
+
+    def submit(
+        self,
+        kind: str,
+        course_id: int,
+        course_name: str,
+        work: Callable,
+        apply: Optional[Callable] = None,
+        priority: tuple = (),
+    ) -> str:
+        """
+        Zet een job in de wachtrij en geef meteen het job-id terug.
+        priority: tuple waarbij kleiner = dringender (leeg = laagste prioriteit).
+        """
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "course_id": course_id,
+            "course_name": course_name,
+            "priority": list(priority),
+            "status": JOB_QUEUED,
+            "progress": 0,
+            "message": "In de wachtrij",
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        with self._cond:
+            self.jobs[job_id] = job
+            self._tasks[job_id] = (work, apply)
+            self._pending.append(job_id)
+            self._save()
+            self._ensure_workers()
+            self._cond.notify_all()
+        return job_id
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """Positie (1 = volgende) van een wachtende job in de huidige volgorde."""
+        with self._cond:
+            if job_id not in self._pending:
+                return None
+            ordered = sorted(self._pending, key=self._sort_key)
+            return ordered.index(job_id) + 1
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job:
+                return dict(job)
+        return self._peer_job(job_id)
+
+    def _peer_job(self, job_id: str) -> Optional[Dict]:
+        """Job uit de tabel van een ander proces (alleen lezen)."""
+        if not self.peer_pattern:
+            return None
+        for path in glob.glob(self.peer_pattern):
+            if path == self.path:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    job = json.load(f).get(job_id)
+            except (OSError, ValueError):
+                continue
+            if job:
+                return job
+        return None
+
+    def jobs_for_course(self, course_id: int, course_name: str = None, limit: int = 5) -> List[Dict]:
+        """Meest recente jobs van één vak (nieuwste eerst)."""
+        with self._cond:
+            items = [
+                dict(j) for j in self.jobs.values()
+                if j.get("course_id") == course_id
+                and (course_name is None or j.get("course_name") == course_name)
+            ]
+        items.sort(key=lambda j: j.get("created_at") or 0, reverse=True)
+        return items[:limit]
+
+    # ---- workers ----
+
+    def _ensure_workers(self):
+        """Start de worker-threads pas bij de eerste job (aanroepen met lock vast)."""
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._worker, name="studyos-job-worker", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _update(self, job_id: str, throttle: bool = False, **fields):
+        """
+        Velden van een job aanpassen en wegschrijven; met throttle=True
+        (voortgang) hoogstens om de PROGRESS_SAVE_INTERVAL seconden.
+        """
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            if throttle and time.monotonic() - self._last_save < PROGRESS_SAVE_INTERVAL:
+                return
+            self._save()
+
+    def _prune_served(self):
+        """Tellers van vakken zonder wachtende/lopende job vergeten (lock vast)."""
+        if len(self._served) <= MAX_SERVED_KEYS:
+            return
+        active = set(self._running) | {self._course_key(self.jobs[j]) for j in self._pending}
+        for key in [k for k in self._served if k not in active]:
+            del self._served[key]
+
+    @staticmethod
+    def _course_key(job: Dict) -> str:
+        return f"{job.get('course_id')}:{job.get('course_name')}"
+
+    def _sort_key(self, job_id: str):
+        job = self.jobs[job_id]
+        key = self._course_key(job)
+        # Lege prioriteit sorteert achteraan
+        priority = tuple(job.get("priority") or ()) or (float("inf"),)
+        return (
+            priority,
+            self._running.get(key, 0),
+            self._served.get(key, 0),
+            job.get("created_at") or 0,
+        )
+
+    def _next_job(self) -> Optional[str]:
+        """Dringendste job waarvan het vak nog onder de limiet zit (lock vast)."""
+        eligible = [
+            job_id for job_id in self._pending
+            if self._running.get(self._course_key(self.jobs[job_id]), 0) < self.max_per_course
+        ]
+        if not eligible:
+            return None
+        return min(eligible, key=self._sort_key)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job_id = self._next_job()
+                while job_id is None:
+                    self._cond.wait()
+                    job_id = self._next_job()
+                self._pending.remove(job_id)
+                work, apply = self._tasks.pop(job_id)
+                key = self._course_key(self.jobs[job_id])
+                self._running[key] = self._running.get(key, 0) + 1
+                self._served[key] = self._served.get(key, 0) + 1
+
+            try:
+                self._run(job_id, work, apply)
+            finally:
+                with self._cond:
+                    self._running[key] -= 1
+                    if not self._running[key]:
+                        del self._running[key]
+                    self._prune_served()
+                    # een job van dit vak mag nu misschien starten
+                    self._cond.notify_all()
+
+    def _run(self, job_id: str, work: Callable, apply: Optional[Callable]):
+        self._update(job_id, status=JOB_RUNNING, started_at=time.time(), message="Bezig")
+
+        def progress(pct: int, message: str = ""):
+            self._update(
+                job_id, throttle=True,
+                progress=max(0, min(int(pct), 100)), message=message or "Bezig",
+            )
+
+        try:
+            result = work(progress)
+            if apply is not None:
+                apply(result)
+        except Exception as e:
+            print(f"Job {job_id} mislukt:", e)
+            self._update(job_id, status=JOB_FAILED, error=str(e), finished_at=time.time(), message="Mislukt")
+            return
+
+        self._update(job_id, status=JOB_DONE, progress=100, finished_at=time.time(), message="Klaar")
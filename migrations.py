@@ -0,0 +1,124 @@
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import dates
+import models
+import textstore
+
+# ==== Schemaversie van vakken en projecten ====
+# Elk record draagt zijn schemaversie in "_schema". Bij het laden (en bij
+# records die een ander proces net wegschreef) loopt migrate() record per
+# record alleen de migraties die nog niet gebeurd zijn; daarna wordt het
+# record in het nieuwe formaat weggeschreven. Een record dat al op de
+# laatste versie staat kost dus niets meer bij het opstarten, en routes
+# hoeven de structuur niet opnieuw te controleren.
+#
+# Nieuwe migratie: een functie met het volgende versienummer registreren.
+# Nooit een bestaande migratie aanpassen; die kan al gelopen hebben.
+#
+#   @migration("course", 4)
+#   def _course_rename_tag(course):
+#       course["label"] = course.pop("tag", "")
+
+SCHEMA_KEY = "_schema"
+
+MIGRATIONS: Dict[str, List[Tuple[int, Callable[[dict], None]]]] = {"course": [], "project": []}
+
+
+def migration(kind: str, version: int):
+    """Decorator: registreer de stap naar `version` voor "course" of "project"."""
+    def decorator(func):
+        steps = MIGRATIONS[kind]
+        if any(v == version for v, _ in steps):
+            raise ValueError(f"Migratie {kind} v{version} bestaat al")
+        steps.append((version, func))
+        steps.sort(key=lambda step: step[0])
+        return func
+    return decorator
+
+
+def latest(kind: str) -> int:
+    steps = MIGRATIONS[kind]
+    return steps[-1][0] if steps else 0
+
+
+def schema_of(record: dict) -> int:
+    value = record.get(SCHEMA_KEY, 0)
+    return value if isinstance(value, int) else 0
+
+
+def migrate(record: dict, kind: str) -> bool:
+    """Breng één record naar de laatste schemaversie; True als er iets gebeurde."""
+    current = schema_of(record)
+    target = latest(kind)
+    if current >= target:
+        return False
+    for version, step in MIGRATIONS[kind]:
+        if version > current:
+            step(record)
+    record[SCHEMA_KEY] = target
+    return True
+
+
+def migrate_all(records: Iterable[dict], kind: str) -> int:
+    """migrate() op elk record; retourneert hoeveel er bijgewerkt werden."""
+    count = sum(1 for record in records if migrate(record, kind))
+    if count:
+        print(f"Schema bijgewerkt: {count} {kind}-record(s) naar versie {latest(kind)}")
+    return count
+
+
+# ---- vakken ----
+
+@migration("course", 1)
+def _course_model(course: dict):
+    """Types en structuur volgens models.COURSE (notes.folders, qa-tellers, ...)."""
+    models.normalize(course, models.COURSE)
+
+
+@migration("course", 2)
+def _course_text_store(course: dict):
+    """Notitie-inhoud en AI-chat uit het record naar textstore."""
+    textstore.externalize_chat(course)
+    textstore.externalize_notes(course)
+
+
+@migration("course", 3)
+def _course_exam_date(course: dict):
+    """exam_date als YYYY-MM-DD ("25 jan": eerstvolgende 25 januari); onleesbaar -> exam_date_raw."""
+    raw = course.get("exam_date") or ""
+    iso = dates.to_iso(raw)
+    if iso is None and raw.strip():
+        course["exam_date_raw"] = raw
+    course["exam_date"] = iso or ""
+
+
+@migration("course", 4)
+def _course_drop_derived(course: dict):
+    """Afgeleide velden horen niet (meer) in het record; ze worden per weergave berekend."""
+    for key in ("days_to_exam", "progress_pct", "progress_label",
+                "mastered_questions", "total_questions", "risk_status"):
+        course.pop(key, None)
+
+
+# ---- projecten ----
+
+@migration("project", 1)
+def _project_model(project: dict):
+    models.normalize(project, models.PROJECT)
+
+
+@migration("project", 2)
+def _project_deadline(project: dict):
+    """deadline als YYYY-MM-DD; onleesbaar -> deadline_raw."""
+    raw = project.get("deadline") or ""
+    iso = dates.to_iso(raw)
+    if iso is None and raw.strip():
+        project["deadline_raw"] = raw
+    project["deadline"] = iso or ""
+
+
+@migration("project", 3)
+def _project_drop_derived(project: dict):
+    """days_to_deadline/status worden per weergave berekend (progress_pct blijft)."""
+    for key in ("days_to_deadline", "status"):
+        project.pop(key, None)
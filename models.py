@@ -0,0 +1,142 @@
+from typing import Any, Callable, Dict, List, Tuple
+
+# ==== Schema van vakken en projecten ====
+# Vakken/projecten blijven gewone dicts, in het geheugen en in de JSON
+# (routes, templates, zoekindex en store werken daarmee). Er zijn dus geen
+# dataclasses met __slots__ en geen geheugenwinst per record: dit module
+# beschrijft alleen hoe zo'n dict eruit hoort te zien, en normalize() zet
+# een record één keer recht, in place (migratie course/project v1):
+#
+#   models.normalize(course, models.COURSE)
+#
+# Per veld zet een functie de waarde om (tellers -> int, tekst -> str,
+# lijsten -> lijsten van het juiste type) en gooit ongeldige elementen weg.
+# Er worden geen tussenobjecten gebouwd: een veld dat al klopt blijft
+# hetzelfde object, geneste dicts (qa, blokken, notities, taken) worden zelf
+# ook in place rechtgezet. Velden die hier niet beschreven zijn (ingest,
+# file_blobs, exam_session, ...) blijven ongewijzigd staan.
+#
+# Na het rechtzetten bij het laden/aanmaken mag de rest van de code ervan
+# uitgaan dat bv. qa[i]["correct"] (als het er is) al een int is.
+
+# schema: (veldnaam, functie die de waarde rechtzet)
+Schema = Tuple[Tuple[str, Callable[[Any], Any]], ...]
+
+# teruggeven om het veld weg te laten
+DROP = object()
+
+# velden die mogen ontbreken als hun inhoud elders staat: veld -> verwijzing
+# (notitie-inhoud in textstore, zie LazyNote)
+EXTERNAL = {"content": "content_ref"}
+
+
+def _str(value: Any, default: str = "") -> str:
+    if value is None:
+        return default
+    return value if isinstance(value, str) else str(value)
+
+
+def _int(value: Any) -> int:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _list(value: Any) -> list:
+    return value if isinstance(value, list) else []
+
+
+def _text(default: str = "") -> Callable[[Any], str]:
+    return lambda value: _str(value, default)
+
+
+def _texts(value: Any) -> List[str]:
+    return [_str(v) for v in _list(value) if v]
+
+
+def _counter(value: Any):
+    # tellers alleen bewaren als ze iets zeggen (compacte JSON)
+    return max(0, _int(value)) or DROP
+
+
+def _records(schema: "Schema", keep: Callable[[Dict], bool] = lambda d: True) -> Callable[[Any], List[Dict]]:
+    """Lijst van dicts volgens `schema`; andere elementen vallen weg."""
+    def fix(value: Any) -> List[Dict]:
+        return [normalize(d, schema) for d in _list(value) if isinstance(d, dict) and keep(d)]
+    return fix
+
+
+QA_ITEM: Schema = (
+    ("question", lambda v: _str(v).strip()),
+    ("answer", lambda v: _str(v, "—") or "—"),
+    ("correct", _counter),
+    ("wrong", _counter),
+)
+
+BLOCK: Schema = (
+    ("title", _text()),
+    ("duration", _text()),
+    ("when", _text()),
+)
+
+NOTE: Schema = (
+    ("title", _text("Ongetitelde notitie")),
+    ("content", _text()),
+)
+
+NOTE_FOLDER: Schema = (
+    ("name", _text("Map")),
+    ("notes", _records(NOTE)),
+)
+
+_folders = _records(NOTE_FOLDER)
+
+COURSE: Schema = (
+    ("name", _text("Naamloos vak")),
+    ("chapters", _text()),
+    ("questions", _text()),
+    ("tag", _text()),
+    ("exam_date", _text()),
+    ("progress", _text("low")),
+    ("files", _texts),
+    ("topics", _texts),
+    ("qa", _records(QA_ITEM, keep=lambda q: bool(_str(q.get("question")).strip()))),
+    ("blocks", _records(BLOCK)),
+    ("notes", lambda v: {"folders": _folders(v.get("folders") if isinstance(v, dict) else None)}),
+)
+
+TASK: Schema = (
+    ("title", _text()),
+    ("done", bool),
+)
+
+PROJECT: Schema = (
+    ("title", _text("Naamloos project")),
+    ("tag", _text("Project")),
+    ("deadline", _text()),
+    ("description", _text()),
+    ("progress_pct", lambda v: min(100, max(0, _int(v)))),
+    ("tasks", _records(TASK)),
+    ("notes", _text()),
+)
+
+
+def normalize(record: Dict, schema: Schema) -> Dict:
+    """Zet een record recht volgens `schema`, zonder het dict-object te vervangen."""
+    for key, fix in schema:
+        # dict.get: bij een LazyNote de inhoud niet van schijf lezen
+        value = dict.get(record, key)
+        if value is None and EXTERNAL.get(key) in record:
+            continue
+        new = fix(value)
+        if new is DROP:
+            if key in record:
+                del record[key]
+        elif key not in record or type(new) is not type(value) or new != value:
+            record[key] = new
+    return record
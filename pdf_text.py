@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import PyPDF2
+
+# ==== PDF-tekst met cache ====
+# Tekst uit een PDF halen is traag (een grote reader duurt seconden), en we
+# deden het bij elke klik op "AI: topics genereren" of "PDF verwerken" opnieuw.
+# Daarom bewaren we de tekst per pagina in een sidecar-cache naast de
+# uploads: <uploads>/.text_cache/<sha256>.json. De sleutel is de SHA-256 van
+# de inhoud, dus een hernoemd of opnieuw geüpload identiek bestand gebruikt
+# dezelfde cache. Om niet elke keer het hele bestand te hashen onthouden we
+# per pad (grootte, mtime) -> sha256.
+#
+# Grote PDF's worden parallel gelezen: de ontbrekende pagina's worden in
+# reeksen verdeeld over een ProcessPoolExecutor (PyPDF2 is pure Python, dus
+# threads helpen niet door de GIL) en daarna in volgorde samengevoegd.
+#
+# Wie maar een stuk van de tekst nodig heeft (bv. de eerste 6000 tekens
+# voor een prompt) gebruikt iter_pages(max_chars=...): die leest pagina per
+# pagina en stopt zodra het budget gehaald is. Wat gelezen is gaat ook in
+# de cache; de rest blijft null tot iemand het echt nodig heeft.
+
+CACHE_DIRNAME = ".text_cache"
+CACHE_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Aantal processen voor het lezen van PDF-pagina's (1 = niet parallel)
+PDF_WORKERS = int(os.getenv("STUDYOS_PDF_WORKERS", "0") or 0) or min(4, os.cpu_count() or 1)
+# Kleinere PDF's lezen we gewoon serieel (opstarten van processen kost ook tijd)
+MIN_PAGES_FOR_POOL = 24
+
+# Eén procespool voor het hele proces, één keer aangemaakt en nooit vervangen
+# (andere threads kunnen er op elk moment nog werk naar sturen)
+_pool: Optional[ProcessPoolExecutor] = None
+
+_lock = threading.Lock()
+# pad -> (size, mtime_ns, sha256)
+_hash_index: Dict[str, Tuple[int, int, str]] = {}
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 van een bestand, in blokken gelezen (geen heel bestand in geheugen)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def content_hash(path: str) -> str:
+    """
+    SHA-256 van een bestand, maar opnieuw berekend alleen als grootte of
+    mtime veranderd is sinds de vorige keer.
+    """
+    st = os.stat(path)
+    with _lock:
+        known = _hash_index.get(path)
+    if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+        return known[2]
+
+    sha = file_sha256(path)
+    with _lock:
+        _hash_index[path] = (st.st_size, st.st_mtime_ns, sha)
+    return sha
+
+
+def sidecar_path(path: str, sha: str, suffix: str) -> str:
+    """Pad van een bestand in de cache-map naast `path` (bv. de zoekindex)."""
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIRNAME)
+    return os.path.join(cache_dir, f"{sha}{suffix}")
+
+
+def _cache_path(path: str, sha: str) -> str:
+    return sidecar_path(path, sha, ".json")
+
+
+def load_cached_pages(path: str, sha: str) -> Optional[Dict]:
+    """Cache-entry voor dit bestand, of None als er (nog) geen is."""
+    cache_file = _cache_path(path, sha)
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except Exception:
+        return None
+    if entry.get("version") != CACHE_VERSION or entry.get("sha256") != sha:
+        return None
+    return entry
+
+
+def save_cached_pages(path: str, sha: str, pages: List[Optional[str]]):
+    """
+    Schrijf de paginateksten weg. Een pagina die (nog) niet gelezen is
+    staat als null in de lijst, zodat we later alleen die pagina's lezen.
+    """
+    cache_file = _cache_path(path, sha)
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    entry = {
+        "version": CACHE_VERSION,
+        "sha256": sha,
+        "source": os.path.basename(path),
+        "num_pages": len(pages),
+        "pages": pages,
+        "updated_at": time.time(),
+    }
+    tmp_path = f"{cache_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_file)
+
+
+def drop_cached_pages(path: str, sha: str):
+    """Verwijder de cache-entry (en andere cache-bestanden, bv. de zoekindex) van dit bestand."""
+    cache_dir = os.path.dirname(_cache_path(path, sha))
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.startswith(sha + "."):
+                os.remove(os.path.join(cache_dir, name))
+    with _lock:
+        _hash_index.pop(path, None)
+
+
+def extract_page_range(path: str, indices: List[int]) -> List[str]:
+    """
+    Lees de tekst van de gegeven pagina-indices (0-based).
+    Top-level functie zodat ze in een apart proces kan draaien.
+    """
+    with open(path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[i].extract_text() or "" for i in indices]
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    De gedeelde pool; bij de eerste aanroep gemaakt met max(workers,
+    PDF_WORKERS) processen. Een latere aanroep met een ander aantal krijgt
+    dezelfde pool (workers bepaalt dan enkel hoe fijn het werk verdeeld wordt).
+    """
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(workers, PDF_WORKERS))
+        return _pool
+
+
+def _split(indices: List[int], parts: int) -> List[List[int]]:
+    """Verdeel de indices in aaneengesloten reeksen van ongeveer gelijke grootte."""
+    size = -(-len(indices) // parts)
+    return [indices[i:i + size] for i in range(0, len(indices), size)]
+
+
+def _read_pages(path: str, pages: List[Optional[str]], workers: int) -> List[Optional[str]]:
+    """Lees alle pagina's die nog None zijn, parallel als het de moeite loont."""
+    with open(path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        if len(pages) != len(reader.pages):
+            pages = [None] * len(reader.pages)
+
+        missing = [i for i, p in enumerate(pages) if p is None]
+        if workers <= 1 or len(missing) < MIN_PAGES_FOR_POOL:
+            for i in missing:
+                pages[i] = reader.pages[i].extract_text() or ""
+            return pages
+
+    pool = _get_pool(workers)
+    # een paar reeksen meer dan workers, zodat trage pagina's beter verdeeld raken
+    chunks = _split(missing, workers * 2)
+    futures = [pool.submit(extract_page_range, path, chunk) for chunk in chunks]
+    texts = []
+    for fut in futures:  # in volgorde samenvoegen
+        texts.extend(fut.result())
+
+    for i, txt in zip(missing, texts):
+        pages[i] = txt
+    return pages
+
+
+def extract_pages(path: str, workers: int = None) -> List[str]:
+    """
+    Tekst per pagina van een PDF (lijst, in paginavolgorde), via de cache.
+    Eerste keer: PDF lezen (parallel over `workers` processen, standaard
+    PDF_WORKERS) + cache schrijven. Daarna: alleen de cache lezen.
+    """
+    sha = content_hash(path)
+    entry = load_cached_pages(path, sha)
+    pages = entry["pages"] if entry else []
+
+    if entry and all(p is not None for p in pages):
+        return pages
+
+    pages = _read_pages(path, pages, workers or PDF_WORKERS)
+    save_cached_pages(path, sha, pages)
+    return pages
+
+
+def iter_pages(path: str, max_chars: int = None) -> Iterator[str]:
+    """
+    Geef de tekst van de PDF pagina per pagina terug (generator).
+    Gecachete pagina's komen uit de cache, de rest wordt pas gelezen als
+    de aanroeper erom vraagt. Met max_chars stopt de generator zodra er
+    minstens zoveel tekens teruggegeven zijn.
+    """
+    sha = content_hash(path)
+    entry = load_cached_pages(path, sha)
+    pages = entry["pages"] if entry else None
+
+    f = None
+    reader = None
+    dirty = False
+    total = 0
+    try:
+        if pages is None:
+            f = open(path, "rb")
+            reader = PyPDF2.PdfReader(f)
+            pages = [None] * len(reader.pages)
+
+        for i in range(len(pages)):
+            if pages[i] is None:
+                if reader is None:
+                    f = open(path, "rb")
+                    reader = PyPDF2.PdfReader(f)
+                pages[i] = reader.pages[i].extract_text() or ""
+                dirty = True
+
+            yield pages[i]
+            total += len(pages[i])
+            if max_chars is not None and total >= max_chars:
+                return
+    finally:
+        if f is not None:
+            f.close()
+        if dirty:
+            save_cached_pages(path, sha, pages)
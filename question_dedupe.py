@@ -0,0 +1,235 @@
+import re
+import zlib
+import uuid
+import random
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from file_index import tokenize
+from store import UID_KEY
+
+# ==== Bijna-dubbele oefenvragen herkennen (MinHash + LSH) ====
+# De generatoren (AI per vak, AI per notitie, templates) voegen telkens nieuwe
+# vragen toe aan course["qa"]. Een exacte vergelijking houdt "Wat is een
+# neuron?" en "Leg uit: wat is een neuron" niet tegen, dus het deck loopt vol
+# met herhalingen.
+#
+# Per vak houden we een kleine index bij:
+#   - elke vraag -> verzameling "shingles" (inhoudswoorden zonder stopwoorden,
+#     meervoud-s/-en eraf, opvulwoorden als "leg uit" genegeerd);
+#   - daarvan een MinHash-handtekening (NUM_PERM getallen);
+#   - de handtekening in LSH_BANDS banden; vragen die in minstens één band
+#     gelijk zijn, zijn kandidaat.
+# Kandidaten worden daarna exact nagekeken (Jaccard >= DUPLICATE_JACCARD).
+# Zo kost een nieuwe vraag nakijken geen vergelijking met het hele deck.
+#
+# De index staat alleen in het geheugen, per vak-uid (store.UID_KEY; een vak
+# zonder uid krijgt er een), en wordt opnieuw opgebouwd zodra de vragenlijst
+# van het vak buiten deze module om veranderd is. forget()/prune() halen de
+# index van verwijderde vakken weg.
+
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+# Vanaf deze overlap (Jaccard van de shingles) zijn twee vragen "dezelfde"
+DUPLICATE_JACCARD = 0.7
+
+# Woorden die de vraag anders formuleren maar niets aan de inhoud veranderen
+FILLER_WORDS = {
+    "leg", "uit", "kort", "bondig", "precies", "eigen", "woorden", "beschrijf",
+    "geef", "verklaar", "noem", "omschrijf", "explain", "describe", "briefly",
+}
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(42)  # vaste seed: handtekeningen moeten stabiel zijn
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+_SUFFIX_RE = re.compile(r"(en|s)$")
+
+
+def _stem(token: str) -> str:
+    """Heel ruwe stam: meervoud weg (neuronen -> neuron, cellen -> cell)."""
+    if len(token) > 4:
+        return _SUFFIX_RE.sub("", token)
+    return token
+
+
+def shingles(text: str) -> Set[str]:
+    words = {_stem(t) for t in tokenize(text) if t not in FILLER_WORDS}
+    if not words:
+        # alleen stopwoorden: dan de genormaliseerde tekst zelf
+        normalized = " ".join((text or "").lower().split())
+        return {normalized} if normalized else set()
+    return words
+
+
+def signature(items: Set[str]) -> Tuple[int, ...]:
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in items] or [0]
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class NearDuplicateIndex:
+    """LSH-index over de vragen van één vak (posities = indexen in course["qa"])."""
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self._shingles: List[Set[str]] = []
+        self._buckets: List[Dict[Tuple[int, ...], List[int]]] = [{} for _ in range(LSH_BANDS)]
+
+    @staticmethod
+    def _bands(sig: Tuple[int, ...]):
+        for band in range(LSH_BANDS):
+            yield band, sig[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+
+    def find(self, text: str, items: Optional[Set[str]] = None) -> Optional[int]:
+        """Positie van een bestaande bijna-dubbele vraag, of None."""
+        items = shingles(text) if items is None else items
+        if not items:
+            return None
+        candidates = set()
+        for band, key in self._bands(signature(items)):
+            candidates.update(self._buckets[band].get(key, ()))
+        best, best_score = None, DUPLICATE_JACCARD
+        for pos in sorted(candidates):
+            score = jaccard(items, self._shingles[pos])
+            if score >= best_score and (best is None or score > best_score):
+                best, best_score = pos, score
+        return best
+
+    def add(self, text: str, items: Optional[Set[str]] = None) -> int:
+        items = shingles(text) if items is None else items
+        pos = len(self.texts)
+        self.texts.append(text)
+        self._shingles.append(items)
+        if items:
+            for band, key in self._bands(signature(items)):
+                self._buckets[band].setdefault(key, []).append(pos)
+        return pos
+
+
+_lock = threading.Lock()
+# uid van het vak -> index; geldig zolang index.texts overeenkomt met de vragen
+_indexes: Dict[str, NearDuplicateIndex] = {}
+
+
+def _course_key(course: dict) -> str:
+    return course.setdefault(UID_KEY, uuid.uuid4().hex)
+
+
+def forget(course: dict):
+    """Index van een (verwijderd) vak vergeten."""
+    uid = course.get(UID_KEY)
+    if uid:
+        with _lock:
+            _indexes.pop(uid, None)
+
+
+def prune(courses: Iterable[dict]) -> int:
+    """Alleen de indexen van deze vakken houden; retourneert hoeveel er weg zijn."""
+    live = {course.get(UID_KEY) for course in courses}
+    with _lock:
+        stale = [uid for uid in _indexes if uid not in live]
+        for uid in stale:
+            del _indexes[uid]
+    return len(stale)
+
+
+def _question_texts(course: dict) -> List[str]:
+    return [item.get("question", "") for item in course.get("qa") or []]
+
+
+def _course_index(course: dict) -> NearDuplicateIndex:
+    """Index van dit vak; opnieuw opgebouwd als de vragen intussen gewijzigd zijn."""
+    texts = _question_texts(course)
+    key = _course_key(course)
+    index = _indexes.get(key)
+    if index is None or index.texts != texts:
+        index = NearDuplicateIndex()
+        for text in texts:
+            index.add(text)
+        _indexes[key] = index
+    return index
+
+
+def add_questions(course: dict, new_items: Iterable[dict]) -> Tuple[int, int]:
+    """
+    Voeg vragen toe aan course["qa"], behalve (bijna-)dubbels van bestaande
+    of van elkaar. Een dubbel met een echt antwoord vult wel een leeg ("—")
+    antwoord van de bestaande vraag aan.
+    Retourneert (toegevoegd, overgeslagen).
+    """
+    added = skipped = 0
+    with _lock:
+        qa = course.setdefault("qa", [])
+        index = _course_index(course)
+        for item in new_items:
+            text = (item.get("question") or "").strip()
+            if not text:
+                continue
+            items = shingles(text)
+            pos = index.find(text, items)
+            if pos is not None:
+                _fill_answer(qa[pos], item)
+                skipped += 1
+                continue
+            qa.append(item)
+            index.add(text, items)
+            added += 1
+    if skipped:
+        print(f"Dubbele vragen overgeslagen: {skipped} ({course.get('name', '')})")
+    return added, skipped
+
+
+def _has_answer(item: dict) -> bool:
+    answer = (item.get("answer") or "").strip()
+    return bool(answer) and answer != "—"
+
+
+def _fill_answer(target: dict, other: dict):
+    if not _has_answer(target) and _has_answer(other):
+        target["answer"] = other["answer"]
+
+
+def dedupe_questions(course: dict) -> int:
+    """
+    Voeg bijna-dubbele vragen van een vak samen. De eerste vraag blijft staan;
+    de correct/wrong-tellingen van de dubbels worden erbij opgeteld.
+    Retourneert het aantal verwijderde vragen.
+    """
+    with _lock:
+        qa = course.get("qa") or []
+        index = NearDuplicateIndex()
+        kept: List[dict] = []
+        for item in qa:
+            text = item.get("question", "")
+            items = shingles(text)
+            pos = index.find(text, items)
+            if pos is None:
+                index.add(text, items)
+                kept.append(item)
+                continue
+            target = kept[pos]
+            for key in ("correct", "wrong"):
+                total = int(target.get(key, 0) or 0) + int(item.get(key, 0) or 0)
+                if total:
+                    target[key] = total
+            _fill_answer(target, item)
+            for key, value in item.items():
+                target.setdefault(key, value)
+
+        removed = len(qa) - len(kept)
+        course["qa"] = kept
+        _indexes[_course_key(course)] = index
+    return removed
@@ -0,0 +1,166 @@
+import math
+import heapq
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional
+
+from file_index import tokenize, make_snippet
+
+# ==== Globale zoekindex (vakken, topics, samenvattingen, vragen, notities, projecten) ====
+# Eén omgekeerde index in het geheugen over alles wat de student zelf
+# ingeeft of laat genereren. Documenten zijn dicts:
+#
+#   {"id": "c3:note:0:2", "kind": "note", "title": "...", "text": "...",
+#    "context": "Anatomie I", "endpoint": "course_notes",
+#    "params": {"course_id": 3, "folder": 0, "note": 2}}
+#
+# (endpoint + params i.p.v. een url: de index wordt ook vanuit job-threads
+# bijgewerkt, waar url_for niet werkt.)
+#
+# Documenten zitten in groepen (één groep per vak of project, bv. "course:3").
+# Na een wijziging geeft app.py de nieuwe documenten van die groep door aan
+# update_group(); enkel documenten waarvan titel/tekst echt veranderd is
+# worden opnieuw getokenized. Zoeken kijkt alleen naar de postings van de
+# zoekwoorden (BM25, titelwoorden tellen dubbel).
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_WEIGHT = 2
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.docs: Dict[str, Dict] = {}
+        self._groups: Dict[str, set] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._total_len = 0
+
+    @staticmethod
+    def _fingerprint(doc: Dict) -> str:
+        raw = f"{doc.get('title', '')}\x00{doc.get('text', '')}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    # ---- bijwerken ----
+
+    def _remove_doc(self, doc_id: str):
+        for term in self._doc_terms.pop(doc_id, {}):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+        self._fingerprints.pop(doc_id, None)
+        self.docs.pop(doc_id, None)
+
+    def _add_doc(self, doc: Dict, fingerprint: str):
+        doc_id = doc["id"]
+        counts: Dict[str, int] = {}
+        for tok in tokenize(doc.get("title", "")):
+            counts[tok] = counts.get(tok, 0) + TITLE_WEIGHT
+        for tok in tokenize(doc.get("text", "")):
+            counts[tok] = counts.get(tok, 0) + 1
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+        length = sum(counts.values())
+        self._doc_terms[doc_id] = counts
+        self._doc_len[doc_id] = length
+        self._total_len += length
+        self._fingerprints[doc_id] = fingerprint
+        self.docs[doc_id] = doc
+
+    def update_group(self, group: str, docs: Iterable[Dict]) -> int:
+        """
+        Vervang de documenten van één groep. Retourneert hoeveel documenten
+        (opnieuw) geïndexeerd werden.
+        """
+        changed = 0
+        with self._lock:
+            old_ids = self._groups.get(group, set())
+            new_ids = set()
+            for doc in docs:
+                doc_id = doc["id"]
+                new_ids.add(doc_id)
+                fingerprint = self._fingerprint(doc)
+                if self._fingerprints.get(doc_id) == fingerprint:
+                    # tekst ongewijzigd: alleen context/link bijwerken
+                    self.docs[doc_id] = doc
+                    continue
+                self._remove_doc(doc_id)
+                self._add_doc(doc, fingerprint)
+                changed += 1
+            for doc_id in old_ids - new_ids:
+                self._remove_doc(doc_id)
+            if new_ids:
+                self._groups[group] = new_ids
+            else:
+                self._groups.pop(group, None)
+        return changed
+
+    def remove_groups_from(self, prefix: str, start: int):
+        """
+        Verwijder de groepen "<prefix><n>" met n >= start
+        (bv. na het verwijderen van een vak schuift alles op).
+        """
+        with self._lock:
+            for group in list(self._groups):
+                if group.startswith(prefix) and group[len(prefix):].isdigit() and int(group[len(prefix):]) >= start:
+                    self.update_group(group, [])
+
+    def __len__(self):
+        return len(self.docs)
+
+    # ---- zoeken ----
+
+    def search(self, query: str, page: int = 1, per_page: int = 20, kinds: Optional[set] = None) -> Dict:
+        """
+        Zoek en geef één pagina resultaten terug:
+        {"total", "page", "per_page", "results": [{doc..., "score", "snippet"}]}
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        page = max(1, page)
+        empty = {"total": 0, "page": page, "per_page": per_page, "results": []}
+        if not terms:
+            return empty
+
+        with self._lock:
+            n_docs = len(self.docs)
+            if not n_docs:
+                return empty
+            avg_len = (self._total_len / n_docs) or 1.0
+
+            # BM25 uitgeschreven met lokale variabelen: dit is de hete lus
+            base = BM25_K1 * (1 - BM25_B)
+            per_len = BM25_K1 * BM25_B / avg_len
+            doc_len = self._doc_len
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                boost = idf * (BM25_K1 + 1)
+                get = scores.get
+                for doc_id, tf in postings.items():
+                    scores[doc_id] = get(doc_id, 0.0) + boost * tf / (tf + base + per_len * doc_len[doc_id])
+
+            if kinds:
+                scores = {d: s for d, s in scores.items() if self.docs[d]["kind"] in kinds}
+
+            total = len(scores)
+            top = heapq.nlargest(page * per_page, scores.items(), key=lambda kv: (kv[1], kv[0]))
+            selected = [(self.docs[d], s) for d, s in top[(page - 1) * per_page:]]
+
+        term_set = set(terms)
+        results = []
+        for doc, score in selected:
+            item = dict(doc)
+            item["score"] = round(score, 3)
+            item["snippet"] = make_snippet(doc.get("text", ""), term_set)
+            results.append(item)
+        return {"total": total, "page": page, "per_page": per_page, "results": results}
@@ -0,0 +1,188 @@
+import os
+import json
+import mmap
+import hashlib
+import struct
+import threading
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+# ==== Compacte snapshot van vakken/projecten ====
+# courses_data.json werd bij elke start volledig met json.load ingelezen, en
+# indent=2 maakte het bestand ongeveer dubbel zo groot. De Store schrijft nu
+# een snapshot-bestand (.snap) met een vaste index vooraan:
+#
+#   header   "<8sII"   magic, formaatversie, aantal records
+#   index    per record "<QII32s": offset, lengte, _version, _uid
+#   data     elk record als compacte JSON (utf-8), na elkaar
+#
+# De index heeft vaste breedte, dus record i opzoeken is één struct.unpack op
+# de gemapte file (mmap) en alleen dat ene record wordt gedecodeerd. Zo kan
+# de gedeelde modus van store.py aan uid/versie zien welke records veranderd
+# zijn zonder de rest te decoderen, en records die hij niet aanraakt als ruwe
+# bytes overnemen bij het wegschrijven.
+#
+# Bij het opstarten wordt elk record één keer gedecodeerd (de app werkt met
+# dicts); load_indexed() geeft daarbij de vingerafdruk van de ruwe bytes mee,
+# zodat de Store een record dat sindsdien niet veranderde niet opnieuw hoeft
+# te coderen om dat te weten (digest(encode(record)) == digest(ruwe bytes)).
+#
+# JSON blijft het formaat voor export/backup (zie app.py, /backup/...json).
+
+MAGIC = b"STUDYSNP"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sII")
+ENTRY = struct.Struct("<QII32s")
+
+
+class SnapshotError(ValueError):
+    """Bestand is geen (geldige) snapshot."""
+
+
+class RawRecord(NamedTuple):
+    """Record zoals het in de snapshot staat (nog niet gedecodeerd)."""
+    uid: str
+    version: int
+    data: bytes
+
+
+def encode(record: dict) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def digest(data: bytes) -> str:
+    """Vingerafdruk van een gecodeerd record."""
+    return hashlib.sha1(data).hexdigest()
+
+
+def write(path: str, records: Iterable, meta: Callable[[dict], Tuple[str, int]]):
+    """
+    Schrijf records (dicts of RawRecords) atomisch naar `path`.
+    meta(record) geeft (uid, versie) voor de index ("" / 0 als er geen is).
+    """
+    entries = []
+    blobs = []
+    for record in records:
+        if isinstance(record, RawRecord):
+            uid, version, data = record
+        else:
+            uid, version = meta(record)
+            data = encode(record)
+        entries.append((uid or "", version or 0, data))
+        blobs.append(data)
+
+    offset = HEADER.size + ENTRY.size * len(entries)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(entries)))
+        for uid, version, data in entries:
+            f.write(ENTRY.pack(offset, len(data), version, uid.encode("ascii")))
+            offset += len(data)
+        for data in blobs:
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+class Snapshot:
+    """
+    Leest een snapshot via mmap; records worden pas gedecodeerd als je ze
+    opvraagt. Gebruik als context manager (of close()).
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        try:
+            try:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # leeg bestand
+                raise SnapshotError(f"{path}: leeg bestand")
+            if len(self._map) < HEADER.size:
+                raise SnapshotError(f"{path}: te kort")
+            magic, fmt, count = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or fmt != FORMAT_VERSION:
+                raise SnapshotError(f"{path}: geen snapshot (formaat {fmt})")
+            if HEADER.size + ENTRY.size * count > len(self._map):
+                raise SnapshotError(f"{path}: index onvolledig")
+        except Exception:
+            self.close()
+            raise
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def _entry(self, index: int) -> Tuple[int, int, int, str]:
+        if not (0 <= index < self._count):
+            raise IndexError(index)
+        offset, length, version, uid = ENTRY.unpack_from(self._map, HEADER.size + ENTRY.size * index)
+        if offset + length > len(self._map):
+            raise SnapshotError(f"record {index} valt buiten het bestand")
+        return offset, length, version, uid.rstrip(b"\0").decode("ascii")
+
+    def entries(self) -> List[Tuple[str, int]]:
+        """(uid, versie) van elk record, zonder iets te decoderen."""
+        result = []
+        for i in range(self._count):
+            _, _, version, uid = self._entry(i)
+            result.append((uid, version))
+        return result
+
+    def raw(self, index: int) -> RawRecord:
+        offset, length, version, uid = self._entry(index)
+        return RawRecord(uid, version, self._map[offset:offset + length])
+
+    def record(self, index: int) -> dict:
+        offset, length, _, _ = self._entry(index)
+        return json.loads(self._map[offset:offset + length])
+
+    def records(self) -> List[dict]:
+        return [self.record(i) for i in range(self._count)]
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_snapshot(path: str) -> Optional[Snapshot]:
+    """Snapshot openen, of None als het bestand ontbreekt of onleesbaar is."""
+    try:
+        return Snapshot(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Snapshot {os.path.basename(path)} niet leesbaar: {e}")
+        return None
+
+
+def load_indexed(path: str) -> Optional[Tuple[List[dict], List[str]]]:
+    """
+    Alle records van een snapshot + de digest() van elk record zoals het op
+    schijf staat, of None (dan valt de app terug op JSON).
+    """
+    snap = open_snapshot(path)
+    if snap is None:
+        return None
+    with snap:
+        try:
+            records, digests = [], []
+            for i in range(len(snap)):
+                data = snap.raw(i).data
+                records.append(json.loads(data))
+                digests.append(digest(data))
+            return records, digests
+        except ValueError as e:
+            print(f"Snapshot {os.path.basename(path)} niet leesbaar: {e}")
+            return None
+
+
+def load(path: str) -> Optional[List[dict]]:
+    """Alle records van een snapshot, of None (dan valt de app terug op JSON)."""
+    loaded = load_indexed(path)
+    return loaded[0] if loaded is not None else None
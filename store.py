@@ -0,0 +1,545 @@
+import os
+import copy
+import json
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows: geen flock, dus ook geen gedeelde modus
+    fcntl = None
+
+# ==== Thread-veilige opslag voor vakken en projecten ====
+# courses_data/projects_data blijven gewone lijsten met dicts (alle routes en
+# templates werken daar rechtstreeks mee), maar elke toegang vanuit een
+# request of een job loopt nu via een Store:
+#
+#   store.structure          RWLock over de lijst zelf (toevoegen/verwijderen;
+#                            indexen schuiven dan op)
+#   store.lock_for(item)     RWLock per vak/project (op identiteit van de dict,
+#                            dus een index die opschuift maakt niet uit)
+#
+# Volgorde is altijd: eerst structure (lezen of schrijven), dan één item.
+# Een request houdt nooit locks van twee verschillende items vast.
+# Onder een leeslock wordt een item nooit gewijzigd: afgeleide velden
+# (countdown, voortgang) komen in een kopie voor de weergave, en een
+# achtergrondjob werkt op copy_of(item) i.p.v. op het item zelf.
+#
+# Opslaan (save) maakt per item een kopie onder diens leeslock en schrijft
+# daarna buiten alle locks, atomisch (tmp-bestand + os.replace) als snapshot
+# (compact, met index per record; zie snapshot.py). Wordt save()
+# opgeroepen terwijl deze thread nog locks van de store vasthoudt, dan wordt
+# het opslaan uitgesteld tot de buitenste lock vrijgegeven is; zo wacht een
+# schrijver nooit op de leeslock van een ander vak (geen deadlocks).
+#
+# Dirty tracking: per record wordt een vingerafdruk van de laatst
+# weggeschreven inhoud bijgehouden (zonder de afgeleide velden uit
+# volatile_keys). Is er sinds de vorige keer niets veranderd, dan schrijft
+# save() niets weg; een GET die toevallig save() oproept kost dus geen
+# schrijfbeurt meer. De vingerafdruk is de digest van de snapshot-codering,
+# dus bij het starten komt hij rechtstreeks uit de ruwe bytes (digests=).
+#
+# ---- Gedeelde modus (meerdere processen) ----
+# Met shared=True mogen meerdere worker-processen (bv. gunicorn) hetzelfde
+# bestand gebruiken:
+#   - elk record krijgt een vaste "_uid" en een "_version";
+#   - opslaan gebeurt onder een exclusieve flock op <bestand>.lock: het
+#     bestand wordt opnieuw gelezen en enkel de records die dit proces
+#     gewijzigd/toegevoegd/verwijderd heeft worden erin verwerkt
+#     (optimistic concurrency: was de versie op schijf intussen hoger,
+#     dan wint de schijf en krijgt de aanroeper een ConflictError);
+#   - refresh() (begin van elke request) ziet aan mtime/grootte/inode dat
+#     een ander proces geschreven heeft en laadt dan opnieuw in, in place
+#     (dezelfde dict-objecten blijven bestaan voor lopende jobs).
+#   Dankzij de index in de snapshot worden daarbij alleen records met een
+#   andere uid/versie gedecodeerd, en bij het opslaan worden records van
+#   anderen als ruwe bytes overgenomen.
+
+UID_KEY = "_uid"
+VERSION_KEY = "_version"
+
+
+class ConflictError(Exception):
+    """Een ander proces heeft hetzelfde record intussen gewijzigd."""
+
+    def __init__(self, names: List[str]):
+        super().__init__("Intussen gewijzigd door een ander proces: " + ", ".join(names))
+        self.names = names
+
+
+class RWLock:
+    """
+    Readers-writer lock: veel lezers tegelijk óf één schrijver.
+    Herintreedbaar binnen dezelfde thread (ook lezen terwijl je schrijft);
+    een wachtende schrijver krijgt voorrang op nieuwe lezers.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers: Dict[int, int] = {}
+        self._writer: Optional[int] = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me or me in self._readers:
+                self._readers[me] = self._readers.get(me, 0) + 1
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers[me] = 1
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            count = self._readers[me] - 1
+            if count:
+                self._readers[me] = count
+            else:
+                del self._readers[me]
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError("Leeslock kan niet omgezet worden naar een schrijflock.")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        with self._cond:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class Store:
+    def __init__(
+        self,
+        path: str,
+        items: List[dict],
+        shared: bool = False,
+        volatile_keys: Iterable[str] = (),
+        on_reload: Optional[Callable[[], None]] = None,
+        prepare: Optional[Callable[[dict], object]] = None,
+        digests: Optional[List[str]] = None,
+    ):
+        """
+        volatile_keys: afgeleide velden die routes zelf (her)berekenen; die
+        tellen niet mee om te bepalen of een record gewijzigd is.
+        digests: vingerafdrukken van `items` zoals ze uit de snapshot op
+        `path` kwamen (snapshot.load_indexed); dan hoeft de store bij het
+        starten niet elk record opnieuw te coderen.
+        on_reload: wordt opgeroepen nadat wijzigingen van een ander proces
+        ingeladen zijn (bv. om een zoekindex bij te werken).
+        prepare: wordt op elk record van schijf toegepast vóór het in de lijst
+        komt (bv. schema rechtzetten).
+        """
+        self.path = path
+        self.items = items
+        self.structure = RWLock()
+        self._locks: Dict[int, RWLock] = {}
+        self._locks_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # per thread: hoe diep in locks van deze store + uitgesteld opslaan
+        self._local = threading.local()
+
+        if shared and fcntl is None:
+            print("Gedeelde opslag niet mogelijk zonder fcntl; verder in één-proces-modus.")
+        self.shared = shared and fcntl is not None
+        self.volatile_keys = set(volatile_keys)
+        self.on_reload = on_reload
+        self.prepare = prepare
+        # uid -> (versie, vingerafdruk) zoals laatst gelezen/geschreven
+        self._base: Dict[str, Tuple[int, str]] = {}
+        self._disk_stamp = None
+        # één-proces-modus: [(id(item), vingerafdruk)] zoals laatst weggeschreven
+        self._saved: Optional[List[Tuple[int, str]]] = None
+        if digests is not None and len(digests) != len(items):
+            digests = None
+        if self.shared:
+            self._init_shared(digests)
+        elif digests is not None:
+            self._saved = [(id(item), d) for item, d in zip(items, digests)]
+        elif os.path.exists(path):
+            self._saved = [(id(item), self._fingerprint(item)) for item in items]
+
+    def lock_for(self, item: dict) -> RWLock:
+        with self._locks_lock:
+            lock = self._locks.get(id(item))
+            if lock is None:
+                lock = self._locks[id(item)] = RWLock()
+            return lock
+
+    def index_of(self, item: dict) -> Optional[int]:
+        """Huidige index van dit item (identiteit), of None als het verwijderd is."""
+        for i, other in enumerate(self.items):
+            if other is item:
+                return i
+        return None
+
+    def uid_of(self, item: dict) -> str:
+        """Vaste id van dit item (blijft gelijk als andere items verwijderd worden)."""
+        return item.setdefault(UID_KEY, uuid.uuid4().hex)
+
+    def index_of_uid(self, uid: str) -> Optional[int]:
+        """Huidige index van het item met deze uid, of None als het verwijderd is."""
+        for i, other in enumerate(self.items):
+            if other.get(UID_KEY) == uid:
+                return i
+        return None
+
+    # ---- locks nemen ----
+
+    def _enter(self):
+        self._local.depth = getattr(self._local, "depth", 0) + 1
+
+    def _exit(self):
+        self._local.depth -= 1
+        if not self._local.depth and getattr(self._local, "pending_save", False):
+            self._local.pending_save = False
+            self.save()
+
+    @contextmanager
+    def reading(self, item: Optional[dict] = None):
+        """Leeslock op de lijst, en op `item` als dat gegeven is."""
+        self._enter()
+        try:
+            with self.structure.read():
+                if item is None:
+                    yield
+                else:
+                    with self.lock_for(item).read():
+                        yield
+        finally:
+            self._exit()
+
+    @contextmanager
+    def writing(self, item: Optional[dict] = None):
+        """
+        Schrijflock op `item` (en een leeslock op de lijst), of zonder item:
+        schrijflock op de lijst zelf (toevoegen/verwijderen).
+        """
+        self._enter()
+        try:
+            if item is None:
+                with self.structure.write():
+                    yield
+                    self._drop_stale_locks()
+            else:
+                with self.structure.read(), self.lock_for(item).write():
+                    yield
+        finally:
+            self._exit()
+
+    @contextmanager
+    def at(self, index: int, write: bool = False):
+        """
+        Lock op het item op positie `index` (de index wordt opgezocht onder de
+        leeslock op de lijst, dus kan niet intussen opgeschoven zijn).
+        Bestaat de index niet, dan blijft het bij de leeslock op de lijst.
+        """
+        self._enter()
+        try:
+            with self.structure.read():
+                item = self.items[index] if 0 <= index < len(self.items) else None
+                if item is None:
+                    yield
+                else:
+                    lock = self.lock_for(item)
+                    with (lock.write() if write else lock.read()):
+                        yield
+        finally:
+            self._exit()
+
+    def copy_of(self, item: dict) -> dict:
+        """Diepe kopie van één item onder zijn leeslock (bv. invoer voor een job)."""
+        with self.structure.read(), self.lock_for(item).read():
+            return copy.deepcopy(item)
+
+    def _drop_stale_locks(self):
+        """Locks van verwijderde items vergeten (alleen onder de structure-schrijflock)."""
+        alive = {id(item) for item in self.items}
+        with self._locks_lock:
+            for key in [k for k in self._locks if k not in alive]:
+                del self._locks[key]
+
+    # ---- opslaan ----
+
+    def snapshot(self) -> List[dict]:
+        """Consistente kopie: elk item gekopieerd onder zijn eigen leeslock."""
+        return self._snapshot()[1]
+
+    def _snapshot(self) -> Tuple[List[dict], List[dict]]:
+        with self.structure.read():
+            items = list(self.items)
+            copies = []
+            for item in items:
+                with self.lock_for(item).read():
+                    copies.append(copy.deepcopy(item))
+        return items, copies
+
+    def save(self) -> bool:
+        """Wegschrijven als er iets veranderd is; True als er geschreven werd."""
+        if getattr(self._local, "depth", 0):
+            self._local.pending_save = True
+            return False
+
+        items, data = self._snapshot()
+        if self.shared:
+            return self._save_shared(items, data)
+
+        state = [(id(item), self._fingerprint(record)) for item, record in zip(items, data)]
+        with self._save_lock:
+            if state == self._saved:
+                return False
+            self._write(data)
+            self._saved = state
+        return True
+
+    def _write(self, data: List):
+        snapshot.write(self.path, data, lambda r: (r.get(UID_KEY), r.get(VERSION_KEY)))
+
+    def export_json(self, data: Optional[List[dict]] = None) -> str:
+        """Leesbare JSON van alle records (backup); standaard een snapshot()."""
+        return json.dumps(self.snapshot() if data is None else data, ensure_ascii=False, indent=2)
+
+    # ---- gedeelde modus ----
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self.path + ".lock", "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _fingerprint(self, record: dict) -> str:
+        # zelfde codering als in de snapshot: een record dat niet veranderde
+        # heeft de digest van zijn ruwe bytes (zie snapshot.load_indexed)
+        if any(key in record for key in self.volatile_keys):
+            record = {k: v for k, v in record.items() if k not in self.volatile_keys}
+        return snapshot.digest(snapshot.encode(record))
+
+    def _remember(self, records: List[dict]):
+        self._base = {r[UID_KEY]: (r.get(VERSION_KEY, 0), self._fingerprint(r)) for r in records}
+
+    def _init_shared(self, digests: Optional[List[str]]):
+        """
+        Eén keer bij het starten: elk record een uid/versie geven (op schijf).
+        Komen de items uit precies de snapshot die er nu staat (zelfde
+        uid/versie in de index), dan wordt er niets opnieuw gedecodeerd.
+        """
+        with self._save_lock, self._file_lock():
+            snap = snapshot.open_snapshot(self.path)
+            on_disk = None
+            if snap is not None:
+                with snap:
+                    try:
+                        on_disk = snap.entries()
+                    except ValueError:
+                        pass
+            loaded = [(item.get(UID_KEY) or "", item.get(VERSION_KEY) or 0) for item in self.items]
+            if on_disk is not None and (digests is None or on_disk != loaded):
+                # intussen door een ander proces herschreven: opnieuw inlezen
+                disk = snapshot.load_indexed(self.path)
+                if disk is not None:
+                    self.items[:], digests = disk
+                else:
+                    on_disk = digests = None
+            elif on_disk is None:
+                digests = None
+
+            missing = False
+            for item in self.items:
+                if UID_KEY not in item:
+                    item[UID_KEY] = uuid.uuid4().hex
+                    missing = True
+                item.setdefault(VERSION_KEY, 1)
+            if missing or on_disk is None:
+                self._write(self.items)
+                self._remember(self.items)
+            else:
+                self._base = {
+                    item[UID_KEY]: (item[VERSION_KEY], d) for item, d in zip(self.items, digests)
+                }
+            self._disk_stamp = self._stamp()
+
+    def refresh(self):
+        """Wijzigingen van andere processen inladen (goedkoop als er niets veranderd is)."""
+        if not self.shared or self._stamp() == self._disk_stamp:
+            return
+        with self.structure.write():
+            stamp = self._stamp()
+            if stamp == self._disk_stamp:
+                return
+            snap = snapshot.open_snapshot(self.path)
+            if snap is None:
+                return
+            with snap:
+                self._load_records(snap)
+            self._disk_stamp = stamp
+        if self.on_reload is not None:
+            self.on_reload()
+
+    def _load_records(self, snap: "snapshot.Snapshot"):
+        """
+        Lijst vervangen door de versie op schijf (onder de structure-schrijflock).
+        Alleen records met een andere versie dan in het geheugen worden gedecodeerd.
+        """
+        local = {item.get(UID_KEY): item for item in self.items}
+        merged = []
+        base: Dict[str, Tuple[int, str]] = {}
+        for i, (uid, version) in enumerate(snap.entries()):
+            item = local.get(uid)
+            known = self._base.get(uid)
+            if item is not None and item.get(VERSION_KEY) == version and known and known[0] == version:
+                merged.append(item)
+                base[uid] = known
+                continue
+            record = snap.record(i)
+            if item is None:
+                item = record
+            else:
+                item.clear()
+                item.update(record)
+            if self.prepare is not None:
+                self.prepare(item)
+            merged.append(item)
+            # vingerafdruk van het record zoals het na prepare() is
+            base[uid] = (version, self._fingerprint(item))
+        self.items[:] = merged
+        self._base = base
+        self._drop_stale_locks()
+
+    def _save_shared(self, items: List[dict], data: List[dict]) -> bool:
+        # self._base = toestand van de records in het geheugen bij het laatste
+        # inladen/wegschrijven; alleen wat daarvan afwijkt is door ons gewijzigd
+        uids = [r.get(UID_KEY) for r in data]
+        if set(uids) == set(self._base) and all(
+            self._fingerprint(r) == self._base[r[UID_KEY]][1] for r in data
+        ):
+            return False
+
+        with self._save_lock, self._file_lock():
+            snap = snapshot.open_snapshot(self.path)
+            try:
+                return self._merge_shared(items, data, snap)
+            finally:
+                if snap is not None:
+                    snap.close()
+
+    def _merge_shared(self, items: List[dict], data: List[dict], snap: Optional["snapshot.Snapshot"]) -> bool:
+        """Onder de file-lock: onze wijzigingen verwerken in de snapshot op schijf."""
+        entries = snap.entries() if snap is not None else []
+        disk_version = dict(entries)
+        local_uids = set()
+        changed: Dict[str, dict] = {}
+        added: List[dict] = []
+        conflicts: List[str] = []
+
+        for record in data:
+            uid = record.setdefault(UID_KEY, uuid.uuid4().hex)
+            local_uids.add(uid)
+            base = self._base.get(uid)
+            if base is None:
+                record[VERSION_KEY] = 1
+                added.append(record)
+                continue
+            if self._fingerprint(record) == base[1]:
+                continue
+            if disk_version.get(uid) != base[0]:
+                conflicts.append(record.get("name") or record.get("title") or uid)
+                continue
+            record[VERSION_KEY] = base[0] + 1
+            changed[uid] = record
+
+        deleted = set()
+        for i, (uid, on_disk) in enumerate(entries):
+            if uid in local_uids or uid not in self._base:
+                continue
+            if on_disk != self._base[uid][0]:
+                # enkel hier het record zelf decoderen (voor de naam)
+                record = snap.record(i)
+                conflicts.append(record.get("name") or record.get("title") or uid)
+                continue
+            deleted.add(uid)
+
+        # heeft een ander proces intussen iets geschreven dat wij nog niet hebben?
+        remote_changes = conflicts or any(
+            uid not in changed and self._base.get(uid, (None,))[0] != version
+            for uid, version in entries
+        ) or any(uid not in disk_version and uid not in deleted for uid in self._base)
+
+        # records die we niet aangeraakt hebben: ruwe bytes uit de snapshot
+        merged = [
+            changed.get(uid) or snap.raw(i)
+            for i, (uid, _) in enumerate(entries) if uid not in deleted
+        ]
+        merged.extend(added)
+        self._write(merged)
+
+        for record in list(changed.values()) + added:
+            uid = record[UID_KEY]
+            self._base[uid] = (record[VERSION_KEY], self._fingerprint(record))
+        for uid in deleted:
+            self._base.pop(uid, None)
+
+        # de nieuwe uid/versie ook op de records in het geheugen zetten
+        # (onder de schrijflock van het item: een nieuw item krijgt hier zijn
+        # eerste uid, en een snapshot() in een andere thread kopieert het
+        # misschien net; save() loopt nooit terwijl deze thread locks houdt)
+        written = set(changed) | {r[UID_KEY] for r in added}
+        for item, record in zip(items, data):
+            if record[UID_KEY] in written:
+                with self.lock_for(item).write():
+                    item[UID_KEY] = record[UID_KEY]
+                    item[VERSION_KEY] = record[VERSION_KEY]
+
+        # niet in sync: de volgende refresh() laadt het bestand opnieuw in
+        self._disk_stamp = None if remote_changes else self._stamp()
+
+        if conflicts:
+            raise ConflictError(conflicts)
+        return True
@@ -0,0 +1,78 @@
+import os
+import time
+
+import blobstore
+
+
+def _blob(upload_folder, name, age=0.0):
+    folder = blobstore.blob_dir(upload_folder)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4 test")
+    if age:
+        old = time.time() - age
+        os.utime(path, (old, old))
+    return path
+
+
+def _course(files):
+    return {"files": list(files), "file_blobs": dict(files)}
+
+
+def test_gc_removes_old_unreferenced_blob(tmp_path):
+    upload = str(tmp_path)
+    path = _blob(upload, "aaa.pdf", age=blobstore.GC_MIN_AGE + 60)
+    removed = blobstore.collect_garbage(upload, [])
+    assert removed == ["aaa.pdf"]
+    assert not os.path.exists(path)
+
+
+def test_gc_keeps_referenced_blob(tmp_path):
+    upload = str(tmp_path)
+    path = _blob(upload, "aaa.pdf", age=blobstore.GC_MIN_AGE + 60)
+    courses = [_course({"les1.pdf": "aaa.pdf"})]
+    assert blobstore.collect_garbage(upload, courses) == []
+    assert os.path.exists(path)
+
+
+def test_gc_keeps_fresh_unreferenced_blob(tmp_path):
+    # net geüpload, nog niet geregistreerd bij een vak
+    upload = str(tmp_path)
+    path = _blob(upload, "bbb.pdf")
+    assert blobstore.collect_garbage(upload, []) == []
+    assert os.path.exists(path)
+
+
+def test_gc_skips_incoming_files(tmp_path):
+    upload = str(tmp_path)
+    path = _blob(upload, blobstore.INCOMING_PREFIX + "x", age=blobstore.GC_MIN_AGE + 60)
+    assert blobstore.collect_garbage(upload, []) == []
+    assert os.path.exists(path)
+
+
+def test_put_file_refreshes_existing_blob(tmp_path):
+    upload = str(tmp_path)
+    sha = "c" * 64
+    target = _blob(upload, sha + ".pdf", age=blobstore.GC_MIN_AGE + 60)
+    src = tmp_path / "upload.tmp"
+    src.write_bytes(b"%PDF-1.4 test")
+
+    blob = blobstore.put_file(upload, str(src), "Les 1.PDF", sha=sha)
+
+    assert blob == sha + ".pdf"
+    assert not src.exists()
+    assert blobstore.collect_garbage(upload, []) == []
+    assert os.path.exists(target)
+
+
+def test_gc_dropped_legacy_only_when_unused(tmp_path):
+    upload = str(tmp_path)
+    for name in ("course0_a.pdf", "course1_b.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4 oud")
+    courses = [{"files": ["course1_b.pdf"]}]
+
+    removed = blobstore.collect_garbage(upload, courses, dropped_legacy=["course0_a.pdf", "course1_b.pdf"])
+
+    assert removed == ["course0_a.pdf"]
+    assert (tmp_path / "course1_b.pdf").exists()
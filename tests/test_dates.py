@@ -0,0 +1,35 @@
+from datetime import date
+
+import dates
+
+TODAY = date(2026, 10, 19)
+
+
+def test_parse_iso_and_numeric_formats():
+    assert dates.parse_date("2026-01-25") == date(2026, 1, 25)
+    assert dates.parse_date("25/01/2026") == date(2026, 1, 25)
+    assert dates.parse_date("25.01.2026") == date(2026, 1, 25)
+
+
+def test_parse_month_names():
+    assert dates.parse_date("2 februari 2027") == date(2027, 2, 2)
+    assert dates.parse_date("March 3, 2027") == date(2027, 3, 3)
+
+
+def test_yearless_date_goes_to_next_year_when_long_past():
+    assert dates.parse_date("25 jan", today=TODAY) == date(2027, 1, 25)
+    # net voorbij: blijft dit jaar
+    assert dates.parse_date("1 okt", today=TODAY) == date(2026, 10, 1)
+
+
+def test_unreadable_values():
+    assert dates.parse_date("volgende week") is None
+    assert dates.parse_date("31 feb 2026") is None
+    assert dates.to_iso("") is None
+    assert dates.days_until(None) is None
+
+
+def test_days_until_is_relative_to_today():
+    today = date.today()
+    assert dates.days_until(today.isoformat()) == 0
+    assert dates.days_until("geen datum") is None
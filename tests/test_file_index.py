@@ -0,0 +1,36 @@
+import file_index
+import pdf_text
+
+
+def _file(tmp_path, name, data=b"inhoud"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_snippets_come_from_the_indexed_page(tmp_path, monkeypatch):
+    path = _file(tmp_path, "slides.pdf")
+    sha = pdf_text.content_hash(path)
+    file_index.build_index(path, sha, ["Inleiding tot de cel.", "De mitochondriën   leveren\nenergie.", "Café"])
+
+    # de tekst-cache wordt bij het zoeken niet meer gelezen
+    monkeypatch.setattr(pdf_text, "load_cached_pages", lambda *a: 1 / 0)
+    results = file_index.search([("slides.pdf", path)], "mitochondrien")
+    assert [(r["file"], r["page"]) for r in results] == [("slides.pdf", 2)]
+    assert "".join(text for text, _ in results[0]["snippet"]) == "De mitochondriën leveren energie."
+    assert [text for text, hit in results[0]["snippet"] if hit] == ["mitochondriën"]
+    assert file_index.page_text(path, sha, file_index.load_index(path, sha), 3) == "Café"
+
+
+def test_files_without_index_are_skipped_not_extracted(tmp_path):
+    indexed = _file(tmp_path, "a.pdf", b"a")
+    file_index.build_index(indexed, pdf_text.content_hash(indexed), ["fotosynthese in bladeren"])
+    missing = _file(tmp_path, "b.pdf", b"b")
+
+    results = file_index.search([("a.pdf", indexed), ("b.pdf", missing)], "fotosynthese")
+    assert [r["file"] for r in results] == ["a.pdf"]
+
+    # wel in de tekst-cache: index wordt daaruit gebouwd
+    pdf_text.save_cached_pages(missing, pdf_text.content_hash(missing), ["fotosynthese"])
+    results = file_index.search([("a.pdf", indexed), ("b.pdf", missing)], "fotosynthese")
+    assert sorted(r["file"] for r in results) == ["a.pdf", "b.pdf"]
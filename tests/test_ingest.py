@@ -0,0 +1,49 @@
+import os
+
+os.environ.setdefault("STUDYOS_AI_BACKEND", "fake")
+
+import ai_utils  # noqa: E402
+import ingest  # noqa: E402
+
+
+def _pages():
+    return [f"Pagina {i}\n" + "tekst over onderwerp %d. " % i * 40 for i in range(1, 9)]
+
+
+def test_partial_run_only_retries_failed_chunks(monkeypatch):
+    real_map = ai_utils._map_pdf_chunk
+    calls = []
+    broken = {1}
+
+    def flaky_map(course_name, chunk):
+        calls.append(chunk["page_start"])
+        if chunk["page_start"] in broken:
+            return None
+        return real_map(course_name, chunk)
+
+    monkeypatch.setattr(ai_utils, "PDF_CHUNK_CHARS", 2500)
+    monkeypatch.setattr(ai_utils, "_map_pdf_chunk", flaky_map)
+    course = {"files": ["slides.pdf"]}
+
+    done = ingest.partial_results(course, "slides.pdf", "abc", ingest.STEP_STRUCTURE)
+    *_, error, failed = ai_utils.generate_structured_data_from_pages("Vak", [("slides.pdf", _pages())], done=done)
+    assert error is None and failed == [0]
+    assert len(calls) > 2
+    ingest.record_failed_chunks(course, "slides.pdf", "abc", ingest.STEP_STRUCTURE, failed, done=done)
+    assert ingest.pending_files(course, ["slides.pdf"], {"slides.pdf": __file__}, ingest.STEP_STRUCTURE)
+
+    calls.clear()
+    broken.clear()
+    done = ingest.partial_results(course, "slides.pdf", "abc", ingest.STEP_STRUCTURE)
+    *_, error, failed = ai_utils.generate_structured_data_from_pages("Vak", [("slides.pdf", _pages())], done=done)
+    assert error is None and failed == []
+    assert calls == [1]
+
+    # andere inhoud: niets hergebruiken
+    assert ingest.partial_results(course, "slides.pdf", "def", ingest.STEP_STRUCTURE) == {}
+
+
+def test_map_chunk_reply_that_is_not_an_object_counts_as_failed(monkeypatch):
+    monkeypatch.setattr(ai_utils, "_call_ai", lambda kind, prompt: "[1, 2, 3]")
+    chunk = {"text": "tekst", "page_start": 1, "page_end": 2, "source": "slides.pdf"}
+    assert ai_utils._map_pdf_chunk("Vak", chunk) is None
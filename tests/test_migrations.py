@@ -0,0 +1,125 @@
+import copy
+import json
+from datetime import date
+
+import pytest
+
+import migrations
+import textstore
+
+LATEST = migrations.latest("course")
+
+
+@pytest.fixture(autouse=True)
+def text_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(textstore, "_folder", None)
+    textstore.configure(str(tmp_path / "text_store"))
+
+
+def _old_course():
+    """Vak zoals in een oud courses_data.json (geen _schema, alles inline)."""
+    return {
+        "name": "Anatomie",
+        "exam_date": "25/01/2027",
+        "qa": [
+            {"question": "Wat is een neuron?", "answer": "", "correct": "2", "wrong": 0},
+            {"question": "   "},
+        ],
+        "notes": {"folders": [{"name": "Map", "notes": [{"title": "Les 1", "content": "Spieren"}]}]},
+        "ai_chat_history": [{"role": "user", "content": "Hallo"}],
+        "progress_pct": 40,
+        "risk_status": "Examen alarm",
+    }
+
+
+def _normalize(course):
+    """Zoals app.normalize_course (bij het laden van een record)."""
+    migrations.migrate(course, "course")
+    textstore.externalize_chat(course)
+    textstore.externalize_notes(course)
+    return course
+
+
+def _note(course):
+    return course["notes"]["folders"][0]["notes"][0]
+
+
+def test_old_course_reaches_latest_schema():
+    course = _normalize(_old_course())
+
+    assert course[migrations.SCHEMA_KEY] == LATEST
+    # v1: types en ongeldige vragen
+    assert course["qa"] == [{"question": "Wat is een neuron?", "answer": "—", "correct": 2}]
+    # v2: inhoud naar textstore
+    assert "ai_chat_history" not in course
+    assert textstore.load_chat(course) == [{"role": "user", "content": "Hallo"}]
+    assert "content" not in dict(_note(course))
+    assert _note(course)["content"] == "Spieren"
+    # v3: ISO-datum
+    assert course["exam_date"] == "2027-01-25"
+    # v4: geen afgeleide velden meer in het record
+    assert "progress_pct" not in course and "risk_status" not in course
+
+
+def test_unreadable_exam_date_is_kept_apart():
+    course = _old_course()
+    course["exam_date"] = "ergens in juni"
+    migrations.migrate(course, "course")
+    assert course["exam_date"] == ""
+    assert course["exam_date_raw"] == "ergens in juni"
+
+
+def test_yearless_exam_date_gets_a_year():
+    course = _old_course()
+    course["exam_date"] = "25 jan"
+    migrations.migrate(course, "course")
+    parsed = date.fromisoformat(course["exam_date"])
+    assert (parsed.month, parsed.day) == (1, 25)
+
+
+def test_latest_record_is_left_alone():
+    course = _normalize(_old_course())
+    before = copy.deepcopy(course)
+    assert migrations.migrate(course, "course") is False
+    assert course == before
+
+
+def test_duplicate_migration_version_is_rejected():
+    with pytest.raises(ValueError):
+        migrations.migration("course", 1)(lambda record: None)
+
+
+def test_project_deadline_and_derived_fields():
+    project = {"title": "Thesis", "deadline": "3 maart 2027", "progress_pct": "120", "status": "Opstart"}
+    assert migrations.migrate(project, "project") is True
+    assert project["deadline"] == "2027-03-03"
+    assert project["progress_pct"] == 100
+    assert "status" not in project
+
+
+def test_backup_round_trip_keeps_notes_and_chat():
+    course = _normalize(_old_course())
+
+    # /backup/courses.json: inline_course op een kopie, als JSON
+    exported = json.loads(json.dumps([textstore.inline_course(copy.deepcopy(course))]))
+    assert migrations.SCHEMA_KEY not in exported[0]
+    assert exported[0]["ai_chat_history"] == [{"role": "user", "content": "Hallo"}]
+    assert exported[0]["notes"]["folders"][0]["notes"][0]["content"] == "Spieren"
+
+    # terugzetten: het JSON-bestand wordt opnieuw ingeladen en rechtgezet
+    restored = _normalize(exported[0])
+    assert restored[migrations.SCHEMA_KEY] == LATEST
+    assert "ai_chat_history" not in restored
+    assert textstore.load_chat(restored) == [{"role": "user", "content": "Hallo"}]
+    assert _note(restored)["content"] == "Spieren"
+    assert restored["exam_date"] == course["exam_date"]
+    assert restored["qa"] == course["qa"]
+
+
+def test_leftover_chat_is_externalized_even_at_latest_schema():
+    # bv. een backup van vóór deze fix, die nog _schema meedroeg
+    course = _normalize(_old_course())
+    course["ai_chat_history"] = [{"role": "assistant", "content": "Dag"}]
+    _normalize(course)
+    assert "ai_chat_history" not in course
+    assert textstore.load_chat(course) == [{"role": "assistant", "content": "Dag"}]
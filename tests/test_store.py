@@ -0,0 +1,204 @@
+import threading
+
+import pytest
+
+import snapshot
+import store
+
+
+def _store(tmp_path, items, **kwargs):
+    return store.Store(str(tmp_path / "data.snap"), items, **kwargs)
+
+
+def test_rwlock_readers_share_writer_waits():
+    lock = store.RWLock()
+    readers_in = threading.Barrier(3)
+    release = threading.Event()
+    wrote = threading.Event()
+
+    def reader():
+        with lock.read():
+            readers_in.wait(timeout=2)
+            release.wait(timeout=2)
+
+    def writer():
+        with lock.write():
+            wrote.set()
+
+    threads = [threading.Thread(target=reader) for _ in range(2)]
+    for t in threads:
+        t.start()
+    readers_in.wait(timeout=2)  # beide lezers tegelijk binnen
+
+    w = threading.Thread(target=writer)
+    w.start()
+    assert not wrote.wait(timeout=0.1)
+    release.set()
+    assert wrote.wait(timeout=2)
+    for t in threads + [w]:
+        t.join()
+
+
+def test_rwlock_read_inside_write_but_no_upgrade():
+    lock = store.RWLock()
+    with lock.write():
+        with lock.read():
+            pass
+    with lock.read():
+        with pytest.raises(RuntimeError):
+            lock.acquire_write()
+
+
+def test_save_is_deferred_while_locks_are_held(tmp_path):
+    items = [{"name": "A"}]
+    s = _store(tmp_path, items)
+    with s.writing(items[0]):
+        items[0]["name"] = "B"
+        assert s.save() is False
+        assert snapshot.load(s.path) is None
+    assert snapshot.load(s.path) == [{"name": "B"}]
+    # niets meer veranderd: niets meer schrijven
+    assert s.save() is False
+
+
+def test_volatile_keys_do_not_count_as_changes(tmp_path):
+    items = [{"name": "A"}]
+    s = _store(tmp_path, items, volatile_keys=["days_to_exam"])
+    assert s.save() is True
+    items[0]["days_to_exam"] = 3
+    assert s.save() is False
+
+
+def test_copies_are_independent(tmp_path):
+    items = [{"name": "A", "qa": [{"question": "q"}]}]
+    s = _store(tmp_path, items)
+    copy = s.copy_of(items[0])
+    copy["qa"].append({"question": "nieuw"})
+    (snap,) = s.snapshot()
+    snap["name"] = "X"
+    assert items == [{"name": "A", "qa": [{"question": "q"}]}]
+
+
+def test_uid_survives_deleting_an_earlier_item(tmp_path):
+    items = [{"name": "A"}, {"name": "B"}]
+    s = _store(tmp_path, items)
+    uid = s.uid_of(items[1])
+    assert s.uid_of(items[1]) == uid
+    del items[0]
+    assert s.index_of_uid(uid) == 0
+    del items[0]
+    assert s.index_of_uid(uid) is None
+
+
+def test_at_locks_the_item_at_that_index(tmp_path):
+    items = [{"name": "A"}, {"name": "B"}]
+    s = _store(tmp_path, items)
+    entered = threading.Event()
+
+    def reader():
+        with s.at(1):
+            entered.set()
+
+    with s.at(1, write=True):
+        t = threading.Thread(target=reader)
+        t.start()
+        assert not entered.wait(timeout=0.1)
+        # een ander item blijft leesbaar
+        with s.at(0):
+            pass
+    assert entered.wait(timeout=2)
+    t.join()
+
+
+# ---- gedeelde modus (twee Stores = twee processen op hetzelfde bestand) ----
+
+def _pair(tmp_path):
+    first = _store(tmp_path, [{"name": "A"}, {"name": "B"}], shared=True)
+    second = _store(tmp_path, [], shared=True)
+    return first, second
+
+
+def test_shared_merges_changes_to_different_records(tmp_path):
+    first, second = _pair(tmp_path)
+    first.items[0]["name"] = "A1"
+    assert first.save() is True
+    second.items[1]["name"] = "B1"
+    assert second.save() is True
+
+    second.refresh()
+    first.refresh()
+    assert [r["name"] for r in first.items] == ["A1", "B1"]
+    assert [r["name"] for r in second.items] == ["A1", "B1"]
+
+
+def test_shared_conflict_on_same_record(tmp_path):
+    first, second = _pair(tmp_path)
+    first.items[0]["name"] = "van eerste"
+    first.save()
+    second.items[0]["name"] = "van tweede"
+
+    with pytest.raises(store.ConflictError) as exc:
+        second.save()
+    assert exc.value.names == ["van tweede"]
+
+    # de schijf wint; na refresh ziet het tweede proces die versie
+    second.refresh()
+    assert second.items[0]["name"] == "van eerste"
+
+
+def test_shared_refresh_keeps_dict_identity(tmp_path):
+    first, second = _pair(tmp_path)
+    held = second.items[0]
+    first.items[0]["name"] = "nieuw"
+    first.save()
+    second.refresh()
+    assert second.items[0] is held
+    assert held["name"] == "nieuw"
+
+
+def test_shared_delete_and_add(tmp_path):
+    first, second = _pair(tmp_path)
+    with first.writing():
+        del first.items[0]
+        first.items.append({"name": "C"})
+        first.save()  # uitgesteld tot de lock vrij is
+    second.refresh()
+    assert [r["name"] for r in second.items] == ["B", "C"]
+    assert all(store.UID_KEY in r for r in second.items)
+
+
+# ---- opstarten vanuit een snapshot ----
+
+def _written(tmp_path, records):
+    path = str(tmp_path / "data.snap")
+    snapshot.write(path, records, lambda r: (r.get(store.UID_KEY), r.get(store.VERSION_KEY)))
+    return path
+
+
+def test_digests_match_fingerprints(tmp_path):
+    path = _written(tmp_path, [{"name": "A", "qa": [{"question": "é?"}]}, {"name": "B"}])
+    items, digests = snapshot.load_indexed(path)
+    s = store.Store(path, items, digests=digests)
+    assert [s._fingerprint(item) for item in items] == digests
+    assert s.save() is False
+    items[1]["name"] = "B2"
+    assert s.save() is True
+
+
+def test_shared_start_from_same_snapshot_keeps_items(tmp_path):
+    _store(tmp_path, [{"name": "A"}], shared=True)  # geeft uid/versie
+    items, digests = snapshot.load_indexed(str(tmp_path / "data.snap"))
+    held = items[0]
+    s = _store(tmp_path, items, shared=True, digests=digests)
+    assert s.items[0] is held
+    assert s.save() is False
+
+
+def test_shared_start_reloads_when_disk_moved_on(tmp_path):
+    first = _store(tmp_path, [{"name": "A"}], shared=True)
+    items, digests = snapshot.load_indexed(str(tmp_path / "data.snap"))
+    first.items[0]["name"] = "A2"
+    first.save()
+    s = _store(tmp_path, items, shared=True, digests=digests)
+    assert s.items[0]["name"] == "A2"
+    assert s.save() is False
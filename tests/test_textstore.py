@@ -0,0 +1,55 @@
+import os
+import time
+
+import pytest
+
+import textstore
+
+OLD = textstore.GC_MIN_AGE + 60
+
+
+@pytest.fixture
+def folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(textstore, "_folder", None)
+    textstore.configure(str(tmp_path / "text_store"))
+    return tmp_path / "text_store"
+
+
+def _age(ref, seconds):
+    old = time.time() - seconds
+    os.utime(textstore._path(ref), (old, old))
+
+
+def _course(*refs):
+    notes = [{"title": f"n{i}", "content_ref": ref} for i, ref in enumerate(refs)]
+    return {"notes": {"folders": [{"name": "Map", "notes": notes}]}}
+
+
+def test_gc_removes_only_old_unreferenced_texts(folder):
+    kept = textstore.put_text("nog gebruikt")
+    dropped = textstore.put_text("weggegooid")
+    fresh = textstore.put_text("net geschreven")
+    _age(kept, OLD)
+    _age(dropped, OLD)
+
+    assert textstore.collect_garbage([_course(kept)]) == 1
+    assert os.path.exists(textstore._path(kept))
+    assert not os.path.exists(textstore._path(dropped))
+    assert os.path.exists(textstore._path(fresh))
+
+
+def test_put_text_refreshes_existing_file(folder):
+    ref = textstore.put_text("oude tekst")
+    _age(ref, OLD)
+    # dezelfde tekst opnieuw bewaard (bv. een notitie teruggezet)
+    assert textstore.put_text("oude tekst") == ref
+    assert textstore.collect_garbage([]) == 0
+    assert textstore.get_text(ref) == "oude tekst"
+
+
+def test_put_text_rewrites_a_collected_file(folder):
+    ref = textstore.put_text("tekst")
+    os.remove(textstore._path(ref))
+    assert textstore.put_text("tekst") == ref
+    with open(textstore._path(ref), encoding="utf-8") as f:
+        assert f.read() == "tekst"
@@ -0,0 +1,77 @@
+import hashlib
+import io
+
+import pytest
+
+import uploads
+
+
+class BrokenStream:
+    """Levert `data` en breekt dan af, zoals een weggevallen verbinding."""
+
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def read(self, size):
+        block = self._stream.read(size)
+        if not block:
+            raise ConnectionError("verbinding verbroken")
+        return block
+
+
+@pytest.fixture
+def store(tmp_path):
+    return uploads.ChunkedUploads(str(tmp_path), max_size=10 * 1024 * 1024)
+
+
+def test_resume_after_interrupted_chunk(store):
+    data = bytes(range(256)) * 1024  # 256 KB
+    first, second = data[:100_000], data[100_000:]
+    meta = store.start("c1", "slides.pdf", len(data))
+
+    meta = store.append(meta["id"], 0, io.BytesIO(first))
+    assert meta["offset"] == len(first)
+
+    # afgebroken stuk: de upload blijft op de vorige offset staan
+    with pytest.raises(ConnectionError):
+        store.append(meta["id"], len(first), BrokenStream(b"x" * 70_000))
+    assert store.status(meta["id"])["offset"] == len(first)
+
+    store.append(meta["id"], len(first), io.BytesIO(second))
+    done, part_path, sha = store.finish(meta["id"])
+
+    assert sha == hashlib.sha256(data).hexdigest()
+    with open(part_path, "rb") as f:
+        assert f.read() == data
+    assert done["offset"] == len(data)
+
+
+def test_resume_after_restart(store, tmp_path):
+    data = b"abc" * 50_000
+    meta = store.start("c1", "slides.pdf", len(data))
+    store.append(meta["id"], 0, io.BytesIO(data[:40_000]))
+
+    # nieuw proces: geen hash-toestand in geheugen
+    fresh = uploads.ChunkedUploads(str(tmp_path), max_size=store.max_size)
+    fresh.append(meta["id"], 40_000, io.BytesIO(data[40_000:]))
+    _, _, sha = fresh.finish(meta["id"])
+
+    assert sha == hashlib.sha256(data).hexdigest()
+
+
+def test_wrong_offset_reports_current_position(store):
+    meta = store.start("c1", "slides.pdf", 10)
+    store.append(meta["id"], 0, io.BytesIO(b"12345"))
+    with pytest.raises(uploads.OffsetMismatch) as exc:
+        store.append(meta["id"], 0, io.BytesIO(b"12345"))
+    assert exc.value.offset == 5
+
+
+def test_too_much_data_keeps_upload_resumable(store):
+    meta = store.start("c1", "slides.pdf", 8)
+    store.append(meta["id"], 0, io.BytesIO(b"1234"))
+    with pytest.raises(uploads.UploadError):
+        store.append(meta["id"], 4, io.BytesIO(b"567890"))
+    store.append(meta["id"], 4, io.BytesIO(b"5678"))
+    _, _, sha = store.finish(meta["id"])
+    assert sha == hashlib.sha256(b"12345678").hexdigest()
@@ -0,0 +1,277 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+# ==== Grote tekstvelden buiten courses_data.json ====
+# De inhoud van notities en de AI-chatgeschiedenis groeit het snelst, maar
+# de meeste pagina's (home, vakken, examens, stats) tonen ze nooit. Daarom
+# staan ze niet meer in het JSON-bestand zelf maar als losse bestanden op
+# basis van hun inhoud:
+#
+#   <map>/<sha[:2]>/<sha256>.txt
+#
+# In het vak staat alleen nog de verwijzing:
+#   notitie:  {"title": "...", "content_ref": "<sha>", "content_chars": 1234}
+#   chat:     course["ai_chat_ref"] = "<sha>"  (JSON-lijst van berichten)
+#
+# Een notitie is in het geheugen een LazyNote: een gewone dict, maar
+# note["content"] / note.get("content") leest de tekst pas bij het eerste
+# gebruik (en note["content"] = ... schrijft meteen een nieuw bestand).
+# Gelezen teksten blijven in een LRU-cache met een plafond in bytes.
+#
+# Bestanden zijn onveranderlijk (een wijziging = een nieuw bestand), dus
+# meerdere processen kunnen ze veilig delen; collect_garbage() ruimt
+# bestanden op waar geen vak meer naar verwijst en die ouder zijn dan
+# GC_MIN_AGE. put_text() van een tekst die al bestaat zet de mtime op nu,
+# zodat een bestand dat opnieuw in gebruik komt niet als oud geldt.
+
+# Hoeveel tekst (in bytes, ongeveer) er maximaal in het geheugen blijft
+MAX_RESIDENT_BYTES = int(os.getenv("STUDYOS_TEXT_CACHE_BYTES", str(8 * 1024 * 1024)))
+# Niet-gebruikte bestanden pas na zoveel seconden opruimen (een ander proces
+# kan net een bestand geschreven hebben dat nog niet in de JSON staat)
+GC_MIN_AGE = 60 * 60
+
+_folder: Optional[str] = None
+_lock = threading.Lock()
+_cache: "OrderedDict[str, str]" = OrderedDict()
+_cache_bytes = 0
+
+
+def configure(folder: str):
+    global _folder
+    _folder = folder
+    os.makedirs(folder, exist_ok=True)
+
+
+def _path(ref: str) -> str:
+    return os.path.join(_folder, ref[:2], f"{ref}.txt")
+
+
+def _remember(ref: str, text: str):
+    global _cache_bytes
+    with _lock:
+        if ref in _cache:
+            _cache.move_to_end(ref)
+            return
+        _cache[ref] = text
+        _cache_bytes += len(text)
+        while _cache_bytes > MAX_RESIDENT_BYTES and len(_cache) > 1:
+            _, old = _cache.popitem(last=False)
+            _cache_bytes -= len(old)
+
+
+def resident_bytes() -> int:
+    return _cache_bytes
+
+
+def put_text(text: str) -> str:
+    """Bewaar tekst en geef de verwijzing (sha256) terug."""
+    data = (text or "").encode("utf-8")
+    ref = hashlib.sha256(data).hexdigest()
+    path = _path(ref)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    _remember(ref, text or "")
+    return ref
+
+
+def get_text(ref: Optional[str], cache: bool = True) -> str:
+    """Tekst bij een verwijzing ("" als die ontbreekt)."""
+    if not ref:
+        return ""
+    with _lock:
+        text = _cache.get(ref)
+        if text is not None:
+            _cache.move_to_end(ref)
+            return text
+    try:
+        with open(_path(ref), "r", encoding="utf-8") as f:
+            text = f.read()
+    except OSError:
+        print(f"Tekst {ref[:12]} niet gevonden")
+        return ""
+    if cache:
+        _remember(ref, text)
+    return text
+
+
+# ---- notities ----
+
+class LazyNote(dict):
+    """Notitie-dict waarvan "content" pas bij gebruik van schijf gelezen wordt."""
+
+    def __missing__(self, key):
+        if key == "content":
+            return get_text(dict.get(self, "content_ref"))
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key == "content" and not dict.__contains__(self, "content"):
+            return get_text(dict.get(self, "content_ref")) if dict.get(self, "content_ref") else default
+        return dict.get(self, key, default)
+
+    def __setitem__(self, key, value):
+        if key == "content":
+            value = value or ""
+            dict.__setitem__(self, "content_ref", put_text(value))
+            dict.__setitem__(self, "content_chars", len(value))
+            return
+        dict.__setitem__(self, key, value)
+
+
+def lazy_note(note: Dict) -> LazyNote:
+    """
+    Zet een notitie om naar een LazyNote. Staat de inhoud nog in de dict
+    zelf (oud formaat of net aangemaakt), dan wordt ze naar een bestand
+    verplaatst.
+    """
+    if isinstance(note, LazyNote):
+        return note
+    fields = {k: v for k, v in note.items() if k != "content"}
+    lazy = LazyNote(fields)
+    if "content" in note or "content_ref" not in fields:
+        lazy["content"] = note.get("content") or ""
+    return lazy
+
+
+def note_text(note: Dict, cache: bool = True) -> str:
+    """Inhoud van een notitie; cache=False voor eenmalig lezen (bv. indexeren)."""
+    if dict.__contains__(note, "content"):
+        return note.get("content") or ""
+    return get_text(dict.get(note, "content_ref"), cache=cache)
+
+
+def new_note(title: str, content: str = "") -> LazyNote:
+    return lazy_note({"title": title, "content": content})
+
+
+def externalize_notes(course: Dict) -> bool:
+    """
+    Alle notities van een vak als LazyNote (inhoud buiten de JSON).
+    True als het record daardoor veranderde (inhoud verhuisd, ongeldige
+    notities weg); enkel dict -> LazyNote telt niet.
+    """
+    notes = course.get("notes")
+    if not isinstance(notes, dict):
+        return False
+    changed = False
+    for folder in notes.get("folders") or []:
+        items = folder.get("notes")
+        if isinstance(items, list):
+            changed = changed or any(
+                not isinstance(n, dict) or "content" in n or "content_ref" not in n
+                for n in items
+            )
+            folder["notes"] = [lazy_note(n) for n in items if isinstance(n, dict)]
+    return changed
+
+
+# ---- AI-chat ----
+
+def load_chat(course: Dict) -> List[Dict]:
+    """Chatgeschiedenis van een vak (uit het bestand waar ai_chat_ref naar wijst)."""
+    raw = get_text(course.get("ai_chat_ref"))
+    if not raw:
+        return []
+    try:
+        history = json.loads(raw)
+    except ValueError:
+        return []
+    return history if isinstance(history, list) else []
+
+
+def store_chat(course: Dict, history: List[Dict]):
+    if history:
+        course["ai_chat_ref"] = put_text(json.dumps(history, ensure_ascii=False))
+    else:
+        course.pop("ai_chat_ref", None)
+
+
+def externalize_chat(course: Dict) -> bool:
+    """
+    Oud formaat (of een teruggezette backup): ai_chat_history in de JSON
+    zelf -> apart bestand. True als het record daardoor veranderde.
+    """
+    if "ai_chat_history" not in course:
+        return False
+    history = course.pop("ai_chat_history")
+    if isinstance(history, list) and history:
+        store_chat(course, history)
+    return True
+
+
+# ---- export ----
+
+def inline_course(course: Dict) -> Dict:
+    """
+    Zet notitie-inhoud en chatgeschiedenis terug in (een kopie van) het vak,
+    zoals in het oude courses_data.json. Voor export/backup.
+    Zonder schemaversie: zo'n record staat niet meer in het formaat van de
+    laatste versie, en bij het terugzetten lopen alle migraties opnieuw
+    (die zetten de inhoud weer in textstore).
+    """
+    notes = course.get("notes")
+    if isinstance(notes, dict):
+        for folder in notes.get("folders") or []:
+            folder["notes"] = [
+                dict({k: v for k, v in n.items() if k not in ("content_ref", "content_chars")},
+                     content=note_text(n, cache=False))
+                for n in folder.get("notes") or []
+            ]
+    history = load_chat(course)
+    course.pop("ai_chat_ref", None)
+    if history:
+        course["ai_chat_history"] = history
+    course.pop("_schema", None)  # migrations.SCHEMA_KEY
+    return course
+
+
+# ---- opruimen ----
+
+def referenced(courses: Iterable[Dict]) -> set:
+    refs = set()
+    for course in courses:
+        if course.get("ai_chat_ref"):
+            refs.add(course["ai_chat_ref"])
+        notes = course.get("notes")
+        if not isinstance(notes, dict):
+            continue
+        for folder in notes.get("folders") or []:
+            for note in folder.get("notes") or []:
+                ref = dict.get(note, "content_ref")
+                if ref:
+                    refs.add(ref)
+    return refs
+
+
+def collect_garbage(courses: List[Dict]) -> int:
+    """Verwijder tekstbestanden waar geen enkel vak nog naar verwijst."""
+    if not _folder or not os.path.isdir(_folder):
+        return 0
+    keep = referenced(courses)
+    cutoff = time.time() - GC_MIN_AGE
+    removed = 0
+    for sub in os.listdir(_folder):
+        sub_path = os.path.join(_folder, sub)
+        if not os.path.isdir(sub_path):
+            continue
+        for name in os.listdir(sub_path):
+            ref = name[:-4] if name.endswith(".txt") else None
+            path = os.path.join(sub_path, name)
+            if ref in keep or os.path.getmtime(path) > cutoff:
+                continue
+            os.remove(path)
+            removed += 1
+    if removed:
+        print(f"Opgeruimd: {removed} oude tekstbestand(en)")
+    return removed
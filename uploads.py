@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from typing import Dict, Tuple
+
+# ==== Uploads in stukken (hervatbaar) ====
+# Een gewone upload komt binnen als één multipart-request die Werkzeug eerst
+# volledig buffert; valt de verbinding weg, dan is alles verloren. Grote
+# slides kunnen daarom ook in stukken geüpload worden:
+#
+#   POST /courses/<id>/uploads          {filename, size}  -> upload_id, offset
+#   PUT  /uploads/<upload_id>?offset=N  ruwe bytes        -> nieuwe offset
+#   GET  /uploads/<upload_id>                              -> huidige offset (hervatten)
+#   POST /uploads/<upload_id>/complete                     -> bestand toevoegen aan het vak
+#
+# Elk stuk wordt rechtstreeks naar <map>/<upload_id>.part geschreven (niet in
+# geheugen gehouden) en de SHA-256 wordt tijdens het schrijven bijgewerkt.
+# Na een herstart wordt de hash één keer opnieuw berekend uit het .part-bestand.
+# Een stuk werkt op een kopie van de hash-toestand; pas als het volledig
+# geschreven en in de metadata bevestigd is, vervangt die kopie de bewaarde
+# toestand. Een afgebroken stuk laat de upload dus hervatbaar op de oude offset.
+# Afronden gebeurt atomisch: het .part-bestand wordt met os.replace de blob.
+# De metadata onthoudt het vak via zijn uid (store.UID_KEY), niet de index:
+# /complete kan veel later komen, nadat een ander vak verwijderd werd.
+
+STREAM_BLOCK_SIZE = 64 * 1024
+# Uploads die zo lang niet meer bewogen hebben worden opgeruimd (seconden)
+STALE_AFTER = 24 * 60 * 60
+
+
+class UploadError(Exception):
+    """Ongeldige upload-aanvraag (onbekend id, te groot, ...)."""
+
+
+class UnknownUpload(UploadError):
+    """Geen (lopende) upload met dit id."""
+
+
+class OffsetMismatch(UploadError):
+    """Het stuk begint niet waar de upload nu staat; offset = huidige positie."""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Verwachte offset {offset}")
+        self.offset = offset
+
+
+class ChunkedUploads:
+    def __init__(self, folder: str, max_size: int):
+        self.folder = folder
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # één lock per upload: verschillende uploads lopen parallel,
+        # twee stukken van dezelfde upload nooit
+        self._upload_locks: Dict[str, threading.Lock] = {}
+        # upload_id -> (offset, sha256-object) voor lopende uploads
+        self._hashers: Dict[str, Tuple[int, object]] = {}
+
+    def _upload_lock(self, upload_id: str) -> threading.Lock:
+        with self._lock:
+            return self._upload_locks.setdefault(upload_id, threading.Lock())
+
+    # ---- paden + metadata ----
+
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.folder, f"{upload_id}.json")
+
+    def part_path(self, upload_id: str) -> str:
+        return os.path.join(self.folder, f"{upload_id}.part")
+
+    def _load(self, upload_id: str) -> Dict:
+        if not upload_id.isalnum():
+            raise UnknownUpload("Onbekende upload.")
+        try:
+            with open(self._meta_path(upload_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UnknownUpload("Onbekende upload.")
+
+    def _save(self, meta: Dict):
+        path = self._meta_path(meta["id"])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    # ---- publieke API ----
+
+    def start(self, course_uid: str, filename: str, size: int) -> Dict:
+        """Begin een nieuwe upload en geef de metadata terug."""
+        if size < 0 or size > self.max_size:
+            raise UploadError(f"Bestand te groot (max {self.max_size // (1024 * 1024)} MB).")
+
+        os.makedirs(self.folder, exist_ok=True)
+        meta = {
+            "id": uuid.uuid4().hex,
+            "course_uid": course_uid,
+            "filename": filename,
+            "size": size,
+            "offset": 0,
+            "created_at": time.time(),
+            "updated_at": time.time(),
+        }
+        open(self.part_path(meta["id"]), "wb").close()
+        with self._upload_lock(meta["id"]):
+            self._save(meta)
+            self._hashers[meta["id"]] = (0, hashlib.sha256())
+        return meta
+
+    def status(self, upload_id: str) -> Dict:
+        with self._upload_lock(upload_id):
+            return self._load(upload_id)
+
+    def _hasher(self, upload_id: str, offset: int):
+        """
+        Hash-toestand tot `offset` (altijd een kopie, de bewaarde toestand
+        blijft ongemoeid); na een herstart opnieuw opgebouwd uit het .part-bestand.
+        """
+        known = self._hashers.get(upload_id)
+        if known and known[0] == offset:
+            return known[1].copy()
+
+        h = hashlib.sha256()
+        with open(self.part_path(upload_id), "rb") as f:
+            remaining = offset
+            while remaining > 0:
+                block = f.read(min(STREAM_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                h.update(block)
+                remaining -= len(block)
+        return h
+
+    def append(self, upload_id: str, offset: int, stream) -> Dict:
+        """
+        Schrijf een stuk (uit een stream) op positie `offset`.
+        Gooit OffsetMismatch als de offset niet klopt (client moet dan hervatten).
+        """
+        with self._upload_lock(upload_id):
+            meta = self._load(upload_id)
+            if offset != meta["offset"]:
+                raise OffsetMismatch(meta["offset"])
+
+            h = self._hasher(upload_id, offset)
+            written = 0
+            with open(self.part_path(upload_id), "r+b") as f:
+                f.seek(offset)
+                f.truncate()
+                while True:
+                    block = stream.read(STREAM_BLOCK_SIZE)
+                    if not block:
+                        break
+                    if offset + written + len(block) > meta["size"]:
+                        f.truncate(offset)
+                        raise UploadError("Meer data dan de opgegeven grootte.")
+                    f.write(block)
+                    h.update(block)
+                    written += len(block)
+
+            meta["offset"] = offset + written
+            meta["updated_at"] = time.time()
+            self._save(meta)
+            self._hashers[upload_id] = (meta["offset"], h)
+            return meta
+
+    def finish(self, upload_id: str) -> Tuple[Dict, str, str]:
+        """
+        Rond de upload af. Retourneert (metadata, pad van het .part-bestand, sha256).
+        Het .part-bestand moet daarna door de aanroeper verplaatst worden
+        (blobstore.put_file); de metadata is dan al weg.
+        """
+        with self._upload_lock(upload_id):
+            meta = self._load(upload_id)
+            if meta["offset"] != meta["size"]:
+                raise OffsetMismatch(meta["offset"])
+            sha = self._hasher(upload_id, meta["offset"]).hexdigest()
+            self._hashers.pop(upload_id, None)
+            os.remove(self._meta_path(upload_id))
+        self._forget(upload_id)
+        return meta, self.part_path(upload_id), sha
+
+    def discard(self, upload_id: str):
+        with self._upload_lock(upload_id):
+            self._hashers.pop(upload_id, None)
+            for path in (self._meta_path(upload_id), self.part_path(upload_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+        self._forget(upload_id)
+
+    def _forget(self, upload_id: str):
+        with self._lock:
+            self._upload_locks.pop(upload_id, None)
+
+    def cleanup_stale(self, max_age: float = STALE_AFTER) -> int:
+        """Verwijder uploads die al lang niet meer bijgewerkt zijn."""
+        if not os.path.isdir(self.folder):
+            return 0
+        now = time.time()
+        removed = 0
+        for name in os.listdir(self.folder):
+            if not name.endswith(".json"):
+                continue
+            upload_id = name[:-5]
+            try:
+                meta = self.status(upload_id)
+            except UploadError:
+                continue
+            if now - meta.get("updated_at", 0) > max_age:
+                self.discard(upload_id)
+                removed += 1
+        return removed